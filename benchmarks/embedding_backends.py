@@ -0,0 +1,111 @@
+"""
+Embedding backend benchmark and tolerance check for the graph metrics.
+
+Encodes the node texts of the ground truth and scaled generated programs with
+each backend (torch, onnx, onnx-int8), reports throughput, and checks that
+adjacency_similarity for every checked-in response stays within --epsilon of
+the float32 torch backend. Exits with status 1 if any backend is out of tolerance.
+
+Usage:
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --backends torch onnx-int8 --scale 10 --epsilon 0.01
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.run_benchmarks import ARTIFACT_DIR, GROUND_TRUTH_PATH, scale_rule_response
+
+RESPONSE_FILES = ['rulegen_response.txt', 'in_context_response.txt', 'zero_shot_response.txt']
+
+
+def load_graphs(scale: int, workdir: Path) -> tuple:
+    from src.processing.graph_utils import ASPGraphCreator
+    G_gt = ASPGraphCreator.create_program_graph(str(GROUND_TRUTH_PATH))
+    generated = {}
+    for name in RESPONSE_FILES:
+        path = ARTIFACT_DIR / name
+        if path.exists():
+            generated[name] = ASPGraphCreator.create_program_graph(str(path))
+
+    # Scaled copy of the rule generation response for the throughput measurement
+    scaled_path = workdir / 'scaled_program.txt'
+    scaled_path.write_text(scale_rule_response((ARTIFACT_DIR / 'rulegen_response.txt').read_text(encoding='utf-8'), scale),
+                           encoding='utf-8')
+    G_scaled = ASPGraphCreator.create_program_graph(str(scaled_path))
+    return G_gt, generated, G_scaled
+
+
+def benchmark_backend(backend: str, G_gt, generated: dict, G_scaled, repeats: int) -> Dict[str, object]:
+    from src.processing.graph_analysis import GraphAnalyzer
+    analyzer = GraphAnalyzer(embedding_backend=backend)
+
+    texts = [analyzer.node_text(G, node) for G in (G_gt, G_scaled) for node in G.nodes()]
+    analyzer.model.encode(texts[:8])  # warm up (session creation, thread pools)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        analyzer.model.encode(texts)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        scores = {name: float(analyzer.compute_semantic_adjacency_similarity(G_gt, G_gen)[0])
+                  for name, G_gen in generated.items()}
+    return {'texts': len(texts), 'seconds': best, 'texts_per_s': len(texts) / best, 'scores': scores}
+
+
+def main():
+    from src.processing.EmbeddingBackends import EMBEDDING_BACKENDS
+
+    arg_parser = argparse.ArgumentParser(description="Benchmark embedding backends and check score tolerance.")
+    arg_parser.add_argument('--backends', nargs='+', choices=list(EMBEDDING_BACKENDS), default=list(EMBEDDING_BACKENDS))
+    arg_parser.add_argument('--scale', type=int, default=10)
+    arg_parser.add_argument('--repeats', type=int, default=3)
+    arg_parser.add_argument('--epsilon', type=float, default=0.01,
+                            help="Maximum allowed absolute difference in adjacency_similarity from torch")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        G_gt, generated, G_scaled = load_graphs(args.scale, Path(tmp))
+
+    backends: List[str] = ['torch'] + [b for b in args.backends if b != 'torch']
+    results = {}
+    for backend in backends:
+        try:
+            results[backend] = benchmark_backend(backend, G_gt, generated, G_scaled, args.repeats)
+        except (ImportError, OSError) as e:
+            print(f"{backend:<10} skipped ({e})")
+            continue
+        r = results[backend]
+        print(f"{backend:<10} {r['texts']} texts in {r['seconds']:.3f}s  ({r['texts_per_s']:.0f} texts/s)")
+
+    if 'torch' not in results:
+        print("Torch reference backend unavailable; tolerance check skipped")
+        return
+
+    failed = False
+    print(f"\nadjacency_similarity vs torch (epsilon {args.epsilon})")
+    reference = results['torch']['scores']
+    for backend, r in results.items():
+        if backend == 'torch':
+            continue
+        speedup = r['texts_per_s'] / results['torch']['texts_per_s']
+        for name, score in r['scores'].items():
+            diff = abs(score - reference[name])
+            status = 'ok' if diff <= args.epsilon else 'FAIL'
+            failed |= diff > args.epsilon
+            print(f"{backend:<10} {name:<28} {score:.5f}  (torch {reference[name]:.5f}, diff {diff:.5f})  {status}")
+        print(f"{backend:<10} speedup x{speedup:.2f}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Benchmark harness for the NICE2ASP2 pipeline stages.
+
+Fixtures are built from the checked-in GPT artifacts and ground truths, scaled
+synthetically (1x, 10x, 100x by default). Each stage is timed over several
+repeats and then run once more under tracemalloc to record peak Python memory.
+Results are appended to a JSON history keyed by git commit so runs can be diffed.
+
+Usage:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --stages append_fired_rules explain_fired_rules --scales 1 10
+    python -m benchmarks.run_benchmarks --compare HEAD~1
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ARTIFACT_DIR = PROJECT_ROOT / 'src' / 'output_files' / 'GPT'
+GUIDELINE_PATH = PROJECT_ROOT / 'src' / 'input_files' / 'input_guidelines' / 'pancreatic_cancer_guidelines.txt'
+GROUND_TRUTH_PATH = PROJECT_ROOT / 'src' / 'input_files' / 'ground_truths' / 'GT_PC.lp'
+DEFAULT_HISTORY = PROJECT_ROOT / 'benchmarks' / 'history.json'
+
+
+# ------------------------------------------------------------
+# Fixture scaling
+# ------------------------------------------------------------
+
+def scale_guideline(text: str, scale: int) -> str:
+    # Repeat the guideline, shifting the chapter number so clause IDs stay unique
+    copies = []
+    for c in range(scale):
+        copies.append(re.sub(r'^(\s*)(\d+)(\.)', lambda m: f"{m.group(1)}{int(m.group(2)) + c * 100}{m.group(3)}",
+                             text, flags=re.MULTILINE))
+    return '\n\n'.join(copies)
+
+
+def scale_rule_response(text: str, scale: int) -> str:
+    # Repeat an LLM rule response with unique [X.Y.Z] markers and renamed predicates per copy
+    copies = []
+    for c in range(scale):
+        if c == 0:
+            copies.append(text)
+            continue
+        copy = re.sub(r'\[([\d.]+)\]', lambda m: f"[{m.group(1)}.{c}]", text)
+        copy = re.sub(r'\b([a-z]\w*)\(', lambda m: f"{m.group(1)}_c{c}(", copy)
+        copies.append(copy)
+    return '\n\n'.join(copies)
+
+
+def scale_clingo_output(text: str, scale: int) -> str:
+    # Repeat clingo output with renumbered patients
+    sections = re.split(r'=== Patient (\d+) ===', text)[1:]
+    n_patients = len(sections) // 2
+    out = []
+    for c in range(scale):
+        for i in range(0, len(sections), 2):
+            out.append(f"=== Patient {int(sections[i]) + c * n_patients} ==={sections[i + 1]}")
+    return ''.join(out)
+
+
+def write(path: Path, text: str) -> str:
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+# ------------------------------------------------------------
+# Stage setups: each returns the callable to time, or raises SkipStage
+# ------------------------------------------------------------
+
+class SkipStage(Exception):
+    pass
+
+
+def setup_build_guideline_lookup(scale: int, workdir: Path) -> Callable[[], object]:
+    from src.processing.GuidelineIndex import GuidelineIndex
+    guideline = scale_guideline(GUIDELINE_PATH.read_text(encoding='utf-8'), scale)
+    # Parse directly: RuleProcessor._build_guideline_lookup serves repeats from the per-file cache
+    return lambda: GuidelineIndex(guideline).as_lookup()
+
+
+def setup_append_fired_rules(scale: int, workdir: Path) -> Callable[[], object]:
+    from src.processing.RuleProcessor import RuleProcessor
+    response = scale_rule_response((ARTIFACT_DIR / 'rulegen_response.txt').read_text(encoding='utf-8'), scale)
+    input_path = write(workdir / 'rulegen_response.txt', response)
+    output_path = str(workdir / 'rulegen_response_fired.lp')
+    return lambda: RuleProcessor(None).append_fired_rules(input_path, output_path)
+
+
+def setup_create_program_graph(scale: int, workdir: Path) -> Callable[[], object]:
+    from src.processing.graph_utils import ASPGraphCreator
+    response = scale_rule_response((ARTIFACT_DIR / 'rulegen_response.txt').read_text(encoding='utf-8'), scale)
+    program = write(workdir / 'program.txt', response)
+    return lambda: ASPGraphCreator.create_program_graph(program)
+
+
+def setup_compute_semantic_adjacency_similarity(scale: int, workdir: Path) -> Callable[[], object]:
+    from src.processing.graph_analysis import GraphAnalyzer
+    from src.processing.graph_utils import ASPGraphCreator
+    response = scale_rule_response((ARTIFACT_DIR / 'rulegen_response.txt').read_text(encoding='utf-8'), scale)
+    G_gen = ASPGraphCreator.create_program_graph(write(workdir / 'program.txt', response))
+    G_gt = ASPGraphCreator.create_program_graph(str(GROUND_TRUTH_PATH))
+    analyzer = GraphAnalyzer()
+    return lambda: analyzer.compute_semantic_adjacency_similarity(G_gt, G_gen)
+
+
+def setup_run_clingo_for_patients(scale: int, workdir: Path) -> Callable[[], object]:
+    if shutil.which('clingo') is None:
+        raise SkipStage("clingo executable not found on PATH")
+    from src.processing.PatientGenerator import SyntheticPatientGenerator
+    from src.processing.RuleProcessor import RuleProcessor
+    lp_path = str(ARTIFACT_DIR / 'rulegen_response_fired.lp')
+    atoms_path = str(workdir / 'atoms.txt')
+    # The checked-in cohort has 20 patients; scale the synthetic cohort to match
+    SyntheticPatientGenerator(lp_path, seed=0).write_atoms(atoms_path, 20 * scale)
+    output_path = str(workdir / 'clingo_output.txt')
+    return lambda: RuleProcessor(None).run_clingo_for_patients(lp_path, atoms_path, output_path)
+
+
+def setup_explain_fired_rules(scale: int, workdir: Path) -> Callable[[], object]:
+    from src.processing.RuleProcessor import RuleProcessor
+    clingo_output = scale_clingo_output((ARTIFACT_DIR / 'clingo_output.txt').read_text(encoding='utf-8'), scale)
+    clingo_path = write(workdir / 'clingo_output.txt', clingo_output)
+    lp_path = str(ARTIFACT_DIR / 'rulegen_response_fired.lp')
+    explanation_path = str(workdir / 'explanation.txt')
+    processor = RuleProcessor(str(GUIDELINE_PATH))
+    return lambda: processor.explain_fired_rules(lp_path, clingo_path, explanation_path)
+
+
+# Stage name -> (setup, largest scale to run); None runs every requested scale.
+STAGES: Dict[str, tuple] = {
+    '_build_guideline_lookup': (setup_build_guideline_lookup, None),
+    'append_fired_rules': (setup_append_fired_rules, None),
+    'create_program_graph': (setup_create_program_graph, None),
+    'compute_semantic_adjacency_similarity': (setup_compute_semantic_adjacency_similarity, None),
+    'run_clingo_for_patients': (setup_run_clingo_for_patients, None),
+    'explain_fired_rules': (setup_explain_fired_rules, None),
+}
+
+
+# ------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------
+
+def measure(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+
+        # Separate run for memory, since tracemalloc slows allocation-heavy code
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        'min_s': round(min(timings), 6),
+        'median_s': round(statistics.median(timings), 6),
+        'repeats': repeats,
+        'peak_mb': round(peak / 2**20, 3),
+    }
+
+
+def run_benchmarks(stages: List[str], scales: List[int], repeats: int) -> Dict[str, Dict[str, dict]]:
+    results: Dict[str, Dict[str, dict]] = {}
+    for stage in stages:
+        setup, max_scale = STAGES[stage]
+        results[stage] = {}
+        for scale in scales:
+            key = f"{scale}x"
+            if max_scale is not None and scale > max_scale:
+                results[stage][key] = {'skipped': f"scale above stage limit of {max_scale}x"}
+                print(f"{stage:<40} {key:>5}  skipped (limit {max_scale}x)")
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        fn = setup(scale, Path(tmp))
+                    results[stage][key] = measure(fn, repeats)
+                except ImportError as e:
+                    results[stage][key] = {'skipped': f"missing dependency: {e.name}"}
+                    print(f"{stage:<40} {key:>5}  skipped (missing dependency: {e.name})")
+                    continue
+                except SkipStage as e:
+                    results[stage][key] = {'skipped': str(e)}
+                    print(f"{stage:<40} {key:>5}  skipped ({e})")
+                    continue
+            r = results[stage][key]
+            print(f"{stage:<40} {key:>5}  median {r['median_s']:.4f}s  peak {r['peak_mb']:.1f} MB")
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(history_path: Path) -> List[dict]:
+    if history_path.exists():
+        return json.loads(history_path.read_text(encoding='utf-8'))
+    return []
+
+
+def save_history(history_path: Path, history: List[dict]) -> None:
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    history_path.write_text(json.dumps(history, indent=2) + '\n', encoding='utf-8')
+    print(f"History written to {history_path}")
+
+
+def compare(baseline: dict, current: dict) -> None:
+    # Print median time and peak memory ratios of the current run against a baseline entry
+    print(f"\nComparing against {baseline.get('commit', '?')[:10]} ({baseline.get('timestamp')})")
+    for stage, by_scale in current['results'].items():
+        for key, r in by_scale.items():
+            b = baseline['results'].get(stage, {}).get(key)
+            if not b or 'median_s' not in b or 'median_s' not in r:
+                continue
+            time_ratio = r['median_s'] / b['median_s'] if b['median_s'] else float('inf')
+            mem_ratio = r['peak_mb'] / b['peak_mb'] if b['peak_mb'] else float('inf')
+            print(f"{stage:<40} {key:>5}  time x{time_ratio:.2f}  memory x{mem_ratio:.2f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the NICE2ASP2 pipeline stages.")
+    arg_parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    arg_parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100])
+    arg_parser.add_argument('--repeats', type=int, default=3)
+    arg_parser.add_argument('--history', type=Path, default=DEFAULT_HISTORY)
+    arg_parser.add_argument('--compare', default=None,
+                            help="Commit (prefix or git revision) in the history to compare against; "
+                                 "defaults to the previous entry")
+    arg_parser.add_argument('--no-save', action='store_true', help="Do not append this run to the history")
+    args = arg_parser.parse_args()
+
+    entry = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': run_benchmarks(args.stages, args.scales, args.repeats),
+    }
+
+    history = load_history(args.history)
+    baseline = None
+    if args.compare:
+        target = subprocess.run(['git', 'rev-parse', args.compare], cwd=PROJECT_ROOT, capture_output=True,
+                                text=True).stdout.strip() or args.compare
+        baseline = next((h for h in reversed(history) if (h.get('commit') or '').startswith(target)), None)
+        if baseline is None:
+            print(f"No history entry found for {args.compare}")
+    elif history:
+        baseline = history[-1]
+    if baseline:
+        compare(baseline, entry)
+
+    if not args.no_save:
+        history.append(entry)
+        save_history(args.history, history)
+
+
+if __name__ == '__main__':
+    main()
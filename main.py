@@ -8,6 +8,13 @@ from src.processing.FileManager import FileManager
 from src.processing.RuleProcessor import RuleProcessor
 from src.processing.graph_analysis import GraphAnalyzer
 from src.processing.graph_utils import ASPGraphCreator
+from src.processing.K2P import K2PEvaluator
+from src.processing.RunMetrics import RunMetrics, track
+from src.processing.ReplayStore import ReplayStore
+from src.processing.ResultsStore import ResultsStore
+from src.processing.CorpusRunner import CorpusRunner
+from src.processing.PredicateRegistry import PredicateRegistry
+from src.processing.ClientRegistry import REGISTRY
 
 def load_config(config_path):
     with open(config_path, 'r') as f:
@@ -22,11 +29,42 @@ def setup_experiment_dir(config):
     
     config_copy_path = exp_dir / 'config.yaml'
     with open('src/configs/config.yaml', 'r') as src, open(config_copy_path, 'w') as dst:
-        lines = src.readlines()[:24]
-        dst.writelines(lines)
+        # Copy the experiment settings, leaving out the trailing model notes
+        for line in src:
+            if line.startswith('# Models'):
+                break
+            dst.write(line)
 
     return exp_dir
 
+def setup_replay(config):
+    # Replay store for family 'replay', or a store recording live responses if record_store is set
+    experiment = config['experiment']
+    if experiment['family'] == 'replay':
+        replay_store = ReplayStore(
+            experiment['replay_store'],
+            latency=experiment.get('replay_latency', 0.0),
+            jitter=experiment.get('replay_jitter', 0.0),
+            # Corpus guidelines all write files of the same names, so never match on the name alone
+            match_file_name=not config.get('corpus', {}).get('enabled'),
+        )
+        return replay_store, None
+    if experiment.get('record_store'):
+        return None, ReplayStore(experiment['record_store'])
+    return None, None
+
+def setup_vocabulary(config):
+    # Shared predicate/constant registry, seeded from the ground truths the first time it is used
+    registry_path = config['experiment'].get('vocabulary_registry')
+    if not registry_path:
+        return None
+    registry = PredicateRegistry(registry_path)
+    if not registry.predicates:
+        for gt_path in sorted(Path(config['input_files']['ground_truth']).parent.glob('*.lp')):
+            registry.add_program(str(gt_path))
+        registry.save()
+    return registry
+
 def main():
     print('Running Data to Knowledge Pipeline!')
     
@@ -46,6 +84,8 @@ def main():
         'atoms': exp_dir / 'atoms.txt',
         'clingo_output': exp_dir / 'clingo_output.txt',
         'explanation': exp_dir / 'explanation.txt',
+        'k2p_ground_truth': exp_dir / 'K2P_ground_truth.csv',
+        'k2p_metrics': exp_dir / 'k2p_metrics.csv',
 
         # Baseline responses
         'llm_only_response': exp_dir / 'llm_only_response.txt',
@@ -53,9 +93,80 @@ def main():
         'zero_shot_response': exp_dir / 'zero_shot_response.txt',
 
         'graph_metrics': exp_dir / 'graph_metrics.csv',
+        'run_metrics': exp_dir / 'run_metrics.json',
+        'run_trace': exp_dir / 'run_trace.json',
     }
 
-    llmExtractor = LLMInferencer(config['experiment']['model'], config['experiment']['temperature'], config['experiment']['family'])
+    runMetrics = RunMetrics(config['experiment'].get('pricing'))
+    # Pool settings of the provider clients shared by every LLMInferencer
+    REGISTRY.configure(**(config['experiment'].get('http_pool') or {}))
+    replay_store, record_store = setup_replay(config)
+
+    # Shared results store across experiments (optional)
+    results_store, run_id = None, None
+    if config['experiment'].get('results_store'):
+        results_store = ResultsStore(config['experiment']['results_store'])
+        run_id = results_store.start_run(config)
+
+    try:
+        if config.get('corpus', {}).get('enabled'):
+            run_corpus(config, exp_dir, runMetrics, replay_store, record_store, results_store, run_id)
+        else:
+            run_pipeline(config, output_files, runMetrics, replay_store, record_store, results_store, run_id)
+    finally:
+        if record_store is not None:
+            record_store.save()
+        runMetrics.record_client_pools(REGISTRY.stats())
+        REGISTRY.close()
+        runMetrics.write_json(str(output_files['run_metrics']))
+        if config['experiment'].get('trace'):
+            runMetrics.write_chrome_trace(str(output_files['run_trace']))
+        if results_store is not None:
+            results_store.record_run_metrics(run_id, runMetrics.summary())
+            results_store.close()
+
+
+def run_corpus(config, exp_dir, runMetrics, replay_store=None, record_store=None, results_store=None, run_id=None):
+    # Regenerate the rule programs for every guideline file in corpus.input_dir
+    corpus = config['corpus']
+    llmExtractor = LLMInferencer(
+        config['experiment']['model'],
+        config['experiment']['temperature'],
+        config['experiment']['family'],
+        metrics=runMetrics,
+        replay_store=replay_store,
+        record_store=record_store,
+        max_output_tokens=config['experiment'].get('max_output_tokens'),
+        vocabulary=setup_vocabulary(config),
+    )
+    runner = CorpusRunner(
+        config,
+        llmExtractor,
+        metrics=runMetrics,
+        max_workers=corpus.get('max_workers', 4),
+        overwrite=corpus.get('overwrite', False),
+    )
+    if corpus.get('batch'):
+        report = runner.run_batched(corpus['input_dir'], str(exp_dir / 'corpus'), pattern=corpus.get('pattern', '*.txt'),
+                                    poll_interval=corpus.get('batch_poll_interval', 30.0))
+    else:
+        report = runner.run(corpus['input_dir'], str(exp_dir / 'corpus'), pattern=corpus.get('pattern', '*.txt'))
+
+    if results_store is not None:
+        results_store.record_corpus_report(run_id, report)
+
+
+def run_pipeline(config, output_files, runMetrics, replay_store=None, record_store=None, results_store=None, run_id=None):
+    llmExtractor = LLMInferencer(
+        config['experiment']['model'],
+        config['experiment']['temperature'],
+        config['experiment']['family'],
+        metrics=runMetrics,
+        replay_store=replay_store,
+        record_store=record_store,
+        max_output_tokens=config['experiment'].get('max_output_tokens'),
+        vocabulary=setup_vocabulary(config),
+    )
     fileManager = FileManager()
 
     # ------------------------------------------------------------
@@ -131,14 +242,16 @@ def main():
     # # Graphical Analysis
     # # ------------------------------------------------------------
     # graph_generated = ASPGraphCreator.create_program_graph(graph_file)
-    # graph_analyzer = GraphAnalyzer()
-    # graph_analyzer.calculate_graph_similarity(
+    # graph_analyzer = GraphAnalyzer(metrics=runMetrics, embedding_backend=config['experiment'].get('embedding_backend', 'torch'))
+    # graph_metrics = graph_analyzer.calculate_graph_similarity(
     #     graph_gt, 
     #     [graph_generated], 
     #     str(output_files['graph_metrics']), 
     #     [graph_name],
     #     config=config
     # )
+    # if results_store is not None:
+    #     results_store.record_graph_metrics(run_id, graph_metrics)
 
     # ------------------------------------------------------------
     # K2P Analysis
@@ -148,10 +261,11 @@ def main():
     # llmExtractor.run_llm_only(config['input_files']['llm_only_prompt'], config['input_files']['problem_text'], config['input_files']['patient_vignettes'], str(output_files['llm_only_response']))
     
     print("Starting K2P Analysis")
-    ruleProcessor = RuleProcessor(config['input_files']['problem_text'])
+    ruleProcessor = RuleProcessor(config['input_files']['problem_text'], metrics=runMetrics)
 
     # Add fired({rule number}) to the rules
-    # ruleProcessor.append_fired_rules(str(output_files['rulegen_response']), str(output_files['rulegen_response_fired']))
+    # ruleProcessor.append_fired_rules(str(output_files['rulegen_response']), str(output_files['rulegen_response_fired']),
+    #                                  encoding=config['experiment'].get('fired_encoding', 'duplicate'))
 
     # Extract the atoms in patient vignettes from the rules generated by the program
     llmExtractor.extract_atoms(
@@ -162,10 +276,30 @@ def main():
         )
 
     # Run clingo for each patient vignette
-    ruleProcessor.run_clingo_for_patients(str(output_files['rulegen_response_fired']), str(output_files['atoms']), str(output_files['clingo_output']), debug_id=2)
+    with track(runMetrics, 'run_clingo_for_patients'):
+        ruleProcessor.run_clingo_for_patients(str(output_files['rulegen_response_fired']), str(output_files['atoms']), str(output_files['clingo_output']), debug_id=2,
+                                              slice_program=config['experiment'].get('slice_program', False),
+                                              verify_sample=config['experiment'].get('slice_verify_sample', 0))
+
+    # Profile grounding and solving per rule (writes rule_profile.csv and patient_profile.csv)
+    # from src.processing.RuleProfiler import RuleProfiler
+    # RuleProfiler(metrics=runMetrics).profile(str(output_files['rulegen_response_fired']), str(output_files['atoms']), str(output_files['clingo_output'].parent))
 
     # Explain the clingo output
-    ruleProcessor.explain_fired_rules(str(output_files['rulegen_response_fired']), str(output_files['clingo_output']), str(output_files['explanation']))
+    with track(runMetrics, 'explain_fired_rules'):
+        ruleProcessor.explain_fired_rules(str(output_files['rulegen_response_fired']), str(output_files['clingo_output']), str(output_files['explanation']))
+
+    # Score the fired rules against the K2P ground truth
+    if output_files['k2p_ground_truth'].exists():
+        k2pEvaluator = K2PEvaluator()
+        gt_by_patient = k2pEvaluator.load_ground_truth(str(output_files['k2p_ground_truth']))
+        fired_by_patient = k2pEvaluator.load_fired_rules(str(output_files['clingo_output']))
+        k2p_result = k2pEvaluator.score(gt_by_patient, fired_by_patient)
+        k2pEvaluator.save_metrics(k2p_result, str(output_files['k2p_metrics']))
+        if results_store is not None:
+            results_store.record_k2p_result(run_id, k2p_result)
+            results_store.record_k2p_outcomes(run_id, gt_by_patient, fired_by_patient)
+        print(f"K2P F1: {k2p_result['global']['F1']:.3f}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from src.processing.RunMetrics import track
+
+
+@dataclass
+class BatchResult:
+    """Reply to one request of a batch, normalised across providers."""
+
+    text: str = ''
+    truncated: bool = False  # stopped at the output limit
+    input_tokens: int = 0
+    output_tokens: int = 0
+    error: Optional[str] = None
+
+
+class AnthropicBatchBackend:
+    """Anthropic Message Batches API (client.messages.batches)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests: List[dict]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[{'custom_id': request['custom_id'], 'params': request['params']} for request in requests])
+        return batch.id
+
+    def done(self, batch_id: str) -> bool:
+        return self.client.messages.batches.retrieve(batch_id).processing_status == 'ended'
+
+    def results(self, batch_id: str) -> Dict[str, BatchResult]:
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type != 'succeeded':
+                # errored, canceled or expired
+                error = getattr(entry.result, 'error', None)
+                results[entry.custom_id] = BatchResult(error=f"{entry.result.type}: {error}" if error else entry.result.type)
+                continue
+            message = entry.result.message
+            usage = getattr(message, 'usage', None)
+            results[entry.custom_id] = BatchResult(
+                text=''.join(block.text if hasattr(block, 'text') else str(block) for block in message.content),
+                truncated=message.stop_reason == 'max_tokens',
+                input_tokens=usage.input_tokens if usage else 0,
+                output_tokens=usage.output_tokens if usage else 0,
+            )
+        return results
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API (JSONL file of /v1/chat/completions requests); Groq's batch API has the same shape."""
+
+    FINISHED = ('completed', 'failed', 'expired', 'cancelled')
+
+    def __init__(self, client, completion_window: str = '24h'):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, requests: List[dict]) -> str:
+        lines = [json.dumps({'custom_id': request['custom_id'], 'method': 'POST', 'url': '/v1/chat/completions',
+                             'body': request['params']}) for request in requests]
+        input_file = self.client.files.create(file=('batch_requests.jsonl', '\n'.join(lines).encode('utf-8')),
+                                              purpose='batch')
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint='/v1/chat/completions',
+                                           completion_window=self.completion_window)
+        return batch.id
+
+    def done(self, batch_id: str) -> bool:
+        return self.client.batches.retrieve(batch_id).status in self.FINISHED
+
+    def _file_lines(self, file_id: Optional[str]) -> List[dict]:
+        if not file_id:
+            return []
+        content = self.client.files.content(file_id)
+        # openai returns the text as a property, groq as a method
+        text = content.text() if callable(content.text) else content.text
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    def results(self, batch_id: str) -> Dict[str, BatchResult]:
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+        for line in self._file_lines(batch.output_file_id) + self._file_lines(getattr(batch, 'error_file_id', None)):
+            response = line.get('response') or {}
+            body = response.get('body') or {}
+            if line.get('error') or response.get('status_code') != 200:
+                results[line['custom_id']] = BatchResult(error=str(line.get('error') or body.get('error') or body))
+                continue
+            choice = body['choices'][0]
+            usage = body.get('usage') or {}
+            results[line['custom_id']] = BatchResult(
+                text=choice['message'].get('content') or '',
+                truncated=choice.get('finish_reason') == 'length',
+                input_tokens=usage.get('prompt_tokens', 0),
+                output_tokens=usage.get('completion_tokens', 0),
+            )
+        if batch.status != 'completed':
+            print(f"[batch] {batch_id} {batch.status}")
+        return results
+
+
+class LocalBatchServer:
+    """
+    File-based stand-in for a provider batch endpoint, for tests and offline runs.
+
+    Each batch is a directory <batch_dir>/<batch_id> holding requests.jsonl, written by
+    LocalBatchBackend, and results.jsonl, written here once the batch is processed.
+    """
+
+    def __init__(self, batch_dir: str, responder: Callable[[dict], Union[str, dict]], latency: float = 0.0):
+        """
+        Args:
+            batch_dir: Directory shared with LocalBatchBackend
+            responder: Reply to one request dict ('custom_id', 'params', 'output_file'), either
+                the text or a dict of BatchResult fields (e.g. to simulate truncation)
+            latency: Seconds a batch stays in progress after it was submitted
+        """
+        self.batch_dir = Path(batch_dir)
+        self.responder = responder
+        self.latency = latency
+
+    @classmethod
+    def from_replay_store(cls, batch_dir: str, replay_store, latency: float = 0.0) -> 'LocalBatchServer':
+        # Serve recorded responses, matched like ReplayStore.lookup
+        return cls(batch_dir, lambda request: replay_store.lookup(request['params']['messages'][0]['content'],
+                                                                  request['output_file']), latency)
+
+    def process_pending(self) -> int:
+        """
+        Answer every submitted batch whose latency has passed.
+
+        Returns:
+            Number of batches processed
+        """
+        processed = 0
+        for batch_path in sorted(self.batch_dir.glob('*/requests.jsonl')):
+            results_path = batch_path.parent / 'results.jsonl'
+            if results_path.exists() or time.time() - batch_path.stat().st_mtime < self.latency:
+                continue
+            lines = []
+            for line in batch_path.read_text(encoding='utf-8').splitlines():
+                request = json.loads(line)
+                try:
+                    reply = self.responder(request)
+                    result = BatchResult(**reply) if isinstance(reply, dict) else BatchResult(text=reply)
+                except Exception as e:
+                    result = BatchResult(error=f"{type(e).__name__}: {e}")
+                lines.append(json.dumps({'custom_id': request['custom_id'], **result.__dict__}))
+            # Write then rename, so a polling backend never reads partial results
+            temp_path = results_path.with_suffix('.tmp')
+            temp_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+            os.replace(temp_path, results_path)
+            processed += 1
+        return processed
+
+    def serve(self, poll_interval: float = 1.0) -> None:
+        # Run as a separate process: python -m src.processing.BatchClient --batch-dir ... --replay-store ...
+        print(f"[batch] Serving batches in {self.batch_dir}")
+        while True:
+            if self.process_pending():
+                print(f"[batch] Processed batches in {self.batch_dir}")
+            time.sleep(poll_interval)
+
+
+class LocalBatchBackend:
+    """Batch backend writing requests to a LocalBatchServer directory and reading its results."""
+
+    def __init__(self, batch_dir: str, server: Optional[LocalBatchServer] = None):
+        """
+        Args:
+            batch_dir: Directory the server watches
+            server: Server processed in-process while polling; without one, results are
+                expected from a server running in another process
+        """
+        self.batch_dir = Path(batch_dir)
+        self.server = server
+
+    def submit(self, requests: List[dict]) -> str:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        batch_path = self.batch_dir / batch_id
+        batch_path.mkdir(parents=True)
+        temp_path = batch_path / 'requests.tmp'
+        temp_path.write_text('\n'.join(json.dumps(request) for request in requests) + '\n', encoding='utf-8')
+        os.replace(temp_path, batch_path / 'requests.jsonl')
+        return batch_id
+
+    def done(self, batch_id: str) -> bool:
+        if self.server is not None:
+            self.server.process_pending()
+        return (self.batch_dir / batch_id / 'results.jsonl').exists()
+
+    def results(self, batch_id: str) -> Dict[str, BatchResult]:
+        results = {}
+        for line in (self.batch_dir / batch_id / 'results.jsonl').read_text(encoding='utf-8').splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                custom_id = entry.pop('custom_id')
+                results[custom_id] = BatchResult(**entry)
+        return results
+
+
+class BatchClient:
+    """Requests collected from an LLMInferencer, sent as one batch job and written back to their output files."""
+
+    def __init__(self, inferencer, backend, poll_interval: float = 30.0, timeout: Optional[float] = None):
+        """
+        Args:
+            inferencer: LLMInferencer whose calls are collected (see LLMInferencer.start_batch)
+            backend: AnthropicBatchBackend, OpenAIBatchBackend or LocalBatchBackend
+            poll_interval: Seconds between status checks
+            timeout: Give up waiting after this many seconds (None: wait for the provider,
+                which expires unfinished batches after 24 hours)
+        """
+        self.inferencer = inferencer
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # (output file, text or request ID, is request) in call order, replayed into the files by run()
+        self._writes: List[Tuple[str, str, bool]] = []
+        self._requests: Dict[str, dict] = {}  # request ID -> prompt, output_file, max_tokens, separator
+        self._count = 0
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def add(self, prompt: str, output_file: str, max_tokens: int, separator: Optional[str] = None) -> str:
+        """
+        Queue a prompt whose reply is appended to output_file when the batch has run.
+
+        Args:
+            separator: Text queued before the reply when it continues the output file,
+                passed on to ReplayStore.record
+
+        Returns:
+            Request ID (custom_id) of the prompt
+        """
+        with self._lock:
+            self._count += 1
+            request_id = f"req{self._count:06d}"
+            self._requests[request_id] = {'prompt': prompt, 'output_file': output_file, 'max_tokens': max_tokens,
+                                          'separator': separator}
+            self._writes.append((output_file, request_id, True))
+        return request_id
+
+    def add_text(self, output_file: str, text: str) -> None:
+        # Literal text (e.g. the separator between chunk replies) kept in order with the replies
+        with self._lock:
+            self._writes.append((output_file, text, False))
+
+    def _wait(self, requests: List[dict]) -> Dict[str, BatchResult]:
+        # Submit one job and poll until the provider has finished it
+        with track(self.inferencer.metrics, 'batch', 'api', family=self.inferencer.family, requests=len(requests)) as span:
+            batch_id = self.backend.submit(requests)
+            print(f"[batch] Submitted {batch_id} with {len(requests)} requests")
+            start = time.monotonic()
+            while not self.backend.done(batch_id):
+                if self.timeout is not None and time.monotonic() - start > self.timeout:
+                    raise TimeoutError(f"Batch {batch_id} not finished after {self.timeout}s")
+                time.sleep(self.poll_interval)
+            results = self.backend.results(batch_id)
+            if span is not None:
+                span['attrs']['batch_id'] = batch_id
+            if self.inferencer.metrics:
+                for result in results.values():
+                    self.inferencer.metrics.record_usage(self.inferencer.model, result.input_tokens, result.output_tokens)
+        print(f"[batch] {batch_id} finished in {time.monotonic() - start:.0f}s")
+        return results
+
+    def run(self) -> Dict[str, object]:
+        """
+        Submit every queued prompt as one job, continue replies cut off at the output limit
+        in follow-up jobs (up to the inferencer's max_continuations), then append the replies
+        to their output files in the order the calls were made. Output files with a failed
+        request are left unwritten, so they are re-run.
+
+        Returns:
+            Dict with 'requests' (number sent) and 'failed' (output file -> error)
+        """
+        with self._lock:
+            requests, writes = self._requests, self._writes
+            self._requests, self._writes = {}, []
+        if not requests:
+            return {'requests': 0, 'failed': {}}
+
+        replies = {request_id: '' for request_id in requests}
+        max_tokens = {request_id: request['max_tokens'] for request_id, request in requests.items()}
+        errors: Dict[str, str] = {}
+        pending = list(requests)
+        for attempt in range(self.inferencer.max_continuations + 1):
+            # Continuations get their own custom_id, as IDs must be unique within a batch
+            batch = [{
+                'custom_id': f"{request_id}_{attempt}" if attempt else request_id,
+                'output_file': requests[request_id]['output_file'],
+                'params': self.inferencer._request_params(
+                    self.inferencer._messages(requests[request_id]['prompt'], replies[request_id]),
+                    max_tokens[request_id]),
+            } for request_id in pending]
+            results = self._wait(batch)
+            truncated = []
+            for request_id, request in zip(pending, batch):
+                result = results.get(request['custom_id'], BatchResult(error='missing from batch results'))
+                if result.error:
+                    errors[request_id] = result.error
+                    continue
+                replies[request_id] = self.inferencer._extend(replies[request_id], result.text)
+                if result.truncated:
+                    truncated.append(request_id)
+            if not truncated:
+                break
+            if attempt == self.inferencer.max_continuations:
+                print(f"WARNING: {len(truncated)} replies still truncated after "
+                      f"{self.inferencer.max_continuations} continuations")
+                break
+            # A continuation resends the reply so far, leaving less room for output
+            pending = []
+            for request_id in truncated:
+                max_tokens[request_id] = self.inferencer._continuation_tokens(requests[request_id]['prompt'],
+                                                                              replies[request_id])
+                if max_tokens[request_id] is not None:
+                    pending.append(request_id)
+            if len(pending) < len(truncated):
+                print(f"WARNING: {len(truncated) - len(pending)} replies still truncated, no room left in the "
+                      f"context window of {self.inferencer.model} to continue them")
+            if not pending:
+                break
+            print(f"[batch] {len(pending)} replies truncated at the output limit, "
+                  f"requesting continuation {attempt + 1}/{self.inferencer.max_continuations}")
+
+        failed = {requests[request_id]['output_file']: error for request_id, error in errors.items()}
+        record_store = self.inferencer.record_store
+        for output_file, value, is_request in writes:
+            if output_file in failed:
+                continue
+            if is_request and record_store is not None:
+                record_store.record(requests[value]['prompt'], output_file, replies[value], self.inferencer.model,
+                                    requests[value]['separator'])
+            with open(output_file, 'a', encoding='utf-8') as f:
+                f.write(replies[value] if is_request else value)
+        for output_file, error in failed.items():
+            print(f"[batch] {os.path.basename(output_file)} not written: {error}")
+        return {'requests': len(requests), 'failed': failed}
+
+
+if __name__ == '__main__':
+    from src.processing.ReplayStore import ReplayStore
+
+    arg_parser = argparse.ArgumentParser(description="Serve local batch jobs from a replay store.")
+    arg_parser.add_argument('--batch-dir', required=True, help="Directory shared with LocalBatchBackend")
+    arg_parser.add_argument('--replay-store', required=True, help="Replay store JSON or experiment directory")
+    arg_parser.add_argument('--latency', type=float, default=0.0, help="Seconds each batch stays in progress")
+    arg_parser.add_argument('--poll-interval', type=float, default=1.0)
+    args = arg_parser.parse_args()
+
+    LocalBatchServer.from_replay_store(args.batch_dir, ReplayStore(args.replay_store), args.latency).serve(args.poll_interval)
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+try:
+    import h2  # HTTP/2 support for httpx (pip install "httpx[http2]")
+except ImportError:
+    h2 = None
+
+# Pool settings of the shared HTTP clients; SDK defaults are 1000 connections and 5s keep-alive
+DEFAULT_POOL = {
+    'max_connections': 64,
+    'max_keepalive_connections': 32,
+    'keepalive_expiry': 120.0,
+    'http2': True,
+}
+
+# SDK clients send their own per-request timeouts; this applies to anything else
+DEFAULT_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+
+class ClientRegistry:
+    """Provider clients shared process-wide, one pooled keep-alive HTTP client per (family, base_url, API key)."""
+
+    def __init__(self, **pool):
+        """
+        Args:
+            **pool: Overrides of DEFAULT_POOL (max_connections, max_keepalive_connections,
+                keepalive_expiry, http2); http2 is only used when the h2 package is installed
+        """
+        self._lock = threading.Lock()
+        # Keyed by (family, base_url, API key hash), so clients with different keys are never shared
+        self._clients: Dict[Tuple[str, Optional[str], Optional[str]], object] = {}  # key -> SDK client
+        self._http_clients: Dict[Tuple[str, Optional[str], Optional[str]], httpx.Client] = {}
+        self._stats: Dict[Tuple[str, Optional[str], Optional[str]], dict] = {}
+        self.pool = dict(DEFAULT_POOL)
+        self.configure(**pool)
+
+    def configure(self, **pool) -> None:
+        # Applies to clients created afterwards
+        unknown = set(pool) - set(DEFAULT_POOL)
+        if unknown:
+            raise ValueError(f"Unknown pool settings: {', '.join(sorted(unknown))}")
+        self.pool.update({name: value for name, value in pool.items() if value is not None})
+
+    def _http_client(self, key: Tuple[str, Optional[str], Optional[str]]) -> httpx.Client:
+        stats = self._stats[key]
+
+        def trace(event: str, info: dict) -> None:
+            # httpcore connection events; a request without connect_tcp reused a pooled connection
+            if event == 'connection.connect_tcp.complete':
+                with self._lock:
+                    stats['connections'] += 1
+            elif event == 'connection.start_tls.complete':
+                with self._lock:
+                    stats['tls_handshakes'] += 1
+
+        def on_request(request: httpx.Request) -> None:
+            request.extensions['trace'] = trace
+
+        def on_response(response: httpx.Response) -> None:
+            with self._lock:
+                stats['requests'] += 1
+                stats['http_versions'][response.http_version] = stats['http_versions'].get(response.http_version, 0) + 1
+
+        limits = httpx.Limits(max_connections=self.pool['max_connections'],
+                              max_keepalive_connections=self.pool['max_keepalive_connections'],
+                              keepalive_expiry=self.pool['keepalive_expiry'])
+        return httpx.Client(limits=limits, http2=bool(self.pool['http2'] and h2 is not None), timeout=DEFAULT_TIMEOUT,
+                            follow_redirects=True, event_hooks={'request': [on_request], 'response': [on_response]})
+
+    @staticmethod
+    def key_hash(api_key: Optional[str]) -> Optional[str]:
+        # Short digest identifying an API key without keeping the key itself
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12] if api_key else None
+
+    def get(self, family: str, base_url: Optional[str], factory: Callable[[httpx.Client], object],
+            api_key: Optional[str] = None):
+        """
+        The shared client for a provider endpoint and API key, created on first use.
+
+        Args:
+            family: Model family, e.g. 'claude'
+            base_url: API base URL (None for the SDK default)
+            factory: Builds the SDK client around the pooled HTTP client,
+                e.g. lambda http_client: Anthropic(api_key=key, http_client=http_client)
+            api_key: Key the factory's client is built with; clients are only shared
+                between callers using the same key
+        """
+        key = (family, base_url, self.key_hash(api_key))
+        with self._lock:
+            if key not in self._clients:
+                self._stats[key] = {'requests': 0, 'connections': 0, 'tls_handshakes': 0, 'http_versions': {}, 'users': 0}
+                self._http_clients[key] = self._http_client(key)
+                self._clients[key] = factory(self._http_clients[key])
+            self._stats[key]['users'] += 1
+            return self._clients[key]
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Connection reuse per shared client: requests sent, connections and TLS handshakes
+        opened, requests served on an already open connection, and HTTP versions used.
+        """
+        report = {}
+        with self._lock:
+            for (family, base_url, key_hash), stats in self._stats.items():
+                reused = max(0, stats['requests'] - stats['connections'])
+                name = f"{family}:{base_url or 'default'}" + (f":{key_hash}" if key_hash else '')
+                report[name] = dict(
+                    stats,
+                    http_versions=dict(stats['http_versions']),
+                    reused_requests=reused,
+                    reuse_rate=round(reused / stats['requests'], 3) if stats['requests'] else 0.0,
+                )
+        return report
+
+    def close(self) -> None:
+        # Close every pooled connection; later get() calls create new clients
+        with self._lock:
+            for http_client in self._http_clients.values():
+                http_client.close()
+            self._clients.clear()
+            self._http_clients.clear()
+
+
+# Registry used by every LLMInferencer unless one is passed in
+REGISTRY = ClientRegistry()
@@ -0,0 +1,267 @@
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.processing.GuidelineIndex import GuidelineIndex
+from src.processing.RuleProcessor import RuleProcessor
+from src.processing.RunMetrics import track
+
+
+class CorpusRunner:
+    """Runs constants -> predicates -> rules -> fired program over every guideline file in a directory."""
+
+    # Stage name -> output file written in each guideline's result directory
+    STAGE_FILES = {
+        'constants': 'constant_response.txt',
+        'predicates': 'predicate_response.txt',
+        'rulegen': 'rulegen_response.txt',
+        'fired': 'rulegen_response_fired.lp',
+    }
+
+    # Stages finished in a guideline's result directory, one name per line
+    COMPLETED_FILE = 'completed_stages.txt'
+
+    REPORT_FIELDS = ['guideline', 'status', 'characters', 'clauses', 'rules',
+                     'constants_s', 'predicates_s', 'rulegen_s', 'fired_s', 'total_s', 'characters_per_s', 'error']
+
+    def __init__(self, config: dict, inferencer, metrics=None, max_workers: int = 4, overwrite: bool = False):
+        """
+        Args:
+            config: Pipeline config (prompt templates are read from config['input_files'])
+            inferencer: LLMInferencer shared by all files, so the client, its connection pool
+                and the prompt template cache are reused
+            metrics: Optional RunMetrics
+            max_workers: Guideline files processed concurrently
+            overwrite: Re-run stages whose output already exists (otherwise they are reused,
+                so an interrupted corpus run resumes where it stopped)
+        """
+        self.config = config
+        self.inferencer = inferencer
+        self.metrics = metrics
+        self.max_workers = max_workers
+        self.overwrite = overwrite
+
+    @staticmethod
+    def guideline_files(input_dir: str, pattern: str = '*.txt') -> List[Path]:
+        return sorted(Path(input_dir).glob(pattern))
+
+    def _completed(self, output_dir: Path) -> set:
+        path = output_dir / self.COMPLETED_FILE
+        if not path.exists():
+            return set()
+        return set(path.read_text(encoding='utf-8').split())
+
+    def _set_completed(self, output_dir: Path, stage: str, done: bool) -> None:
+        # Rewrite the manifest (write then rename, so it is never left half written)
+        stages = self._completed(output_dir)
+        stages = stages | {stage} if done else stages - {stage}
+        temp_path = output_dir / (self.COMPLETED_FILE + '.tmp')
+        temp_path.write_text(''.join(f"{name}\n" for name in sorted(stages)), encoding='utf-8')
+        os.replace(temp_path, output_dir / self.COMPLETED_FILE)
+
+    def _needs_run(self, output_path: Path, stage: str) -> bool:
+        # Only outputs of stages recorded as finished are reused: a stage interrupted between
+        # prompt chunks or reply continuations leaves a partial file that must be redone
+        if output_path.exists() and stage in self._completed(output_path.parent) and not self.overwrite:
+            return False
+        self._set_completed(output_path.parent, stage, False)
+        # LLM replies are appended to their output file, so clear stale output first
+        if output_path.exists():
+            output_path.unlink()
+        return True
+
+    def _stages(self, problem_text: str, outputs: Dict[str, Path], processor: RuleProcessor) -> List[tuple]:
+        # (stage, callable) in pipeline order for one guideline
+        input_files = self.config['input_files']
+        return [
+            ('constants', lambda: self.inferencer.run_constant_inference(
+                input_files['constant_prompt'], problem_text, str(outputs['constants']))),
+            ('predicates', lambda: self.inferencer.run_predicate_inference(
+                input_files['predicate_prompt'], problem_text, str(outputs['constants']),
+                str(outputs['predicates']))),
+            ('rulegen', lambda: self.inferencer.run_rulegen_inference(
+                input_files['rule_generation_prompt'], problem_text, str(outputs['constants']),
+                str(outputs['predicates']), str(outputs['rulegen']))),
+            ('fired', lambda: processor.append_fired_rules(
+                str(outputs['rulegen']), str(outputs['fired']),
+                encoding=self.config['experiment'].get('fired_encoding', 'duplicate'))),
+        ]
+
+    def run_file(self, guideline_path: Path, output_dir: Path) -> Dict[str, object]:
+        """
+        Run every stage for one guideline file.
+
+        Returns:
+            Report row with per-stage seconds, size and status
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        outputs = {stage: output_dir / name for stage, name in self.STAGE_FILES.items()}
+        problem_text = str(guideline_path)
+
+        row: Dict[str, object] = {'guideline': guideline_path.name, 'status': 'ok', 'error': ''}
+        start = time.perf_counter()
+        stage = None
+        try:
+            with track(self.metrics, 'corpus_file', 'corpus', guideline=guideline_path.name):
+                index = GuidelineIndex.from_file(problem_text)
+                row['characters'] = len(index.text)
+                row['clauses'] = len(index)
+
+                processor = RuleProcessor(problem_text, metrics=self.metrics)
+                stages = self._stages(problem_text, outputs, processor)
+                for stage, run in stages:
+                    stage_start = time.perf_counter()
+                    if self._needs_run(outputs[stage], stage):
+                        run()
+                        self._set_completed(output_dir, stage, True)
+                    row[f'{stage}_s'] = round(time.perf_counter() - stage_start, 3)
+                # Feed this guideline's vocabulary to the ones still to run
+                if self.inferencer.vocabulary is not None:
+                    self.inferencer.vocabulary.add_experiment_dir(str(output_dir))
+                # Count from the file, so resumed runs report it too
+                with open(outputs['fired'], 'r', encoding='utf-8') as f:
+                    row['rules'] = sum(line.startswith('fired(') for line in f)
+        except Exception as e:
+            self._fail(row, stage, e)
+
+        row['total_s'] = round(time.perf_counter() - start, 3)
+        row['characters_per_s'] = round(row.get('characters', 0) / row['total_s'], 1) if row['total_s'] else 0.0
+        return row
+
+    def run(self, input_dir: str, output_dir: str, pattern: str = '*.txt',
+            report_path: Optional[str] = None) -> List[Dict[str, object]]:
+        """
+        Process every guideline file in a directory with bounded concurrency.
+        Each file gets its own result directory named after the file.
+
+        Args:
+            input_dir: Directory of guideline texts (e.g. src/input_files/input_guidelines/test)
+            output_dir: Directory receiving one sub-directory per guideline
+            pattern: Glob for guideline files
+            report_path: Per-file throughput CSV (default: output_dir/corpus_report.csv)
+
+        Returns:
+            Report rows in file order
+        """
+        files = self.guideline_files(input_dir, pattern)
+        print(f"[corpus] {len(files)} guideline files, {self.max_workers} workers")
+        start = time.perf_counter()
+
+        rows: Dict[Path, Dict[str, object]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.run_file, path, Path(output_dir) / path.stem): path for path in files}
+            for future in as_completed(futures):
+                path = futures[future]
+                rows[path] = future.result()
+                print(f"[corpus] {path.name}: {rows[path]['status']} in {rows[path]['total_s']:.1f}s")
+
+        return self._finish([rows[path] for path in files], output_dir, report_path, time.perf_counter() - start)
+
+    def run_batched(self, input_dir: str, output_dir: str, pattern: str = '*.txt', report_path: Optional[str] = None,
+                    poll_interval: float = 30.0, timeout: Optional[float] = None) -> List[Dict[str, object]]:
+        """
+        Process every guideline file through the provider's batch API (see LLMInferencer.start_batch).
+        Each stage reads the previous stage's output, so every LLM stage of the whole corpus
+        is one batch job; the stage seconds in the report are that job's wall time.
+
+        Args:
+            input_dir, output_dir, pattern, report_path: As for run()
+            poll_interval: Seconds between batch status checks
+            timeout: Seconds to wait for each batch (None: until the provider finishes it)
+
+        Returns:
+            Report rows in file order
+        """
+        files = self.guideline_files(input_dir, pattern)
+        print(f"[corpus] {len(files)} guideline files, batch mode")
+        start = time.perf_counter()
+
+        rows: Dict[Path, Dict[str, object]] = {}
+        jobs: Dict[Path, tuple] = {}  # path -> (outputs, stages)
+        for path in files:
+            rows[path] = {'guideline': path.name, 'status': 'ok', 'error': ''}
+            file_dir = Path(output_dir) / path.stem
+            file_dir.mkdir(parents=True, exist_ok=True)
+            outputs = {stage: file_dir / name for stage, name in self.STAGE_FILES.items()}
+            try:
+                index = GuidelineIndex.from_file(str(path))
+                rows[path]['characters'] = len(index.text)
+                rows[path]['clauses'] = len(index)
+                jobs[path] = (outputs, dict(self._stages(str(path), outputs, RuleProcessor(str(path), metrics=self.metrics))))
+            except Exception as e:
+                self._fail(rows[path], None, e)
+
+        def fail(path, stage, error):
+            self._fail(rows[path], stage, error)
+            jobs.pop(path, None)
+
+        self.inferencer.start_batch(poll_interval=poll_interval, timeout=timeout)
+        try:
+            for stage in ['constants', 'predicates', 'rulegen']:
+                stage_start = time.perf_counter()
+                queued = set()
+                with track(self.metrics, f'corpus_batch_{stage}', 'corpus', files=len(jobs)):
+                    for path, (outputs, stages) in list(jobs.items()):
+                        try:
+                            if self._needs_run(outputs[stage], stage):
+                                stages[stage]()
+                                queued.add(path)
+                        except Exception as e:
+                            fail(path, stage, e)
+                    failed = self.inferencer.run_batch()['failed']
+                for path, (outputs, _) in list(jobs.items()):
+                    if str(outputs[stage]) in failed:
+                        fail(path, stage, failed[str(outputs[stage])])
+                        continue
+                    if path in queued:
+                        self._set_completed(outputs[stage].parent, stage, True)
+                    rows[path][f'{stage}_s'] = round(time.perf_counter() - stage_start, 3)
+        finally:
+            self.inferencer.stop_batch()
+
+        for path, (outputs, stages) in jobs.items():
+            try:
+                stage_start = time.perf_counter()
+                if self._needs_run(outputs['fired'], 'fired'):
+                    stages['fired']()
+                    self._set_completed(outputs['fired'].parent, 'fired', True)
+                rows[path]['fired_s'] = round(time.perf_counter() - stage_start, 3)
+                if self.inferencer.vocabulary is not None:
+                    self.inferencer.vocabulary.add_experiment_dir(str(outputs['fired'].parent))
+                with open(outputs['fired'], 'r', encoding='utf-8') as f:
+                    rows[path]['rules'] = sum(line.startswith('fired(') for line in f)
+            except Exception as e:
+                self._fail(rows[path], 'fired', e)
+
+        for row in rows.values():
+            row['total_s'] = round(sum(row.get(f'{stage}_s', 0) for stage in self.STAGE_FILES), 3)
+            row['characters_per_s'] = round(row.get('characters', 0) / row['total_s'], 1) if row['total_s'] else 0.0
+        return self._finish([rows[path] for path in files], output_dir, report_path, time.perf_counter() - start)
+
+    @staticmethod
+    def _fail(row: Dict[str, object], stage: Optional[str], error) -> None:
+        row['status'] = f'failed at {stage}'
+        row['error'] = str(error)
+        print(f"[corpus] {row['guideline']} failed at {stage}: {error}")
+
+    def _finish(self, report: List[Dict[str, object]], output_dir: str, report_path: Optional[str],
+                elapsed: float) -> List[Dict[str, object]]:
+        # Save the vocabulary and the report, and print the corpus throughput
+        if self.inferencer.vocabulary is not None and self.inferencer.vocabulary.registry_path:
+            self.inferencer.vocabulary.save()
+        self.write_report(report, report_path or os.path.join(output_dir, 'corpus_report.csv'))
+        succeeded = sum(row['status'] == 'ok' for row in report)
+        rate = len(report) / elapsed * 60 if elapsed else 0.0
+        print(f"[corpus] {succeeded}/{len(report)} files succeeded in {elapsed:.1f}s ({rate:.1f} files/min)")
+        return report
+
+    def write_report(self, report: List[Dict[str, object]], report_path: str) -> None:
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        with open(report_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.REPORT_FIELDS, restval='')
+            writer.writeheader()
+            writer.writerows(report)
+        print(f"[corpus] Report written to {report_path}")
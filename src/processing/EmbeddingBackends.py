@@ -0,0 +1,54 @@
+import platform
+from typing import Optional
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+# Backend name -> SentenceTransformer keyword arguments
+EMBEDDING_BACKENDS = {
+    # float32 PyTorch model (original behaviour)
+    'torch': {},
+    # ONNX Runtime export of the same weights
+    'onnx': {'backend': 'onnx'},
+    # Dynamically quantized int8 ONNX model; the file is picked per CPU in quantized_model_file()
+    'onnx-int8': {'backend': 'onnx'},
+}
+
+
+def quantized_model_file() -> str:
+    # all-MiniLM-L6-v2 ships int8 ONNX files per instruction set; AVX2 runs on any recent x86 CPU
+    # (pass quantized_file='onnx/model_qint8_avx512.onnx' to load_embedding_model on AVX-512 machines)
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return 'onnx/model_qint8_arm64.onnx'
+    return 'onnx/model_quint8_avx2.onnx'
+
+
+def load_embedding_model(backend: str = 'torch', model_name: str = DEFAULT_MODEL, quantized_file: Optional[str] = None):
+    """
+    Load a sentence embedding model for graph metrics. Every backend returns a
+    SentenceTransformer, so callers only rely on encode().
+
+    Args:
+        backend: 'torch', 'onnx' or 'onnx-int8'
+        model_name: Hugging Face model name or local path
+        quantized_file: ONNX file to load for 'onnx-int8' (defaults to the file for this CPU)
+
+    Returns:
+        SentenceTransformer instance
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Use one of {list(EMBEDDING_BACKENDS)}")
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend != 'torch':
+        try:
+            import onnxruntime  # noqa: F401
+            import optimum.onnxruntime  # noqa: F401
+        except ImportError as e:
+            raise ImportError(f"Embedding backend '{backend}' needs ONNX Runtime and Optimum: "
+                              f"pip install \"sentence-transformers[onnx]\" ({e})") from e
+
+    kwargs = dict(EMBEDDING_BACKENDS[backend])
+    if backend == 'onnx-int8':
+        kwargs['model_kwargs'] = {'file_name': quantized_file or quantized_model_file()}
+    return SentenceTransformer(model_name, device='cpu' if backend != 'torch' else None, **kwargs)
@@ -0,0 +1,190 @@
+import bisect
+import hashlib
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Numbered token at the start of a line, e.g. "1.2" (section) or "1.2.3" (clause)
+NUMBER_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)\b')
+
+# Parsed indexes keyed by the SHA-256 of the guideline file, shared by every consumer
+_INDEX_CACHE: Dict[str, 'GuidelineIndex'] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _id_key(clause_id: str) -> Tuple[int, ...]:
+    # Sortable integer tuple for a dotted ID (non-numeric parts sort as 0)
+    parts = []
+    for part in clause_id.split('.'):
+        digits = ''.join(ch for ch in part if ch.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+@dataclass
+class Clause:
+    """A numbered guideline recommendation (e.g. 1.2.3) with its section context."""
+
+    id: str
+    section: Optional[str]
+    context: Tuple[str, ...]
+    lines: List[str]
+    start: int  # offset of the clause's first line in the guideline text
+    end: int    # offset just past its last line
+
+    @property
+    def text(self) -> str:
+        # Context on its own lines, a blank line, then the clause text
+        formatted = ""
+        if self.context:
+            formatted += "\n".join(self.context)
+            if self.lines:
+                formatted += "\n\n"
+        formatted += "\n".join(self.lines)
+        return formatted.strip()
+
+
+@dataclass
+class Section:
+    """A section header (e.g. 1.2 Referral) and the clauses under it."""
+
+    id: str
+    title: str
+    start: int
+    parent: Optional[str] = None
+    children: List[str] = field(default_factory=list)
+    clause_ids: List[str] = field(default_factory=list)
+
+
+class GuidelineIndex:
+    """Section -> clause tree of a guideline text, parsed once and shared per file hash."""
+
+    def __init__(self, text: str):
+        """
+        Args:
+            text: Guideline text (e.g. the contents of pancreatic_cancer_guidelines.txt)
+        """
+        self.text = text
+        self.sections: Dict[str, Section] = {}
+        self.clauses: Dict[str, Clause] = {}
+        self._parse()
+        # Clause IDs in numeric order, for prefix range queries
+        self._sorted_ids = sorted(self.clauses, key=_id_key)
+        self._sorted_keys = [_id_key(clause_id) for clause_id in self._sorted_ids]
+
+    @classmethod
+    def from_file(cls, guideline_path: str) -> 'GuidelineIndex':
+        """
+        Return the index for a guideline file, parsing it only the first time its content is seen.
+        """
+        with open(guideline_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with _CACHE_LOCK:
+            if digest not in _INDEX_CACHE:
+                # Decode like FileManager.load_file (text mode, universal newlines)
+                text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+                _INDEX_CACHE[digest] = cls(text)
+            return _INDEX_CACHE[digest]
+
+    def _parse(self) -> None:
+        current: Optional[Clause] = None
+        section_id: Optional[str] = None
+        section_context: Tuple[str, ...] = ()  # active context block for the section
+        context_active = False  # whether we're currently collecting a context block
+        offset = 0
+
+        def flush():
+            # Clauses with no text at all are dropped; a repeated ID replaces the earlier clause
+            nonlocal current
+            if current is not None and (current.context or current.lines):
+                repeated = current.id in self.clauses
+                self.clauses[current.id] = current
+                if current.section in self.sections and not repeated:
+                    self.sections[current.section].clause_ids.append(current.id)
+            current = None
+
+        for raw in self.text.splitlines(keepends=True):
+            line_start, offset = offset, offset + len(raw)
+            stripped = raw.strip()
+
+            match = NUMBER_PATTERN.match(stripped)
+            if match:
+                num = match.group(1)
+                flush()
+                if num.count('.') >= 2:
+                    rest = stripped[len(num):].strip(" .-")
+                    current = Clause(num, section_id, section_context, [rest] if rest else [],
+                                     line_start, offset)
+                else:
+                    # Section header like "1.1 Diagnosis" -> reset context
+                    parent = num.rsplit('.', 1)[0] if '.' in num else None
+                    self.sections[num] = Section(num, stripped[len(num):].strip(" .-"), line_start,
+                                                 parent if parent in self.sections else None)
+                    if parent in self.sections:
+                        self.sections[parent].children.append(num)
+                    section_id = num
+                    section_context = ()
+                    context_active = False
+                continue
+
+            # Blank line ends the clause; the next text starts a new context block
+            if stripped == "":
+                flush()
+                context_active = False
+                continue
+
+            # Bullets and continuation lines belong to the open clause
+            if current is not None:
+                current.lines.append(stripped)
+                current.end = offset
+                continue
+
+            # Otherwise it's context text before the clauses of the section
+            if not context_active:
+                section_context = (stripped,)
+                context_active = True
+            else:
+                section_context = section_context + (stripped,)
+
+        flush()
+
+    def __contains__(self, clause_id: str) -> bool:
+        return clause_id in self.clauses
+
+    def __getitem__(self, clause_id: str) -> str:
+        return self.clauses[clause_id].text
+
+    def __len__(self) -> int:
+        return len(self.clauses)
+
+    def get(self, clause_id: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Text of a clause by dotted ID, e.g. '1.2.3'.
+        """
+        clause = self.clauses.get(clause_id)
+        return clause.text if clause is not None else default
+
+    def prefix(self, prefix: str) -> List[Clause]:
+        """
+        All clauses under a dotted prefix in numeric order, e.g. '1.2' or '1.2.*'.
+        """
+        prefix = prefix.rstrip('*').rstrip('.')
+        key = _id_key(prefix)
+        lo = bisect.bisect_left(self._sorted_keys, key)
+        hi = bisect.bisect_left(self._sorted_keys, key[:-1] + (key[-1] + 1,))
+        return [self.clauses[clause_id] for clause_id in self._sorted_ids[lo:hi]]
+
+    def source(self, clause_id: str) -> str:
+        """
+        The clause exactly as written in the guideline text (from its number to its last line).
+        """
+        clause = self.clauses[clause_id]
+        return self.text[clause.start:clause.end]
+
+    def as_lookup(self) -> Dict[str, str]:
+        """
+        Clause ID -> formatted text, in document order (the format RuleProcessor has always used).
+        """
+        return {clause_id: clause.text for clause_id, clause in self.clauses.items()}
@@ -0,0 +1,212 @@
+import re
+from typing import Dict, List, Mapping, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.processing.FileManager import FileManager
+
+
+class K2PEvaluator:
+    """Scores clingo fired-rule results against the K2P ground truth."""
+
+    def __init__(self):
+        self.file_manager = FileManager()
+
+    def load_ground_truth(self, gt_path: str) -> Dict[int, Set[str]]:
+        """
+        Load the expected fired rules for each patient.
+
+        Args:
+            gt_path: Path to K2P_ground_truth.csv (columns: Patient, Rules to fire)
+
+        Returns:
+            Dictionary mapping patient ID to the set of rule IDs expected to fire
+        """
+        gt_df = pd.read_csv(gt_path, dtype={'Patient': int, 'Rules to fire': str})
+        rules = (
+            gt_df['Rules to fire']
+            .fillna('')
+            .str.strip()
+            .str.strip('[]')
+            .str.split(';')
+        )
+        return {
+            int(patient): {r.strip() for r in rule_list if r.strip()}
+            for patient, rule_list in zip(gt_df['Patient'], rules)
+        }
+
+    def load_fired_rules(self, clingo_output_path: str) -> Dict[int, Set[str]]:
+        """
+        Collect the rules fired for each patient from a clingo output file.
+        Rules fired in any answer set of a patient are counted as fired.
+
+        Args:
+            clingo_output_path: Path to clingo_output.txt written by run_clingo_for_patients
+
+        Returns:
+            Dictionary mapping patient ID to the set of fired rule IDs
+        """
+        clingo_output = self.file_manager.load_file(clingo_output_path)
+        patient_sections = re.split(r'=== Patient\s+(\d+)\s+===', clingo_output)[1:]
+        fired_pattern = re.compile(r'fired\("([^"]+)"\)')
+
+        fired_by_patient: Dict[int, Set[str]] = {}
+        for i in range(0, len(patient_sections), 2):
+            patient_id = int(patient_sections[i])
+            fired_by_patient.setdefault(patient_id, set()).update(
+                fired_pattern.findall(patient_sections[i + 1])
+            )
+        return fired_by_patient
+
+    def build_rule_matrix(self, rules_by_patient: Mapping[int, Set[str]], patients: List[int],
+                          rules: List[str]) -> np.ndarray:
+        """
+        Build a patient x rule boolean matrix.
+
+        Args:
+            rules_by_patient: Mapping of patient ID to rule IDs
+            patients: Row order of the matrix
+            rules: Column order of the matrix
+
+        Returns:
+            Boolean array of shape (len(patients), len(rules))
+        """
+        patient_idx = {p: i for i, p in enumerate(patients)}
+        rule_idx = {r: j for j, r in enumerate(rules)}
+
+        rows, cols = [], []
+        for patient, patient_rules in rules_by_patient.items():
+            if patient not in patient_idx:
+                continue
+            for rule in patient_rules:
+                if rule in rule_idx:
+                    rows.append(patient_idx[patient])
+                    cols.append(rule_idx[rule])
+
+        matrix = np.zeros((len(patients), len(rules)), dtype=bool)
+        matrix[rows, cols] = True
+        return matrix
+
+    @staticmethod
+    def _safe_div(num, den):
+        num = np.asarray(num, dtype=float)
+        den = np.asarray(den, dtype=float)
+        return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+    def _scores(self, tp, fp, fn) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        precision = self._safe_div(tp, tp + fp)
+        recall = self._safe_div(tp, tp + fn)
+        f1 = self._safe_div(2 * precision * recall, precision + recall)
+        return precision, recall, f1
+
+    def score(self, gt_by_patient: Mapping[int, Set[str]],
+              fired_by_patient: Mapping[int, Set[str]]) -> Dict[str, object]:
+        """
+        Compute global, per-patient and per-rule metrics.
+
+        Args:
+            gt_by_patient: Expected rule IDs per patient
+            fired_by_patient: Fired rule IDs per patient
+
+        Returns:
+            Dictionary with 'global' (micro-averaged metrics), 'per_patient' and
+            'per_rule' DataFrames
+        """
+        patients = sorted(set(gt_by_patient) | set(fired_by_patient))
+        rules = sorted(set().union(*gt_by_patient.values(), *fired_by_patient.values()))
+
+        gt = self.build_rule_matrix(gt_by_patient, patients, rules)
+        pred = self.build_rule_matrix(fired_by_patient, patients, rules)
+
+        tp_m = gt & pred
+        fp_m = pred & ~gt
+        fn_m = gt & ~pred
+
+        # Per-patient metrics (row sums)
+        tp, fp, fn = tp_m.sum(axis=1), fp_m.sum(axis=1), fn_m.sum(axis=1)
+        precision, recall, f1 = self._scores(tp, fp, fn)
+        per_patient = pd.DataFrame({
+            'Patient': patients,
+            'TP': tp, 'FP': fp, 'FN': fn,
+            'Precision': precision, 'Recall': recall, 'F1': f1,
+        }).set_index('Patient')
+
+        # Per-rule confusion (column sums)
+        tp, fp, fn = tp_m.sum(axis=0), fp_m.sum(axis=0), fn_m.sum(axis=0)
+        tn = len(patients) - tp - fp - fn
+        precision, recall, f1 = self._scores(tp, fp, fn)
+        per_rule = pd.DataFrame({
+            'rule_id': rules,
+            'TP': tp, 'FP': fp, 'FN': fn, 'TN': tn,
+            'Precision': precision, 'Recall': recall, 'F1': f1,
+        }).set_index('rule_id')
+
+        # Global micro-averaged metrics over all patient-rule pairs
+        total_tp, total_fp, total_fn = int(tp_m.sum()), int(fp_m.sum()), int(fn_m.sum())
+        precision, recall, f1 = self._scores(total_tp, total_fp, total_fn)
+        global_metrics = {
+            'patients': len(patients),
+            'rules': len(rules),
+            'TP': total_tp, 'FP': total_fp, 'FN': total_fn,
+            'Precision': float(precision), 'Recall': float(recall), 'F1': float(f1),
+        }
+
+        return {'global': global_metrics, 'per_patient': per_patient, 'per_rule': per_rule}
+
+    def evaluate(self, gt_path: str, clingo_output_path: str) -> Dict[str, object]:
+        """
+        Score one clingo output file against a K2P ground truth file.
+
+        Args:
+            gt_path: Path to K2P_ground_truth.csv
+            clingo_output_path: Path to clingo_output.txt
+
+        Returns:
+            Same structure as score()
+        """
+        return self.score(self.load_ground_truth(gt_path), self.load_fired_rules(clingo_output_path))
+
+    def evaluate_experiments(self, experiments: Mapping[str, Tuple[str, str]]) -> Dict[str, pd.DataFrame]:
+        """
+        Score several experiments in one call.
+
+        Args:
+            experiments: Mapping of experiment name to (gt_path, clingo_output_path)
+
+        Returns:
+            Dictionary with 'summary' (one row per experiment), 'per_patient' and
+            'per_rule' DataFrames, each with an 'experiment' column
+        """
+        summaries, per_patient, per_rule = [], [], []
+        gt_cache: Dict[str, Dict[int, Set[str]]] = {}
+
+        for name, (gt_path, clingo_output_path) in experiments.items():
+            if gt_path not in gt_cache:
+                gt_cache[gt_path] = self.load_ground_truth(gt_path)
+            result = self.score(gt_cache[gt_path], self.load_fired_rules(clingo_output_path))
+
+            summaries.append({'experiment': name, **result['global']})
+            per_patient.append(result['per_patient'].reset_index().assign(experiment=name))
+            per_rule.append(result['per_rule'].reset_index().assign(experiment=name))
+
+        return {
+            'summary': pd.DataFrame(summaries).set_index('experiment'),
+            'per_patient': pd.concat(per_patient, ignore_index=True) if per_patient else pd.DataFrame(),
+            'per_rule': pd.concat(per_rule, ignore_index=True) if per_rule else pd.DataFrame(),
+        }
+
+    def save_metrics(self, result: Dict[str, object], output_path: str) -> None:
+        """
+        Write per-patient metrics with a final micro-averaged row to CSV.
+
+        Args:
+            result: Output of score() or evaluate()
+            output_path: Path to the CSV file
+        """
+        per_patient = result['per_patient'].reset_index()
+        overall = {'Patient': 'all', **{k: result['global'][k] for k in
+                                        ['TP', 'FP', 'FN', 'Precision', 'Recall', 'F1']}}
+        per_patient = pd.concat([per_patient, pd.DataFrame([overall])], ignore_index=True)
+        per_patient.to_csv(output_path, index=False)
+        print(f"K2P metrics written to {output_path}")
@@ -1,32 +1,121 @@
-from groq import Groq
-from openai import OpenAI
-from anthropic import Anthropic
-from src.resources.API_KEYS import API_KEYS
+import os
+import re
+import tempfile
+from src.processing.BatchClient import (AnthropicBatchBackend, BatchClient, LocalBatchBackend, LocalBatchServer,
+                                        OpenAIBatchBackend)
+from src.processing.ClientRegistry import REGISTRY
+from src.processing.RunMetrics import track
+from src.processing.TokenBudget import TokenBudget
+
+# OpenAI reasoning models take max_completion_tokens and reject max_tokens
+MAX_COMPLETION_TOKENS_PATTERN = re.compile(r'^(?:o\d|gpt-5)')
 
 class LLMInferencer:
-    def __init__(self, model, temperature, family, seed=42) -> None:
+    # Follow-up message when a reply stops at the output limit (providers without assistant prefill)
+    CONTINUE_PROMPT = "Your previous reply was cut off. Continue exactly where it stopped, without repeating anything."
+
+    def __init__(self, model, temperature, family, seed=42, metrics=None, replay_store=None, record_store=None, vocabulary=None,
+                 max_output_tokens=None, max_continuations=3, client_registry=None) -> None:
 
         self.model = model
         self.temperature = temperature
         self.seed = seed
         self.family = family
+        self.metrics = metrics  # Optional RunMetrics collecting timings and token usage
+        self.replay_store = replay_store  # ReplayStore serving responses when family is 'replay'
+        self.record_store = record_store  # Optional ReplayStore recording live responses
+        self.vocabulary = vocabulary  # Optional PredicateRegistry injected into constant/predicate prompts
+        self.budget = TokenBudget(model, max_output_tokens)  # Context/output limits and token counts of the model
+        self.max_continuations = max_continuations  # Follow-up requests for a reply truncated at the output limit
+        self._file_cache = {}  # path -> (mtime, text), so shared prompt templates are read once
+        self.batch = None  # BatchClient collecting calls while in batch mode (see start_batch)
+        self.client_registry = client_registry or REGISTRY  # Shared pooled provider clients
+        if self.family == 'replay':
+            # Offline backend: no client, no API keys
+            if self.replay_store is None:
+                raise ValueError("family 'replay' requires a replay_store")
+            self.client = None
+        else:
+            self.client = self._create_client()
+
+    def _create_client(self):
+        # Provider SDKs and keys are only imported for live backends. Clients come from the
+        # client registry, so inferencers for the same endpoint share one connection pool
+        from src.resources.API_KEYS import API_KEYS
+
         if self.family == "claude":
-            self.client = Anthropic(api_key=API_KEYS['ANTHROPIC_API_KEY'])
-        
+            from anthropic import Anthropic
+            api_key = API_KEYS['ANTHROPIC_API_KEY']
+            return self.client_registry.get(self.family, None, lambda http_client: Anthropic(
+                api_key=api_key, http_client=http_client), api_key)
         elif self.family == 'gpt':
-            self.client = OpenAI(api_key=API_KEYS['OPENAI_API_KEY'])
+            from openai import OpenAI
+            api_key = API_KEYS['OPENAI_API_KEY']
+            return self.client_registry.get(self.family, None, lambda http_client: OpenAI(
+                api_key=api_key, http_client=http_client), api_key)
         elif self.family == 'deepseek':
-            self.client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=API_KEYS['OPENROUTER_API_KEY'])
+            from openai import OpenAI
+            base_url = "https://openrouter.ai/api/v1"
+            api_key = API_KEYS['OPENROUTER_API_KEY']
+            return self.client_registry.get(self.family, base_url, lambda http_client: OpenAI(
+                base_url=base_url, api_key=api_key, http_client=http_client), api_key)
         elif self.family == 'groq':
-            self.client = Groq(api_key=API_KEYS['GROQ_API_KEY'])
+            from groq import Groq
+            api_key = API_KEYS['GROQ_API_KEY']
+            return self.client_registry.get(self.family, None, lambda http_client: Groq(
+                api_key=api_key, http_client=http_client), api_key)
+        raise ValueError(f"Unknown model family: {self.family}")
+
+    def _batch_backend(self, batch_dir=None):
+        # Batch endpoint of the family; replay runs use the local file-based stand-in
+        if self.family == "claude":
+            return AnthropicBatchBackend(self.client)
+        elif self.family in ('gpt', 'groq'):
+            return OpenAIBatchBackend(self.client)
+        elif self.family == 'replay':
+            batch_dir = batch_dir or tempfile.mkdtemp(prefix='batches_')
+            return LocalBatchBackend(batch_dir, LocalBatchServer.from_replay_store(batch_dir, self.replay_store))
+        raise ValueError(f"Model family '{self.family}' has no batch API")
+
+    def start_batch(self, backend=None, poll_interval=30.0, timeout=None, batch_dir=None):
+        """
+        Enter batch mode: prompts are queued instead of sent, and their replies are written to
+        the output files by run_batch(). Prompts that read an earlier stage's output (e.g.
+        predicates after constants) need a run_batch() in between.
+
+        Args:
+            backend: Batch backend (default: the family's batch API, or a local stand-in for replay)
+            poll_interval: Seconds between status checks
+            timeout: Seconds to wait for a batch (None: until the provider finishes it)
+            batch_dir: Directory of the local stand-in for family 'replay' (default: a temp directory)
+        """
+        self.batch = BatchClient(self, backend or self._batch_backend(batch_dir), poll_interval, timeout)
+        return self.batch
+
+    def run_batch(self) -> dict:
+        # Send the prompts queued since the last run as one batch job; batch mode stays on
+        if self.batch is None:
+            raise RuntimeError("Not in batch mode, call start_batch() first")
+        return self.batch.run()
+
+    def stop_batch(self) -> None:
+        # Return to synchronous calls; prompts queued since the last run_batch() are dropped
+        if self.batch is not None and len(self.batch):
+            print(f"[batch] Dropping {len(self.batch)} queued requests")
+        self.batch = None
 
     
     def _load_file(self, filename) -> str:
         # Read in the contexts of a file as plain text
         
         try:
+            mtime = os.path.getmtime(filename)
+            cached = self._file_cache.get(filename)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
             with open(filename, 'r', encoding='utf-8') as f:
                 file_text = f.read()
+            self._file_cache[filename] = (mtime, file_text)
         except FileNotFoundError:
             raise FileNotFoundError(f"Prompt file '{filename}' not found.")
         except Exception as e:
@@ -35,108 +124,229 @@ class LLMInferencer:
         return file_text
 
 
+    def _run_prompt(self, prompt_template:str, fields:dict, output_file:str, chunk_field:str=None,
+                    vignettes:bool=False, vocabulary_block:str=None) -> None:
+        # Format and send a prompt; if it is over the model's input budget, send one prompt per
+        # chunk of fields[chunk_field] (guideline text, or vignettes with vignettes=True) and
+        # append the replies to the output file in order
+
+        def build(values):
+            prompt = prompt_template.format(**values)
+            if vocabulary_block is not None:
+                prompt = self.vocabulary.inject(prompt, vocabulary_block)
+            return prompt
+
+        prompt = build(fields)
+        prompt_tokens = self.budget.count(prompt)
+        if chunk_field is None or prompt_tokens <= self.budget.input_budget:
+            self._callAPI(prompt, output_file)
+            return
+
+        available = self.budget.input_budget - self.budget.count(build(dict(fields, **{chunk_field: ''})))
+        if available <= 0:
+            raise ValueError(f"Prompt of {output_file} is over the {self.budget.input_budget} token input budget of "
+                             f"{self.model} even without its {chunk_field}")
+        if vignettes:
+            chunks = self.budget.split_vignettes(fields[chunk_field], available)
+        else:
+            chunks = self.budget.split_guideline(fields[chunk_field], available)
+        prompts = [build(dict(fields, **{chunk_field: chunk})) for chunk in chunks]
+        if self.family == 'replay' and not all(self.replay_store.has_prompt(chunk_prompt) for chunk_prompt in prompts):
+            # Recorded without these chunks (e.g. imported response files): replay the whole output once
+            self._callAPI(prompt, output_file)
+            return
+        print(f"Prompt is {prompt_tokens} tokens, over the {self.budget.input_budget} token budget of {self.model}: "
+              f"sending {len(chunks)} chunks of {chunk_field}")
+        for i, chunk_prompt in enumerate(prompts):
+            self._callAPI(chunk_prompt, output_file, separator="\n\n" if i else None)
+
     def run_constant_inference(self, prompt_template:str, problem_text:str, output_file:str) -> None:
         # Run the prompt and extract the constants
         
         print("Extracting the constants")
-        prompt_template = self._load_file(prompt_template)
-        problem_text = self._load_file(problem_text)
-        prompt = prompt_template.format(problem_text=problem_text)
-
-        self._callAPI(prompt, output_file)
+        with track(self.metrics, 'run_constant_inference', 'llm'):
+            prompt_template = self._load_file(prompt_template)
+            problem_text = self._load_file(problem_text)
+            block = self.vocabulary.constant_block() if self.vocabulary is not None else None
+            self._run_prompt(prompt_template, {'problem_text': problem_text}, output_file,
+                             chunk_field='problem_text', vocabulary_block=block)
         
     def run_predicate_inference(self, prompt_template:str, problem_text:str, processed_constants:str, output_file:str) -> None:
         # Run the prompt and extract the predicates
         # Relies on constants already being found
         
         print("Extracting the predicates")
-        prompt_template = self._load_file(prompt_template)
-        problem_text = self._load_file(problem_text)
-        processed_constants = self._load_file(processed_constants)
-        prompt = prompt_template.format(problem_text=problem_text, processed_constants=processed_constants)
-        self._callAPI(prompt, output_file)
+        with track(self.metrics, 'run_predicate_inference', 'llm'):
+            prompt_template = self._load_file(prompt_template)
+            problem_text = self._load_file(problem_text)
+            processed_constants = self._load_file(processed_constants)
+            block = self.vocabulary.predicate_block() if self.vocabulary is not None else None
+            self._run_prompt(prompt_template, {'problem_text': problem_text, 'processed_constants': processed_constants},
+                             output_file, chunk_field='problem_text', vocabulary_block=block)
     
     def run_rulegen_inference(self, prompt_template:str, problem_text:str, processed_constants:str, processed_predicates:str, output_file:str) -> None:
         # Run the prompt and extract the rules
         # Relies on the predicates and constants already being found
         
         print("Extracting the rules part 1")
-        prompt_template = self._load_file(prompt_template)
-        problem_text = self._load_file(problem_text)
-        processed_constants = self._load_file(processed_constants)
-        processed_predicates = self._load_file(processed_predicates)
-        prompt = prompt_template.format(problem_text=problem_text, constants=processed_constants, predicates=processed_predicates)
-        self._callAPI(prompt, output_file)
+        with track(self.metrics, 'run_rulegen_inference', 'llm'):
+            prompt_template = self._load_file(prompt_template)
+            problem_text = self._load_file(problem_text)
+            processed_constants = self._load_file(processed_constants)
+            processed_predicates = self._load_file(processed_predicates)
+            fields = {'problem_text': problem_text, 'constants': processed_constants, 'predicates': processed_predicates}
+            self._run_prompt(prompt_template, fields, output_file, chunk_field='problem_text')
     
     def extract_atoms(self, prompt_template:str, rules:str, descriptions:str, output_file:str) -> None:
         # Run the prompt and verify whether the constants/predicates are within the text
-        prompt_template = self._load_file(prompt_template)
-        rules = self._load_file(rules)
-        descriptions = self._load_file(descriptions)
-        prompt = prompt_template.format(rules=rules, descriptions=descriptions)
-
-        self._callAPI(prompt, output_file)
+        with track(self.metrics, 'extract_atoms', 'llm'):
+            prompt_template = self._load_file(prompt_template)
+            rules = self._load_file(rules)
+            descriptions = self._load_file(descriptions)
+            self._run_prompt(prompt_template, {'rules': rules, 'descriptions': descriptions}, output_file,
+                             chunk_field='descriptions', vignettes=True)
     
     def run_llm_only(self, prompt_template:str, guidelines:str, vignettes:str, output_file:str) -> None:
         # Run the prompt and return the actions suggested by the guidelines
-        prompt_template = self._load_file(prompt_template)
-        guidelines = self._load_file(guidelines)
-        vignettes = self._load_file(vignettes)
-        prompt = prompt_template.format(guidelines=guidelines, vignettes=vignettes)
-        self._callAPI(prompt, output_file)
+        with track(self.metrics, 'run_llm_only', 'llm'):
+            prompt_template = self._load_file(prompt_template)
+            guidelines = self._load_file(guidelines)
+            vignettes = self._load_file(vignettes)
+            self._run_prompt(prompt_template, {'guidelines': guidelines, 'vignettes': vignettes}, output_file,
+                             chunk_field='vignettes', vignettes=True)
 
 
 
-    def _callAPI(self, prompt:str, output_file:str) -> None:
-        # encoding = tiktoken.encoding_for_model(self.model)
-        # num_tokens = len(encoding.encode(prompt))
-        # print(f'Number of tokens: {num_tokens}')
+    def _callAPI(self, prompt:str, output_file:str, separator:str=None) -> None:
+        # separator: text written before the reply when it continues the output file (later chunks)
+        # Pre-flight check: fail before the round trip if the prompt cannot fit (replayed prompts are not sent)
+        prompt_tokens = self.budget.count(prompt)
+        if self.family == 'replay':
+            max_tokens = self.budget.max_output_tokens
+        else:
+            max_tokens = self.budget.output_tokens(prompt_tokens)
+        if separator:
+            self._save_reply(separator, output_file)
+        if self.batch is not None:
+            self.batch.add(prompt, output_file, max_tokens, separator)
+            return
         
+        with track(self.metrics, '_callAPI', 'api', family=self.family, output_file=output_file,
+                   prompt_tokens=prompt_tokens):
+            if self.family == 'replay':
+                full_response = self.replay_store.lookup(prompt, output_file)
+            else:
+                full_response = self._request(prompt, max_tokens)
+                if self.record_store is not None:
+                    self.record_store.record(prompt, output_file, full_response, self.model, separator)
 
+        self._save_reply(full_response, output_file)
+
+    def _messages(self, prompt:str, partial:str="") -> list:
+        # Messages for a prompt, continuing partial (a reply cut off at the output limit) if given
+        messages = [
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ]
+        if not partial:
+            return messages
         if self.family == "claude":
-            chat_completion = self.client.messages.create(
-                model = self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                temperature = self.temperature,
-                max_tokens = 20000 if self.model == 'claude-3-7-sonnet-20250219' else 4096
-            )
-            if hasattr(chat_completion, 'content') and isinstance(chat_completion.content, list):
-        
-                # Extract text from TextBlock objects
-                full_response = ""
-                for block in chat_completion.content:
-                    if hasattr(block, 'text'):
-                        full_response += block.text
-                    else:
-                        # Fallback if the block doesn't have a text attribute
-                        full_response += str(block)
+            # Continue by prefilling the reply so far (which must not end in whitespace)
+            return messages + [{"role": "assistant", "content": partial.rstrip()}]
+        return messages + [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": self.CONTINUE_PROMPT},
+        ]
+
+    def _extend(self, partial:str, text:str) -> str:
+        # A prefilled continuation follows the reply without its trailing whitespace
+        return (partial.rstrip() if self.family == "claude" and partial else partial) + text
+
+    def _request_params(self, messages:list, max_tokens:int) -> dict:
+        # Request parameters, shared by the synchronous and the batch endpoints
+        if self.family == "claude":
+            return {
+                "model": self.model,
+                "messages": messages,
+                "temperature": self.temperature,
+                "max_tokens": max_tokens,
+            }
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "seed": self.seed,
+        }
+        if self.family == "gpt" and MAX_COMPLETION_TOKENS_PATTERN.match(self.model):
+            params["max_completion_tokens"] = max_tokens
         else:
-            chat_completion = self.client.chat.completions.create(
-                model = self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                    
-                ],
-                temperature = self.temperature,
-                seed = self.seed,
-                
-            )
-            full_response = chat_completion.choices[0].message.content
+            params["max_tokens"] = max_tokens
+        return params
 
-        self._save_reply(full_response, output_file)
+    def _request(self, prompt:str, max_tokens:int) -> str:
+        # Send a single prompt to the provider and return the text of the reply.
+        # A reply that stops at the output limit is continued up to max_continuations times
+
+        full_response = ""
+        for attempt in range(self.max_continuations + 1):
+            params = self._request_params(self._messages(prompt, full_response), max_tokens)
+            text = ""
+            if self.family == "claude":
+                chat_completion = self.client.messages.create(**params)
+                if hasattr(chat_completion, 'content') and isinstance(chat_completion.content, list):
+            
+                    # Extract text from TextBlock objects
+                    for block in chat_completion.content:
+                        if hasattr(block, 'text'):
+                            text += block.text
+                        else:
+                            # Fallback if the block doesn't have a text attribute
+                            text += str(block)
+                usage = getattr(chat_completion, 'usage', None)
+                if self.metrics and usage:
+                    self.metrics.record_usage(self.model, usage.input_tokens, usage.output_tokens)
+                truncated = getattr(chat_completion, 'stop_reason', None) == 'max_tokens'
+            else:
+                chat_completion = self.client.chat.completions.create(**params)
+                text = chat_completion.choices[0].message.content or ""
+                usage = getattr(chat_completion, 'usage', None)
+                if self.metrics and usage:
+                    self.metrics.record_usage(self.model, usage.prompt_tokens, usage.completion_tokens)
+                truncated = chat_completion.choices[0].finish_reason == 'length'
+            full_response = self._extend(full_response, text)
+
+            if not truncated:
+                break
+            if attempt == self.max_continuations:
+                print(f"WARNING: reply still truncated after {self.max_continuations} continuations")
+                break
+            # The continuation resends the reply so far, leaving less room for output
+            max_tokens = self._continuation_tokens(prompt, full_response)
+            if max_tokens is None:
+                print(f"WARNING: reply still truncated, no room left in the context window of {self.model} to continue it")
+                break
+            print(f"Reply truncated at the output limit, requesting continuation {attempt + 1}/{self.max_continuations}")
+
+        return full_response
+
+    def _continuation_tokens(self, prompt:str, partial:str):
+        # Output tokens for a request continuing partial, or None when prompt and partial fill the context window
+        input_tokens = sum(self.budget.count(message['content']) for message in self._messages(prompt, partial))
+        try:
+            return self.budget.output_tokens(input_tokens)
+        except ValueError:
+            return None
 
      
     
     def _save_reply(self, reply:str, output_file:str) -> None:
         # Appends the LLM's reply to the output file
+        # In batch mode the text is queued, so it stays in order with the replies still to come
+        if self.batch is not None:
+            self.batch.add_text(output_file, reply)
+            return
         
         with open(output_file, 'a', encoding='utf-8') as f:
             f.write(reply)
@@ -0,0 +1,251 @@
+import argparse
+import random
+import re
+from typing import Dict, Iterator, List, Set, Tuple
+
+from src.processing.ASPRuleParser import ASPRuleParser
+from src.processing.FileManager import FileManager
+from src.processing.RuleProcessor import BOOKKEEPING_PREDICATES
+
+
+class SyntheticPatientGenerator:
+    """Generates reproducible synthetic patient atoms from the base (non-derived) body atoms of an ASP program."""
+
+    # Bookkeeping predicates added by RuleProcessor, never patient facts
+    IGNORED_PREDICATES = BOOKKEEPING_PREDICATES
+
+    ATOM_PATTERN = re.compile(r'^(\w+)\((.*)\)$')
+    VARIABLE_PATTERN = re.compile(r'^[A-Z_]\w*$')
+    COMPARISON_PATTERN = re.compile(r'^([A-Z]\w*)\s*(>=|<=|!=|==|=|>|<)\s*(\d+)$')
+    # Predicate name before an argument list, or a parenthesis (for tracking nesting)
+    HEAD_TOKEN_PATTERN = re.compile(r'([a-z_]\w*)\s*\(|[()]')
+
+    def __init__(self, program_path: str, seed: int = 42, age_range: Tuple[int, int] = (18, 95)):
+        """
+        Args:
+            program_path: Path to a (fired) ASP program, e.g. rulegen_response_fired.lp
+            seed: Seed for the random number generator, so outputs are reproducible
+            age_range: Range used for numeric arguments compared in rule bodies (e.g. age(X), X>60)
+        """
+        self.file_manager = FileManager()
+        self.parser = ASPRuleParser()
+        self.seed = seed
+        self.age_range = age_range
+
+        # Ground body atoms, e.g. have("abdominal pain")
+        self.atoms: List[str] = []
+        # Predicates with one numeric argument, e.g. age -> thresholds seen in comparisons
+        self.numeric_predicates: Dict[str, Set[int]] = {}
+        # Positive body atoms of each rule, used to make some rules fire
+        self.rule_bodies: List[List[str]] = []
+
+        self._load_program(program_path)
+
+    def _split_args(self, args: str) -> List[str]:
+        parts, current, quoted = [], "", False
+        for char in args:
+            if char == '"':
+                quoted = not quoted
+            if char == ',' and not quoted:
+                parts.append(current.strip())
+                current = ""
+            else:
+                current += char
+        if current.strip():
+            parts.append(current.strip())
+        return parts
+
+    def _expand_condition(self, condition: str) -> List[Tuple[str, bool]]:
+        # Returns (atom, negated) pairs for a body condition, expanding choice expressions
+        condition = condition.strip()
+        negated = condition.startswith('not ')
+        if negated:
+            condition = condition[4:].strip()
+
+        choice = self.parser.parse_choice_expression(condition)
+        if choice:
+            return [(option, negated) for option in choice[2]]
+        return [(condition, negated)]
+
+    def _head_predicates(self, head: str) -> Set[str]:
+        # Predicates of the atoms in a rule head (choice elements and disjunctions included),
+        # not of function terms nested in their arguments
+        head = re.sub(r'"[^"]*"', '""', head)
+        names, depth = set(), 0
+        for match in self.HEAD_TOKEN_PATTERN.finditer(head):
+            if match.group(1):
+                if depth == 0:
+                    names.add(match.group(1))
+                depth += 1
+            elif match.group(0) == '(':
+                depth += 1
+            else:
+                depth -= 1
+        return names
+
+    def _load_program(self, program_path: str) -> None:
+        seen: Set[str] = set()
+
+        rules = []
+        for line in self.file_manager.load_file(program_path).split('\n'):
+            line = line.strip()
+            if not line or line.startswith('%') or line.startswith('#') or ':-' not in line:
+                continue
+            rules.append(self.parser.parse_rule(line))
+
+        # Predicates derived by rules (e.g. offer/1) are conclusions, not patient facts
+        derived: Set[str] = set()
+        for head, _ in rules:
+            if head:
+                derived |= self._head_predicates(head)
+
+        for head, body in rules:
+            if head and head.startswith('fired('):
+                continue
+
+            conditions = self.parser.parse_body_conditions(body)
+            compared: Dict[str, Set[int]] = {}
+            for condition in conditions:
+                comparison = self.COMPARISON_PATTERN.match(condition.strip())
+                if comparison:
+                    compared.setdefault(comparison.group(1), set()).add(int(comparison.group(3)))
+
+            positive_atoms = []
+            for condition in conditions:
+                for atom, negated in self._expand_condition(condition):
+                    match = self.ATOM_PATTERN.match(atom)
+                    if not match or match.group(1) in self.IGNORED_PREDICATES or match.group(1) in derived:
+                        continue
+                    pred, args = match.groups()
+                    arg_list = self._split_args(args)
+
+                    variables = [arg for arg in arg_list if self.VARIABLE_PATTERN.match(arg)]
+                    if len(arg_list) == 1 and variables and variables[0] in compared:
+                        # Numeric predicate such as age(X) with X>60
+                        self.numeric_predicates.setdefault(pred, set()).update(compared[variables[0]])
+                        continue
+                    if variables:
+                        # Anonymous/unconstrained variables: any constant satisfies them
+                        arg_list = ['"unspecified"' if self.VARIABLE_PATTERN.match(arg) else arg
+                                    for arg in arg_list]
+                    ground_atom = f"{pred}({','.join(arg_list)})"
+
+                    if ground_atom not in seen:
+                        seen.add(ground_atom)
+                        self.atoms.append(ground_atom)
+                    if not negated:
+                        positive_atoms.append(ground_atom)
+
+            if positive_atoms:
+                self.rule_bodies.append(positive_atoms)
+
+    def generate_patient(self, rng: random.Random, min_facts: int = 2, max_facts: int = 8,
+                         rules_to_fire: int = 1) -> List[str]:
+        """
+        Generate the facts for one synthetic patient.
+
+        Args:
+            rng: Random number generator to draw from
+            min_facts: Minimum number of randomly sampled body atoms
+            max_facts: Maximum number of randomly sampled body atoms
+            rules_to_fire: Number of rules whose full positive body is added, so they can fire
+
+        Returns:
+            List of facts without the trailing period
+        """
+        facts: List[str] = []
+        for pred, thresholds in self.numeric_predicates.items():
+            low, high = self.age_range
+            # Bias towards values around the thresholds used in the rules
+            if thresholds and rng.random() < 0.5:
+                value = rng.choice(sorted(thresholds)) + rng.randint(-5, 5)
+            else:
+                value = rng.randint(low, high)
+            facts.append(f"{pred}({value})")
+
+        chosen: List[str] = []
+        if self.atoms:
+            k = min(len(self.atoms), rng.randint(min_facts, max_facts))
+            chosen.extend(rng.sample(self.atoms, k))
+        for _ in range(min(rules_to_fire, len(self.rule_bodies))):
+            chosen.extend(rng.choice(self.rule_bodies))
+
+        # Remove duplicates while keeping order
+        facts.extend(dict.fromkeys(chosen))
+        return facts
+
+    def iter_patients(self, n_patients: int, **kwargs) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Lazily generate (patient_id, facts) pairs. The same seed always yields the same cohort.
+        """
+        rng = random.Random(self.seed)
+        for patient_id in range(1, n_patients + 1):
+            yield patient_id, self.generate_patient(rng, **kwargs)
+
+    def write_atoms(self, output_path: str, n_patients: int, **kwargs) -> None:
+        """
+        Write a synthetic atoms file in the **Patient N:** format read by run_clingo_for_patients.
+
+        Args:
+            output_path: Path to the atoms file
+            n_patients: Number of patients to generate
+            **kwargs: Passed to generate_patient
+        """
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for patient_id, facts in self.iter_patients(n_patients, **kwargs):
+                f.write(f"**Patient {patient_id}:**\n")
+                for fact in facts:
+                    f.write(f"{fact}.\n")
+                f.write("\n")
+        print(f"Wrote {n_patients} synthetic patients to {output_path}")
+
+    def describe_patient(self, facts: List[str], rng: random.Random) -> str:
+        # Template a vignette in the style of PC_descriptions.txt from a patient's facts
+        age = None
+        grouped: Dict[str, List[str]] = {}
+        for fact in facts:
+            match = self.ATOM_PATTERN.match(fact)
+            if not match:
+                continue
+            pred, args = match.groups()
+            values = [arg.strip('"') for arg in self._split_args(args)]
+            if pred in self.numeric_predicates:
+                age = values[0]
+                continue
+            grouped.setdefault(pred, []).append(' '.join(values))
+
+        sex = rng.choice(['male', 'female'])
+        sentences = [f"Patient is {age} year old {sex}." if age else f"Patient is {sex}."]
+        if 'have' in grouped:
+            sentences.append(f"Symptoms include {', '.join(grouped.pop('have'))}.")
+        for pred, values in grouped.items():
+            sentences.append(f"{pred.replace('_', ' ').capitalize()}: {', '.join(values)}.")
+        return ' '.join(sentences)
+
+    def write_descriptions(self, output_path: str, n_patients: int, **kwargs) -> None:
+        """
+        Write synthetic vignettes, one per line, matching the layout of PC_descriptions.txt.
+        Uses the same seed as write_atoms, so line N describes Patient N of the atoms file.
+        """
+        describe_rng = random.Random(self.seed + 1)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write("Patient description\n")
+            for _, facts in self.iter_patients(n_patients, **kwargs):
+                f.write(self.describe_patient(facts, describe_rng) + "\n")
+        print(f"Wrote {n_patients} synthetic descriptions to {output_path}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Generate synthetic K2P patient atoms from an ASP program.")
+    arg_parser.add_argument('--program', required=True, help="Path to the ASP program (e.g. rulegen_response_fired.lp)")
+    arg_parser.add_argument('--output', required=True, help="Path to the atoms file to write")
+    arg_parser.add_argument('--patients', type=int, default=1000)
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--rules-to-fire', type=int, default=1)
+    arg_parser.add_argument('--descriptions', default=None, help="Optional path to also write vignettes")
+    args = arg_parser.parse_args()
+
+    generator = SyntheticPatientGenerator(args.program, seed=args.seed)
+    generator.write_atoms(args.output, args.patients, rules_to_fire=args.rules_to_fire)
+    if args.descriptions:
+        generator.write_descriptions(args.descriptions, args.patients, rules_to_fire=args.rules_to_fire)
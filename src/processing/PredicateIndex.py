@@ -0,0 +1,236 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.processing.EmbeddingBackends import load_embedding_model
+from src.processing.graph_analysis import GraphAnalyzer
+from src.processing.graph_utils import ASPGraphCreator
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+class _NumpyBackend:
+    # Exact inner-product search, used when neither faiss nor hnswlib is installed
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = queries @ self.vectors.T
+        k = min(k, scores.shape[1])
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(scores, idx, axis=1)
+        order = np.argsort(-top, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+
+class _FaissBackend:
+    # HNSW graph over inner product (cosine on unit vectors)
+
+    def __init__(self, vectors: np.ndarray, m: int = 32):
+        self.index = faiss.IndexHNSWFlat(vectors.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        self.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores, idx = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), min(k, self.index.ntotal))
+        return scores, idx
+
+
+class _HnswBackend:
+
+    def __init__(self, vectors: np.ndarray, m: int = 32, ef: int = 64):
+        self.index = hnswlib.Index(space='ip', dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), M=m, ef_construction=max(ef, 100))
+        self.index.add_items(vectors, np.arange(len(vectors)))
+        self.index.set_ef(ef)
+        self.size = len(vectors)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        idx, distances = self.index.knn_query(queries, k=min(k, self.size))
+        # hnswlib returns 1 - inner product for the 'ip' space
+        return 1.0 - distances, idx.astype(np.int64)
+
+
+class PredicateIndex:
+    """Persistent nearest-neighbour index over predicate embeddings of ground truths and experiment outputs."""
+
+    BACKENDS = ['faiss', 'hnswlib', 'numpy']
+
+    def __init__(self, model=None, backend: str = 'auto', embedding_backend: str = 'torch'):
+        """
+        Args:
+            model: Sentence embedding model with an encode() method. Defaults to the
+                model used by GraphAnalyzer, so scores are comparable with graph metrics
+            backend: 'faiss', 'hnswlib', 'numpy' or 'auto' (first one installed)
+            embedding_backend: Embedding backend used when no model is given ('torch', 'onnx', 'onnx-int8')
+        """
+        self.model = model if model is not None else load_embedding_model(embedding_backend)
+        self.backend = self._resolve_backend(backend)
+
+        # source -> {'predicates': [...], 'vectors': unit-normalised array}
+        self.sources: Dict[str, dict] = {}
+        # source -> backend index, built lazily on first query
+        self._indexes: Dict[str, object] = {}
+
+    @staticmethod
+    def _resolve_backend(backend: str) -> str:
+        available = {'faiss': faiss is not None, 'hnswlib': hnswlib is not None, 'numpy': True}
+        if backend == 'auto':
+            return next(name for name in PredicateIndex.BACKENDS if available[name])
+        if backend not in available:
+            raise ValueError(f"Unknown backend '{backend}'. Use one of {PredicateIndex.BACKENDS} or 'auto'")
+        if not available[backend]:
+            raise ImportError(f"Backend '{backend}' is not installed")
+        return backend
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = np.asarray(self.model.encode(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    @staticmethod
+    def graph_predicates(G) -> List[str]:
+        # Predicate nodes of a program graph (choice nodes carry no vocabulary)
+        return [node for node in G.nodes() if G.nodes[node].get('node_type') != 'choice']
+
+    def add_graph(self, source: str, G) -> int:
+        """
+        Add the predicates of a program graph under a source name, e.g. 'GT_PC' or 'GPT/D2K-Pipeline'.
+
+        Returns:
+            Number of predicates indexed for the source
+        """
+        predicates = self.graph_predicates(G)
+        texts = [GraphAnalyzer.node_text(G, node) for node in predicates]
+        self.sources[source] = {'predicates': [str(node) for node in predicates], 'vectors': self._encode(texts)}
+        self._indexes.pop(source, None)
+        return len(predicates)
+
+    def add_program(self, source: str, program_path: str) -> int:
+        """
+        Add the predicates of an ASP program file (ground truth or generated response).
+        """
+        return self.add_graph(source, ASPGraphCreator.create_program_graph(program_path))
+
+    def _index(self, source: str):
+        if source not in self._indexes:
+            vectors = self.sources[source]['vectors']
+            if self.backend == 'faiss':
+                self._indexes[source] = _FaissBackend(vectors)
+            elif self.backend == 'hnswlib':
+                self._indexes[source] = _HnswBackend(vectors)
+            else:
+                self._indexes[source] = _NumpyBackend(vectors)
+        return self._indexes[source]
+
+    def nearest(self, source: str, query_vectors: np.ndarray, k: int = 1) -> Tuple[np.ndarray, List[List[str]]]:
+        """
+        Find the k closest predicates of a source for each query vector.
+
+        Args:
+            source: Indexed source to search, e.g. the ground truth
+            query_vectors: Unit-normalised query embeddings
+            k: Number of neighbours
+
+        Returns:
+            (similarities of shape (n_queries, k), matching predicate names)
+        """
+        if source not in self.sources:
+            raise KeyError(f"Source '{source}' is not indexed")
+        predicates = self.sources[source]['predicates']
+        if len(query_vectors) == 0 or not predicates:
+            return np.zeros((len(query_vectors), 0)), [[] for _ in range(len(query_vectors))]
+        scores, idx = self._index(source).search(query_vectors, k)
+        return scores, [[predicates[j] for j in row] for row in idx]
+
+    def align(self, source: str, reference: str) -> pd.DataFrame:
+        """
+        Match every predicate of one source to its closest predicate in a reference source.
+
+        Args:
+            source: Source whose predicates are matched (e.g. a generated program)
+            reference: Source searched for matches (e.g. the ground truth)
+
+        Returns:
+            DataFrame with columns: predicate, closest, similarity
+        """
+        scores, matches = self.nearest(reference, self.sources[source]['vectors'], k=1)
+        return pd.DataFrame({
+            'predicate': self.sources[source]['predicates'],
+            'closest': [row[0] if row else None for row in matches],
+            'similarity': [float(row[0]) if len(row) else 0.0 for row in scores],
+        })
+
+    def vocabulary_drift(self, reference: str, sources: Optional[List[str]] = None,
+                         threshold: float = 0.8) -> pd.DataFrame:
+        """
+        Summarise how far each source's predicate vocabulary is from a reference.
+
+        Args:
+            reference: Reference source, usually the ground truth
+            sources: Sources to compare (default: every other indexed source)
+            threshold: Similarity below which a predicate counts as novel
+
+        Returns:
+            DataFrame indexed by source with predicate count, mean/min best-match
+            similarity and the fraction of novel predicates
+        """
+        if sources is None:
+            sources = [name for name in self.sources if name != reference]
+
+        rows = []
+        for source in sources:
+            similarity = self.align(source, reference)['similarity'].to_numpy()
+            rows.append({
+                'source': source,
+                'predicates': len(similarity),
+                'mean_similarity': float(similarity.mean()) if len(similarity) else 0.0,
+                'min_similarity': float(similarity.min()) if len(similarity) else 0.0,
+                'novel_fraction': float((similarity < threshold).mean()) if len(similarity) else 0.0,
+            })
+        return pd.DataFrame(rows, columns=['source', 'predicates', 'mean_similarity',
+                                           'min_similarity', 'novel_fraction']).set_index('source')
+
+    def save(self, index_dir: str) -> None:
+        """
+        Persist the embeddings (one .npy per source) and predicate names (index.json).
+        Backend indexes are rebuilt on load, so a saved index works with any backend.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        manifest = {}
+        for i, (source, entry) in enumerate(self.sources.items()):
+            vectors_file = f"source_{i}.npy"
+            np.save(os.path.join(index_dir, vectors_file), entry['vectors'])
+            manifest[source] = {'predicates': entry['predicates'], 'vectors': vectors_file}
+        with open(os.path.join(index_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Saved predicate index with {len(self.sources)} sources to {index_dir}")
+
+    @classmethod
+    def load(cls, index_dir: str, model=None, backend: str = 'auto',
+             embedding_backend: str = 'torch') -> 'PredicateIndex':
+        """
+        Load an index written by save().
+        """
+        index = cls(model=model, backend=backend, embedding_backend=embedding_backend)
+        with open(os.path.join(index_dir, 'index.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        for source, entry in manifest.items():
+            index.sources[source] = {
+                'predicates': entry['predicates'],
+                'vectors': np.load(os.path.join(index_dir, entry['vectors'])),
+            }
+        return index
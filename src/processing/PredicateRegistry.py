@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.processing.FileManager import FileManager
+from src.processing.RuleProcessor import BOOKKEEPING_PREDICATES
+
+
+class PredicateRegistry:
+    """Canonical predicate and constant vocabulary shared across guidelines, built from ground truths and prior runs."""
+
+    # Bookkeeping predicates added by RuleProcessor, never part of the vocabulary
+    IGNORED_PREDICATES = BOOKKEEPING_PREDICATES
+
+    NAME_PATTERN = re.compile(r'[a-z_]\w*(?=\()')
+    # "Category: "constant1", "constant2"." lines of constant_response.txt
+    CONSTANT_LINE_PATTERN = re.compile(r'^([A-Z][\w ]*):\s*(.+)$')
+    QUOTED_PATTERN = re.compile(r'"([^"]+)"')
+    # Typed predicate lines of predicate_response.txt, e.g. findings(I, Gf)
+    TYPED_PREDICATE_PATTERN = re.compile(r'^([a-z_]\w*)\(([^()]*)\)\s*\.?$')
+
+    # Inserted before this marker in prompt templates (appended when the marker is missing)
+    PROMPT_MARKER = 'Problem to solve:'
+
+    def __init__(self, registry_path: Optional[str] = None):
+        """
+        Args:
+            registry_path: JSON file written by save(); loaded if it exists
+        """
+        self.registry_path = registry_path
+        self.file_manager = FileManager()
+        self._lock = threading.Lock()
+        # "name/arity" -> {'count', 'typed': [typed forms], 'sources': [...]}
+        self.predicates: Dict[str, dict] = {}
+        # category -> constant -> number of runs listing it
+        self.constants: Dict[str, Dict[str, int]] = {}
+        self.sources: List[str] = []  # 'kind:path' of every file added
+
+        if registry_path and os.path.isfile(registry_path):
+            with open(registry_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.predicates = data.get('predicates', {})
+            self.constants = data.get('constants', {})
+            self.sources = data.get('sources', [])
+
+    @staticmethod
+    def _top_level_atoms(text: str) -> List[tuple]:
+        # (name, arity) of every atom at nesting depth 0, so function terms such as
+        # cancer("pancreas") inside have(...) are not counted as predicates
+        atoms = []
+        i, n = 0, len(text)
+        while i < n:
+            char = text[i]
+            if char == '%':
+                # Skip comments to the end of the line
+                newline = text.find('\n', i)
+                i = n if newline == -1 else newline + 1
+                continue
+            if char == '"':
+                closing = text.find('"', i + 1)
+                i = n if closing == -1 else closing + 1
+                continue
+            match = PredicateRegistry.NAME_PATTERN.match(text, i)
+            if match and (i == 0 or not (text[i - 1].isalnum() or text[i - 1] == '_')):
+                # Walk the argument list counting top-level commas
+                depth, commas, quoted, j = 0, 0, False, match.end()
+                while j < n:
+                    c = text[j]
+                    if c == '"':
+                        quoted = not quoted
+                    elif not quoted:
+                        if c == '(':
+                            depth += 1
+                        elif c == ')':
+                            depth -= 1
+                            if depth == 0:
+                                break
+                        elif c == ',' and depth == 1:
+                            commas += 1
+                    j += 1
+                args = text[match.end() + 1:j]
+                atoms.append((match.group(0), commas + 1 if args.strip() else 0))
+                i = j + 1
+                continue
+            i += 1
+        return atoms
+
+    def _add_predicate(self, signature: str, source: str, typed: Optional[str] = None) -> None:
+        # count is the number of programs/runs using the signature
+        entry = self.predicates.setdefault(signature, {'count': 0, 'typed': [], 'sources': []})
+        if typed and typed not in entry['typed']:
+            entry['typed'].append(typed)
+        if source not in entry['sources']:
+            entry['sources'].append(source)
+            entry['count'] = len(entry['sources'])
+
+    def _seen(self, kind: str, source: str) -> bool:
+        # Record that a file was added, so re-adding the same run does not inflate counts
+        key = f"{kind}:{source}"
+        if key in self.sources:
+            return True
+        self.sources.append(key)
+        return False
+
+    def add_program(self, program_path: str, source: Optional[str] = None) -> int:
+        """
+        Add the predicates used in an ASP program (ground truth or generated rules).
+
+        Returns:
+            Number of distinct predicate signatures in the program
+        """
+        source = source or str(program_path)
+        signatures = set()
+        for name, arity in self._top_level_atoms(self.file_manager.load_file(program_path)):
+            if name not in self.IGNORED_PREDICATES:
+                signatures.add(f"{name}/{arity}")
+        with self._lock:
+            if not self._seen('program', source):
+                for signature in sorted(signatures):
+                    self._add_predicate(signature, source)
+        return len(signatures)
+
+    def add_predicate_response(self, response_path: str, source: Optional[str] = None) -> int:
+        """
+        Add typed predicates from a predicate_response.txt, e.g. findings(I, Gf).
+        """
+        source = source or str(response_path)
+        added = 0
+        with self._lock:
+            if self._seen('predicates', source):
+                return 0
+            for line in self.file_manager.load_file(response_path).splitlines():
+                match = self.TYPED_PREDICATE_PATTERN.match(line.strip())
+                if not match:
+                    continue
+                name, args = match.groups()
+                arity = len([arg for arg in args.split(',') if arg.strip()])
+                typed = f"{name}({', '.join(arg.strip() for arg in args.split(','))})" if arity else name
+                self._add_predicate(f"{name}/{arity}", source, typed)
+                added += 1
+        return added
+
+    def add_constant_response(self, response_path: str, source: Optional[str] = None) -> int:
+        """
+        Add categorised constants from a constant_response.txt.
+        """
+        source = source or str(response_path)
+        added = 0
+        with self._lock:
+            if self._seen('constants', source):
+                return 0
+            for line in self.file_manager.load_file(response_path).splitlines():
+                match = self.CONSTANT_LINE_PATTERN.match(line.strip())
+                if not match:
+                    continue
+                category, values = match.groups()
+                bucket = self.constants.setdefault(category.strip(), {})
+                for constant in self.QUOTED_PATTERN.findall(values):
+                    bucket[constant] = bucket.get(constant, 0) + 1
+                    added += 1
+        return added
+
+    def add_experiment_dir(self, exp_dir: str) -> None:
+        """
+        Add the constant, predicate and rule responses of a previous run.
+        """
+        exp_dir = Path(exp_dir)
+        if (exp_dir / 'constant_response.txt').is_file():
+            self.add_constant_response(str(exp_dir / 'constant_response.txt'), str(exp_dir))
+        if (exp_dir / 'predicate_response.txt').is_file():
+            self.add_predicate_response(str(exp_dir / 'predicate_response.txt'), str(exp_dir))
+        if (exp_dir / 'rulegen_response.txt').is_file():
+            self.add_program(str(exp_dir / 'rulegen_response.txt'), str(exp_dir))
+
+    def predicate_block(self, max_predicates: int = 40, min_count: int = 1) -> str:
+        """
+        Compact canonical predicate list for the predicate prompt, most used first.
+        """
+        # Snapshot under the lock, as corpus workers add runs while other prompts are built
+        with self._lock:
+            predicates = [(sig, entry['count'], list(entry['typed'])) for sig, entry in self.predicates.items()]
+        ranked = sorted(((sig, count, typed) for sig, count, typed in predicates if count >= min_count),
+                        key=lambda item: (-item[1], item[0]))[:max_predicates]
+        if not ranked:
+            return ""
+        lines = ["Canonical predicates from previous guidelines (reuse these names and arities where they fit; "
+                 "only add new predicates for relationships they cannot express):"]
+        for signature, _, typed in ranked:
+            typed = f" e.g. {'; '.join(typed[:2])}" if typed else ""
+            lines.append(f"- {signature}{typed}")
+        return "\n".join(lines)
+
+    def constant_block(self, max_per_category: int = 15, min_count: int = 1) -> str:
+        """
+        Compact canonical constant list for the constant prompt, grouped by category.
+        """
+        with self._lock:
+            constants = {category: dict(counts) for category, counts in self.constants.items()}
+        lines = []
+        for category in sorted(constants):
+            ranked = sorted(((c, n) for c, n in constants[category].items() if n >= min_count),
+                            key=lambda item: (-item[1], item[0]))[:max_per_category]
+            if ranked:
+                lines.append(f"{category}: " + ', '.join('"' + c + '"' for c, _ in ranked) + ".")
+        if not lines:
+            return ""
+        return "\n".join(["Canonical constants from previous guidelines (use the same wording when a concept matches):"]
+                         + lines)
+
+    def inject(self, prompt: str, block: str) -> str:
+        # Place a vocabulary block before the problem text of a formatted prompt
+        if not block:
+            return prompt
+        position = prompt.rfind(self.PROMPT_MARKER)
+        if position == -1:
+            return f"{prompt}\n\n{block}\n"
+        return f"{prompt[:position]}{block}\n\n{prompt[position:]}"
+
+    def save(self, registry_path: Optional[str] = None) -> None:
+        """
+        Write the registry as JSON.
+        """
+        registry_path = registry_path or self.registry_path
+        os.makedirs(os.path.dirname(registry_path) or '.', exist_ok=True)
+        with self._lock:
+            data = {'sources': self.sources, 'predicates': self.predicates, 'constants': self.constants}
+            with open(registry_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        print(f"Saved {len(self.predicates)} predicates and "
+              f"{sum(len(c) for c in self.constants.values())} constants to {registry_path}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Build the shared predicate/constant registry.")
+    arg_parser.add_argument('--ground-truths', nargs='*', default=[], help="Ground truth .lp files")
+    arg_parser.add_argument('--runs', nargs='*', default=[], help="Experiment output directories")
+    arg_parser.add_argument('--output', required=True, help="Registry JSON to write (extended if it exists)")
+    args = arg_parser.parse_args()
+
+    registry = PredicateRegistry(args.output)
+    for gt_path in args.ground_truths:
+        registry.add_program(gt_path)
+    for run_dir in args.runs:
+        registry.add_experiment_dir(run_dir)
+    registry.save()
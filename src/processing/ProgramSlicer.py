@@ -0,0 +1,254 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.processing.RuleProcessor import iter_asp_statements
+
+# Atom with optional argument list, e.g. have("jaundice") or -offer(X) or flag
+ATOM_PATTERN = re.compile(r"^(-?_*[a-z][\w']*)\s*(?:\((.*)\))?$", re.DOTALL)
+# Arguments that only unify with themselves; anything else (variables, function
+# terms, arithmetic, intervals, pools) is treated as a wildcard
+CONSTANT_PATTERN = re.compile(r'''^("(?:[^"\\]|\\.)*"|-?\d+|_*[a-z][\w']*)$''')
+# Bounds around a choice head, e.g. 1{ ... }3 or { ... } = 1
+CHOICE_PATTERN = re.compile(r'^\s*(?:\d+\s*(?:<=?|=)?\s*)?\{(.*)\}\s*(?:(?:>=?|<=?|=)?\s*\d+)?\s*$', re.DOTALL)
+COMPARISON_PATTERN = re.compile(r'!=|<=|>=|<|>|=')
+CONST_DIRECTIVE_PATTERN = re.compile(r'^#const\s+(_*[a-z][\w\']*)\s*=')
+# Every name in a head we cannot read, e.g. p and r in #count{X : p(X) : r(X)} = 1
+HEAD_NAME_PATTERN = re.compile(r"(?<![\w#'])-?_*[a-z][\w']*")
+STRING_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"')
+AGGREGATE_HEAD_PATTERN = re.compile(r'^#(?:count|sum\+?|min|max)\b')
+
+# (name, arity, args) with None for an unknown arity or a wildcard argument
+Pattern = Tuple[str, Optional[int], Tuple[Optional[str], ...]]
+
+
+def _split_top_level(text: str, separators: str) -> List[str]:
+    # Split on separator characters outside strings, parentheses and braces
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, char in enumerate(text):
+        if char == '"' and (i == 0 or text[i - 1] != '\\'):
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char in '({[':
+            depth += 1
+        elif char in ')}]':
+            depth -= 1
+        elif depth == 0 and char in separators:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _find_top_level(text: str, token: str) -> int:
+    # Index of token outside strings and brackets, or -1
+    depth, quoted = 0, False
+    for i, char in enumerate(text):
+        if char == '"' and (i == 0 or text[i - 1] != '\\'):
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char in '({[':
+            depth += 1
+        elif char in ')}]':
+            depth -= 1
+        elif depth == 0 and text.startswith(token, i):
+            return i
+    return -1
+
+
+def _atom_pattern(literal: str, wildcards: frozenset = frozenset()) -> Optional[Pattern]:
+    # wildcards: #const names, which gringo replaces by their values
+    match = ATOM_PATTERN.match(literal.strip())
+    if not match:
+        return None
+    name, args = match.groups()
+    if args is None:
+        return name, 0, ()
+    if _find_top_level(args, ';') != -1:
+        # Pooled arguments p(a,b;c) expand to several atoms of unknown arity
+        return name, None, ()
+    values = tuple(arg if CONSTANT_PATTERN.match(arg) and arg not in wildcards else None
+                   for arg in _split_top_level(args, ','))
+    return name, len(values), values
+
+
+def _head_names(text: str) -> List[Pattern]:
+    # Any atom of any arity named in the head: over-approximates what the statement derives
+    if (text.startswith('#') and not AGGREGATE_HEAD_PATTERN.match(text)) or text.startswith(':~'):
+        return []
+    statement = STRING_PATTERN.sub('""', text.rstrip().rstrip('.'))
+    neck = _find_top_level(statement, ':-')
+    head = statement if neck == -1 else statement[:neck]
+    return [(name, None, ()) for name in dict.fromkeys(HEAD_NAME_PATTERN.findall(head))]
+
+
+def _is_ground(pattern: Pattern) -> bool:
+    return pattern[1] is not None and None not in pattern[2]
+
+
+@dataclass
+class SliceRule:
+    """A statement of the program with the atoms it needs and the atoms it can derive."""
+
+    index: int
+    text: str
+    requires: List[Pattern]  # positive body atoms that must be derivable
+    derives: List[Pattern]   # head atoms (empty for constraints)
+
+
+class ProgramSlicer:
+    """Per-patient relevance slice of an ASP program: only rules whose positive body can be derived from the facts."""
+
+    def __init__(self, lp_content: str):
+        """
+        Args:
+            lp_content: ASP program, e.g. the contents of rulegen_response_fired.lp
+        """
+        self.statements: List[str] = []  # every statement and pass-through line, in file order
+        self.rules: List[SliceRule] = []  # statements the slice may drop
+        self._always: List[int] = []  # directives, weak constraints and non-ASP text, always kept
+        self._always_derives: List[Pattern] = []  # head atoms of kept statements we cannot read
+        statements = [(kind, text) for kind, text in iter_asp_statements(lp_content.splitlines(keepends=True))
+                      if kind in ('statement', 'text')]
+        self._consts = frozenset(match.group(1) for _, text in statements
+                                 for match in [CONST_DIRECTIVE_PATTERN.match(text)] if match)
+        for kind, text in statements:
+            index = len(self.statements)
+            self.statements.append(text)
+            rule = self._parse_rule(index, text) if kind == 'statement' else None
+            if rule is None:
+                self._always.append(index)
+                if kind == 'statement':
+                    self._always_derives.extend(_head_names(text))
+            else:
+                self.rules.append(rule)
+
+    def _parse_rule(self, index: int, text: str) -> Optional[SliceRule]:
+        """
+        Dependencies of one statement, or None when it must always be kept (every
+        name in its head is then taken as derivable, see _head_names).
+        """
+        if text.startswith('#') or text.startswith(':~'):
+            return None
+        statement = text.rstrip().rstrip('.')
+        neck = _find_top_level(statement, ':-')
+        head, body = (statement, '') if neck == -1 else (statement[:neck], statement[neck + 2:])
+
+        derives = []
+        if head.strip():
+            choice = CHOICE_PATTERN.match(head)
+            elements = _split_top_level(choice.group(1) if choice else head, ';|')
+            for element in elements:
+                # Conditional head elements a(X) : b(X) derive a(X)
+                condition = _find_top_level(element, ':')
+                pattern = _atom_pattern(element if condition == -1 else element[:condition], self._consts)
+                if pattern is None:
+                    # Head we cannot read (aggregate, arithmetic): keep the statement
+                    return None
+                derives.append(pattern)
+
+        requires = []
+        for literal in _split_top_level(body, ',;'):
+            # Negated, conditional and aggregate literals can hold without any atom,
+            # and comparisons do not depend on other rules
+            if literal.startswith('not ') or literal.startswith('#') or '{' in literal \
+                    or _find_top_level(literal, ':') != -1:
+                continue
+            pattern = _atom_pattern(literal, self._consts)
+            if pattern is not None:
+                requires.append(pattern)
+            elif not COMPARISON_PATTERN.search(literal):
+                return None
+        return SliceRule(index, text, requires, derives)
+
+    @staticmethod
+    def _unifies(literal: Pattern, derivable: Pattern) -> bool:
+        name, arity, args = literal
+        if derivable[1] is None or arity is None:
+            return True
+        if arity != derivable[1]:
+            return False
+        return all(a is None or b is None or a == b for a, b in zip(args, derivable[2]))
+
+    def relevant(self, facts: Iterable[str]) -> List[int]:
+        """
+        Indexes of the statements needed for a set of facts: a rule is kept once every
+        positive body atom unifies with a fact or with the head of a kept rule (argument
+        constants are compared, variables match anything). Dropped rules can never fire,
+        so the program's answer sets do not change.
+
+        Args:
+            facts: Fact lines, e.g. ['age(63).', 'have("jaundice").']
+
+        Returns:
+            Sorted statement indexes
+        """
+        derived: set = set()
+        derivable: Dict[str, List[Pattern]] = {}  # predicate -> every derivable pattern
+        partial: Dict[str, List[Pattern]] = {}    # predicate -> derivable patterns with wildcards
+        # Rules wait on the exact atom for a ground body literal, otherwise on the predicate
+        waiting: Dict[object, List[Tuple[SliceRule, int]]] = {}
+        ground_keys: Dict[str, set] = {}  # predicate -> exact atoms with waiting rules
+        kept: List[int] = list(self._always)
+        queue: List[Pattern] = list(self._always_derives)
+
+        for _, text in iter_asp_statements(f"{fact}\n" for fact in facts):
+            rule = self._parse_rule(-1, text)
+            if rule is None:
+                queue.extend(_head_names(text))
+            elif not rule.requires:
+                queue.extend(rule.derives)
+
+        def satisfied(pattern: Pattern) -> bool:
+            if _is_ground(pattern):
+                return pattern in derived or any(self._unifies(pattern, other) for other in partial.get(pattern[0], ()))
+            return any(self._unifies(pattern, other) for other in derivable.get(pattern[0], ()))
+
+        def check(rule: SliceRule, position: int) -> None:
+            # Advance to the first body atom that is not derivable yet and wait on it
+            while position < len(rule.requires):
+                pattern = rule.requires[position]
+                if not satisfied(pattern):
+                    if _is_ground(pattern):
+                        ground_keys.setdefault(pattern[0], set()).add(pattern)
+                        waiting.setdefault(pattern, []).append((rule, position))
+                    else:
+                        waiting.setdefault(pattern[0], []).append((rule, position))
+                    return
+                position += 1
+            kept.append(rule.index)
+            queue.extend(rule.derives)
+
+        for rule in self.rules:
+            check(rule, 0)
+        while queue:
+            pattern = queue.pop()
+            if pattern in derived:
+                continue
+            derived.add(pattern)
+            derivable.setdefault(pattern[0], []).append(pattern)
+            if _is_ground(pattern):
+                woken = waiting.pop(pattern, []) + waiting.pop(pattern[0], [])
+                ground_keys.get(pattern[0], set()).discard(pattern)
+            else:
+                partial.setdefault(pattern[0], []).append(pattern)
+                woken = waiting.pop(pattern[0], [])
+                for key in ground_keys.pop(pattern[0], ()):
+                    woken += waiting.pop(key, [])
+            for rule, position in woken:
+                check(rule, position)
+        return sorted(kept)
+
+    def render(self, indexes: Iterable[int]) -> str:
+        """
+        Program text of the given statements, one per line (comments are not kept).
+        """
+        return '\n'.join(self.statements[index] for index in indexes) + '\n'
+
+    def slice(self, facts: Iterable[str]) -> str:
+        """
+        The program restricted to the statements relevant to the facts.
+        """
+        return self.render(self.relevant(facts))
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class ReplayStore:
+    """Recorded LLM responses served back for offline, deterministic pipeline runs."""
+
+    # Files written by LLMInferencer in an experiment directory
+    RESPONSE_FILES = [
+        'constant_response.txt',
+        'predicate_response.txt',
+        'rulegen_response.txt',
+        'atoms.txt',
+        'llm_only_response.txt',
+        'in_context_response.txt',
+        'zero_shot_response.txt',
+    ]
+
+    def __init__(self, store_path: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0, seed: int = 42,
+                 match_file_name: bool = True):
+        """
+        Args:
+            store_path: JSON store written by save(), or an experiment directory
+                (e.g. src/output_files/GPT) whose response files are imported directly
+            latency: Simulated seconds per replayed call
+            jitter: Uniform +/- jitter added to the latency, drawn from a seeded generator
+            seed: Seed for the jitter, so simulated timings are reproducible
+            match_file_name: Fall back to the output file name alone; off for corpus runs,
+                where every guideline writes files of the same names
+        """
+        self.store_path = store_path
+        self.match_file_name = match_file_name
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.by_prompt: Dict[str, dict] = {}  # prompt hash -> {'output_name', 'model', 'response'}
+        self.by_output: Dict[str, str] = {}   # output file name, and <directory>/<name> -> response
+
+        if store_path and os.path.isdir(store_path):
+            self.import_experiment_dir(store_path)
+        elif store_path and os.path.isfile(store_path):
+            with open(store_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.by_prompt = data.get('by_prompt', {})
+            self.by_output = data.get('by_output', {})
+
+    @staticmethod
+    def prompt_key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def output_key(output_file: str) -> str:
+        # <directory>/<name>, e.g. 1-lung_and_pleural/rulegen_response.txt in a corpus run
+        path = Path(output_file)
+        return f"{path.parent.name}/{path.name}"
+
+    def import_experiment_dir(self, exp_dir: str) -> int:
+        """
+        Add the response files of a previous run, keyed by output file name. Prompts were
+        not recorded for those runs, so they are matched by file name only. Response files
+        in sub-directories (the per-guideline directories of a corpus run) are keyed by
+        <directory>/<name>.
+
+        Returns:
+            Number of responses imported
+        """
+        imported = 0
+        for name in self.RESPONSE_FILES:
+            path = Path(exp_dir) / name
+            if path.is_file():
+                self.by_output[name] = path.read_text(encoding='utf-8')
+                imported += 1
+            for path in sorted(Path(exp_dir).glob(f'*/{name}')):
+                self.by_output[self.output_key(str(path))] = path.read_text(encoding='utf-8')
+                imported += 1
+        print(f"Imported {imported} recorded responses from {exp_dir}")
+        return imported
+
+    def record(self, prompt: str, output_file: str, response: str, model: Optional[str] = None,
+               separator: Optional[str] = None) -> None:
+        """
+        Store a live response under its prompt hash and output file name. With a separator,
+        the response continues the output file (a later chunk of a chunked prompt) and is
+        appended to the output's recorded text after the separator.
+        """
+        output_name = os.path.basename(output_file)
+        with self._lock:
+            self.by_prompt[self.prompt_key(prompt)] = {
+                'output_name': output_name,
+                'model': model,
+                'response': response,
+            }
+            for key in (output_name, self.output_key(output_file)):
+                if separator is None:
+                    self.by_output[key] = response
+                else:
+                    self.by_output[key] = self.by_output.get(key, '') + separator + response
+
+    def has_prompt(self, prompt: str) -> bool:
+        # Whether a response was recorded for this exact prompt
+        return self.prompt_key(prompt) in self.by_prompt
+
+    def lookup(self, prompt: str, output_file: str) -> str:
+        """
+        Return the recorded response for a prompt, falling back to <directory>/<name> of the
+        output file and then (with match_file_name) to its name alone.
+
+        Raises:
+            KeyError: If no recording matches
+        """
+        entry = self.by_prompt.get(self.prompt_key(prompt))
+        output_key, output_name = self.output_key(output_file), os.path.basename(output_file)
+        if entry is not None:
+            response = entry['response']
+        elif output_key in self.by_output:
+            response = self.by_output[output_key]
+        elif self.match_file_name and output_name in self.by_output:
+            response = self.by_output[output_name]
+        else:
+            raise KeyError(f"No recorded response for prompt or output file '{output_key}'")
+
+        if self.latency or self.jitter:
+            with self._lock:
+                delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, delay))
+        return response
+
+    def save(self, store_path: Optional[str] = None) -> None:
+        """
+        Write the store as JSON.
+        """
+        store_path = store_path or self.store_path
+        with self._lock:
+            data = {'by_prompt': self.by_prompt, 'by_output': self.by_output}
+        with open(store_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        print(f"Saved {len(self.by_prompt)} recorded prompts to {store_path}")
@@ -0,0 +1,192 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import pandas as pd
+
+
+class ResultsStore:
+    """Append-only SQLite store for metrics from every stage and experiment, queried in one scan."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        name TEXT,
+        model TEXT,
+        family TEXT,
+        cancer_type TEXT,
+        version TEXT,
+        output_dir TEXT
+    );
+    CREATE TABLE IF NOT EXISTS metrics (
+        run_id INTEGER NOT NULL REFERENCES runs(run_id),
+        stage TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        value REAL
+    );
+    CREATE TABLE IF NOT EXISTS k2p_outcomes (
+        run_id INTEGER NOT NULL REFERENCES runs(run_id),
+        patient INTEGER NOT NULL,
+        rule_id TEXT NOT NULL,
+        outcome TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_runs_experiment ON runs(model, cancer_type, version);
+    CREATE INDEX IF NOT EXISTS idx_metrics_stage ON metrics(stage, metric, run_id);
+    CREATE INDEX IF NOT EXISTS idx_k2p_rule ON k2p_outcomes(rule_id, run_id);
+    """
+
+    RUN_COLUMNS = ['name', 'model', 'family', 'cancer_type', 'version', 'output_dir']
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: SQLite database file, created on first use
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def start_run(self, config: Mapping[str, Mapping[str, object]]) -> int:
+        """
+        Register a pipeline run from its experiment config.
+
+        Returns:
+            run_id used by the record_* methods
+        """
+        experiment = config['experiment']
+        values = [experiment.get(column) for column in self.RUN_COLUMNS]
+        placeholders = ', '.join('?' * (len(self.RUN_COLUMNS) + 1))
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                f"INSERT INTO runs (created_at, {', '.join(self.RUN_COLUMNS)}) VALUES ({placeholders})",
+                [datetime.now(timezone.utc).isoformat(timespec='seconds')] + values,
+            )
+        return cursor.lastrowid
+
+    def record_metrics(self, run_id: int, stage: str, rows: Iterable[Tuple[str, str, float]]) -> None:
+        """
+        Append (subject, metric, value) rows for one stage in a single transaction.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO metrics (run_id, stage, subject, metric, value) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, stage, str(subject), metric, None if value is None else float(value))
+                 for subject, metric, value in rows],
+            )
+
+    def record_graph_metrics(self, run_id: int, metrics: List[Dict[str, object]]) -> None:
+        """
+        Store the rows returned by GraphAnalyzer.calculate_graph_similarity(_batch).
+        Numeric columns become metrics; the candidate (or experiment) name is the subject.
+        """
+        rows = []
+        for row in metrics or []:
+            subject = row.get('candidate', row.get('experiment'))
+            for key, value in row.items():
+                if key not in ('experiment', 'candidate') and isinstance(value, (int, float)):
+                    rows.append((subject, key, value))
+        self.record_metrics(run_id, 'graph', rows)
+
+    def record_k2p_result(self, run_id: int, result: Mapping[str, object]) -> None:
+        """
+        Store K2PEvaluator.score() output: global metrics under subject 'all' and per-rule metrics.
+        """
+        rows = [('all', key, value) for key, value in result['global'].items()]
+        for rule_id, metrics in result['per_rule'].iterrows():
+            rows.extend((rule_id, key, value) for key, value in metrics.items())
+        self.record_metrics(run_id, 'k2p', rows)
+
+    def record_k2p_outcomes(self, run_id: int, gt_by_patient: Mapping[int, Set[str]],
+                            fired_by_patient: Mapping[int, Set[str]]) -> None:
+        """
+        Store one TP/FP/FN row per patient and rule, so rule-level results can be
+        compared across experiments without re-parsing clingo output.
+        """
+        rows = []
+        for patient in sorted(set(gt_by_patient) | set(fired_by_patient)):
+            expected = gt_by_patient.get(patient, set())
+            fired = fired_by_patient.get(patient, set())
+            rows.extend((run_id, patient, rule, 'TP') for rule in sorted(expected & fired))
+            rows.extend((run_id, patient, rule, 'FP') for rule in sorted(fired - expected))
+            rows.extend((run_id, patient, rule, 'FN') for rule in sorted(expected - fired))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO k2p_outcomes (run_id, patient, rule_id, outcome) VALUES (?, ?, ?, ?)", rows)
+
+    def record_corpus_report(self, run_id: int, report: List[Dict[str, object]]) -> None:
+        """
+        Store the rows returned by CorpusRunner.run(_batched): per-stage seconds, size and rules
+        under the guideline file name, plus succeeded (1 or 0).
+        """
+        rows = []
+        for row in report or []:
+            subject = row['guideline']
+            rows.append((subject, 'succeeded', row.get('status') == 'ok'))
+            for key, value in row.items():
+                if isinstance(value, (int, float)):
+                    rows.append((subject, key, value))
+        self.record_metrics(run_id, 'corpus', rows)
+
+    def record_run_metrics(self, run_id: int, summary: Mapping[str, Mapping[str, object]]) -> None:
+        """
+        Store RunMetrics.summary(): per-stage time, tokens and cost.
+        """
+        rows = []
+        for span_name, entry in summary.items():
+            rows.extend((span_name, key, value) for key, value in entry.items() if isinstance(value, (int, float)))
+        self.record_metrics(run_id, 'run', rows)
+
+    def query(self, sql: str, params: Tuple = ()) -> pd.DataFrame:
+        """
+        Run an arbitrary SQL query and return a DataFrame.
+        """
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def metrics(self, stage: Optional[str] = None, metric: Optional[str] = None, pivot: bool = False,
+                **run_filters) -> pd.DataFrame:
+        """
+        Metrics joined with their run, filtered in SQL.
+
+        Args:
+            stage: 'graph', 'k2p', 'run', ... (default: all stages)
+            metric: Metric name, e.g. 'adjacency_similarity' or 'F1'
+            pivot: Return one column per metric instead of long format
+            **run_filters: Equality filters on run columns, e.g. model='gpt-4o', version='D2K-Pipeline'
+
+        Returns:
+            DataFrame with run columns, stage, subject, metric and value
+        """
+        conditions, params = [], []
+        if stage is not None:
+            conditions.append('m.stage = ?')
+            params.append(stage)
+        if metric is not None:
+            conditions.append('m.metric = ?')
+            params.append(metric)
+        for column, value in run_filters.items():
+            if column not in self.RUN_COLUMNS + ['run_id']:
+                raise ValueError(f"Unknown run column '{column}'")
+            conditions.append(f'r.{column} = ?')
+            params.append(value)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        frame = self.query(
+            "SELECT r.run_id, r.created_at, r.model, r.family, r.cancer_type, r.version, "
+            f"m.stage, m.subject, m.metric, m.value FROM metrics m JOIN runs r USING (run_id) {where}",
+            tuple(params),
+        )
+        if pivot:
+            index = ['run_id', 'created_at', 'model', 'family', 'cancer_type', 'version', 'stage', 'subject']
+            frame[index] = frame[index].fillna('')
+            frame = frame.pivot_table(index=index, columns='metric', values='value', aggfunc='last').reset_index()
+            frame.columns.name = None
+        return frame
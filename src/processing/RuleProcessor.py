@@ -1,126 +1,147 @@
 import re
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import os
+import random
 import subprocess
 import tempfile
 from src.processing.ASPRuleParser import ASPRuleParser
 from src.processing.FileManager import FileManager
+from src.processing.GuidelineIndex import GuidelineIndex
+from src.processing.RunMetrics import track
+
+# Rule number marker line, e.g. [1.2.3]
+RULE_MARKER_PATTERN = re.compile(r'\[([\d.]+)\]')
+# Start of an ASP statement: constraint, directive, choice/aggregate head or an atom
+# (prose such as "Looking at ..." or "Patient 1: ..." does not match)
+ASP_START_PATTERN = re.compile(r'^(:-|#|\{|\d+\s*\{|-?[a-z_]\w*\s*(\(|:-|\.|,|;|\||\{|$))')
+
+# fired() instrumentation modes: 'duplicate' repeats each rule body in its fired() rule,
+# 'aux' derives the head and fired() from one auxiliary body atom per rule
+FIRED_ENCODINGS = ('duplicate', 'aux')
+AUX_BODY_PREDICATE = 'rule_body'
+# Predicates added by the fired() instrumentation, never guideline vocabulary or patient facts
+BOOKKEEPING_PREDICATES = frozenset({'fired', 'constraint_ok', AUX_BODY_PREDICATE})
+STRING_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"')
+# clingo exit codes of a finished run: 10 satisfiable, 20 unsatisfiable, 30 every model found
+# (builds that do not report the result exit with 0)
+CLINGO_OK_CODES = (0, 10, 20, 30)
+SOLVE_RESULT_PATTERN = re.compile(r'^(?:SATISFIABLE|UNSATISFIABLE|OPTIMUM FOUND)\s*$', re.MULTILINE)
+VARIABLE_PATTERN = re.compile(r"(?<![\w'])_*[A-Z][\w']*")
+
+
+def _statement_end(text: str) -> Tuple[int, int]:
+    """
+    Scan a line for the end of the current ASP statement.
+
+    Returns:
+        (index just past the terminating '.', or -1 if the statement continues;
+         index of a '%' comment outside strings, or -1)
+    """
+    quoted = False
+    i, n = 0, len(text)
+    while i < n:
+        char = text[i]
+        if char == '"' and (i == 0 or text[i - 1] != '\\'):
+            quoted = not quoted
+        elif not quoted:
+            if char == '%':
+                return -1, i
+            # A '.' ends a statement unless it is part of a range (1..5)
+            if char == '.' and text[i - 1:i] != '.' and text[i + 1:i + 2] != '.' \
+                    and not text[i + 1:i + 2].isdigit():
+                return i + 1, -1
+        i += 1
+    return -1, -1
+
+
+def iter_asp_statements(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Group the lines of an LLM rule response into complete ASP statements.
+
+    Yields (kind, text) pairs in file order, where kind is 'marker' for [X.X.X]
+    lines, 'blank', 'comment', 'statement' (one complete rule, fact, constraint or
+    directive, joined onto a single line) or 'text' for anything that is not ASP
+    (prose, code fences, unterminated statements). Texts are stripped. A blank line
+    without a newline at the very end of the input is dropped, like the last
+    element of content.split('\\n').
+
+    Args:
+        lines: Lines with their newlines, e.g. an open file
+    """
+    pending: List[str] = []  # lines of the statement being read
+    pending_comments: List[str] = []  # comments inside a multi-line statement
+
+    def flush_unterminated():
+        # Not valid ASP after all: give the lines back unchanged
+        for raw_line in pending:
+            yield 'text', raw_line
+        for comment in pending_comments:
+            yield 'comment', comment
+        pending.clear()
+        pending_comments.clear()
+
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            yield from flush_unterminated()
+            if raw.endswith('\n'):
+                yield 'blank', ''
+            continue
+        if not pending and RULE_MARKER_PATTERN.match(line):
+            yield 'marker', line
+            continue
+        if pending and RULE_MARKER_PATTERN.match(line):
+            yield from flush_unterminated()
+            yield 'marker', line
+            continue
+
+        # Split the line into statements; the last piece may continue on the next line
+        rest = line
+        while rest:
+            if not pending:
+                if rest.startswith('%'):
+                    yield 'comment', rest
+                    break
+                if not ASP_START_PATTERN.match(rest):
+                    yield 'text', rest
+                    break
+            end, comment = _statement_end(rest)
+            if end == -1:
+                if comment != -1:
+                    if rest[:comment].strip():
+                        pending.append(rest[:comment].strip())
+                    pending_comments.append(rest[comment:].strip())
+                else:
+                    pending.append(rest)
+                break
+            pending.append(rest[:end].strip())
+            yield 'statement', ' '.join(pending)
+            pending.clear()
+            for pending_comment in pending_comments:
+                yield 'comment', pending_comment
+            pending_comments.clear()
+            rest = rest[end:].strip()
+
+    yield from flush_unterminated()
 
 
 class RuleProcessor:
     """Processes LLM-generated ASP rules and adds fired() tracking."""
     
-    def __init__(self, guideline_path: str):
+    def __init__(self, guideline_path: str, metrics=None):
         self.file_manager = FileManager()
+        self.metrics = metrics  # Optional RunMetrics for solver timings
         self.parser = ASPRuleParser()
         self.rule_registry: Dict[str, str] = {}  # Maps rule_id to rule text
+        self.guideline_index = None  # GuidelineIndex of the guideline file, if given
         self.guideline_text = self._build_guideline_lookup(guideline_path) if guideline_path else {}
         self.constraint_rules = {}  # Maps constraint rule_id to body
     
     def _build_guideline_lookup(self, guideline_path: str) -> dict[str, str]:
-
-        text = self.file_manager.load_file(guideline_path)
-        lookup: Dict[str, str] = {}
-        current_rule_id = None
-        current_rule_lines: List[str] = []
-        section_context: List[str] = []  # active context block for the section
-        context_active = False  # whether we're currently collecting a context block
-
-        def flush_rule():
-            nonlocal current_rule_id, current_rule_lines, lookup
-            if current_rule_id and current_rule_lines:
-                ctx_len = 0
-                # match prefix of rule lines with section_context
-                for i in range(min(len(section_context), len(current_rule_lines))):
-                    if current_rule_lines[i] == section_context[i]:
-                        ctx_len += 1
-                    else:
-                        break
-
-                context_block = current_rule_lines[:ctx_len]
-                rule_block = current_rule_lines[ctx_len:]
-
-                # Format output: context on its own lines, blank line, then rule text.
-                formatted = ""
-                if context_block:
-                    formatted += "\n".join(context_block)
-                    # Add a newline separator between context and rule if both exist
-                    if rule_block:
-                        formatted += "\n\n"
-                
-                formatted += "\n".join(rule_block)
-
-                lookup[current_rule_id] = formatted.strip()
-
-            current_rule_id = None
-            current_rule_lines = []
-
-        lines = text.splitlines()
-        for raw in lines:
-            line = raw.rstrip()
-            stripped = line.strip()
-
-            # detect numbered token at start
-            m = re.match(r'^(\d+(?:\.\d+)*)\b', stripped)
-            if m:
-                num = m.group(1)
-                dot_count = num.count(".")
-                # treat as a rule only if dot_count >= 2 (e.g., 1.1.1)
-                if dot_count >= 2:
-                    # start a new rule: flush previous
-                    flush_rule()
-                    current_rule_id = num
-                    # build content: start with a COPY of active context if any
-                    current_rule_lines = section_context.copy() if section_context else []
-                    # attach the rest of the line after the number
-                    rest = stripped[len(num):].strip(" .-")
-                    if rest:
-                        current_rule_lines.append(rest)
-                    # now collect rule continuation lines or bullets until next rule/blank/header
-                    continue
-                else:
-                    # section header like "1.1 Diagnosis" -> reset context
-                    flush_rule()
-                    section_context = []
-                    context_active = False
-                    continue
-
-            # bullet lines - attach to current rule if exists, otherwise treat as context line
-            if stripped.startswith("•") or stripped.startswith("-"):
-                if current_rule_id:
-                    current_rule_lines.append(stripped)
-                else:
-                    if not context_active:
-                        section_context = [stripped]
-                        context_active = True
-                    else:
-                        section_context.append(stripped)
-                continue
-
-            # blank line -> end current rule and mark context inactive so next text starts a new context
-            if stripped == "":
-                flush_rule()
-                context_active = False
-                continue
-
-            # continuation of a rule
-            if current_rule_id:
-                current_rule_lines.append(stripped)
-                continue
-
-            # otherwise it's context text before rules in the section
-            if not context_active:
-                # start a new context block (replace previous)
-                section_context = [stripped]
-                context_active = True
-            else:
-                # append to existing context block
-                section_context.append(stripped)
-
-        # final flush
-        flush_rule()
-        return lookup
+        # Parsed once per file content and shared with every other RuleProcessor
+        self.guideline_index = GuidelineIndex.from_file(guideline_path)
+        return self.guideline_index.as_lookup()
     
     def _constraint_to_rule(self, body: str) -> str:
         literals = [lit.strip() for lit in body.split(',') if lit.strip()]
@@ -134,102 +155,131 @@ class RuleProcessor:
         return f"{neg_head}."
     
     
-    def append_fired_rules(self, input_path: str, output_path: str) -> None:
+    def append_fired_rules(self, input_path: str, output_path: str, encoding: str = 'duplicate') -> None:
         """
         Process rulegen_response.txt and add fired() tracking rules.
+
+        The response is read as a stream of complete ASP statements (rules may span
+        several lines, several statements may share a line) and the instrumented
+        program is written as it is produced, so memory does not grow with the
+        program size. Each rule is written on a single line, directly followed by
+        its fired() rule.
         
         Args:
             input_path: Path to rulegen_response.txt
             output_path: Path to output .lp file
+            encoding: 'duplicate' (fired("id") :- body.) or 'aux', which grounds each
+                body once through a rule_body("id", Vars) atom (see _instrument_rule)
         """
-        content = self.file_manager.load_file(input_path)
-        lines = content.split('\n')
-        
-        output_lines = []
+        if encoding not in FIRED_ENCODINGS:
+            raise ValueError(f"Unknown fired() encoding '{encoding}', expected one of {FIRED_ENCODINGS}")
         current_rule_number = None
         rule_counter = {}  # Track how many rules per rule number
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # Check for rule number marker [X.X.X]
-            rule_match = re.match(r'\[([\d.]+)\]', line)
-            if rule_match:
-                current_rule_number = rule_match.group(1)
-                # Reset counter for this rule number
-                rule_counter[current_rule_number] = 0
-                # Comment out the rule number line
-                output_lines.append(f"% {line}")
-                i += 1
-                continue
-            
-            # Check if this is a rule line (contains :- or starts with :-)
-            if line and (':-' in line or line.startswith(':-')):
-                # Determine rule ID
-                if current_rule_number:
-                    # Check if we've seen this rule number before
-                    if current_rule_number not in rule_counter:
-                        rule_counter[current_rule_number] = 0
-                    
-                    rule_counter[current_rule_number] += 1
-                    count = rule_counter[current_rule_number]
-                    
-                    # Create rule ID with suffix if multiple rules
-                    if count == 1:
-                        rule_id = current_rule_number
-                    else:
-                        # Convert count to letter (A, B, C, etc.)
-                        suffix = chr(ord('B') + count - 2)
-                        rule_id = f"{current_rule_number}_{suffix}"
-                else:
-                    # No rule number, use a generic ID
-                    rule_id = f"unnamed_{len(self.rule_registry) + 1}"
-                
-                # Store the rule in registry
-                self.rule_registry[rule_id] = line.rstrip('.')
-                
-                # Add original rule
-                output_lines.append(line)
-                
-                # Extract body for fired() rule
-                body = self._extract_body(line)
-
-                if line.startswith(':-'):
-                    output_lines.append(f'fired("{rule_id}").') 
-                    support_atom = f'constraint_ok("{rule_id}")'
-                    output_lines.append(f'{support_atom}.')
-                    
-                    self.constraint_rules[rule_id] = body   
-                else:
-                    if body:
-                        output_lines.append(f'fired("{rule_id}") :- {body}.')
-                    else:
-                        output_lines.append(f'fired("{rule_id}").')
-                
-                
-                i += 1
-            else:
-                # Empty line or non-rule line, preserve as-is
-                if not line and i < len(lines) - 1:
-                    # Only add empty line if not at the end
-                    output_lines.append("")
-                elif line:
-                    output_lines.append(line)
-                i += 1
-        
-        # Add #show directive at the end
-        output_lines.append("")
-        output_lines.append("#show fired/1.")
-        output_lines.append("#show constraint_ok/1.")
-        
-        # Write output
-        output_content = '\n'.join(output_lines)
-        self.file_manager.save_file(output_content, output_path)
-        
+
+        with open(input_path, 'r', encoding='utf-8') as source, open(output_path, 'w', encoding='utf-8') as out:
+            first = True
+
+            def emit(output_line: str) -> None:
+                # Lines are joined with '\n' and the file does not end with a newline
+                nonlocal first
+                out.write(output_line if first else '\n' + output_line)
+                first = False
+
+            for kind, text in iter_asp_statements(source):
+                if kind == 'marker':
+                    # Rule number marker [X.X.X]: reset counter and comment out the line
+                    current_rule_number = RULE_MARKER_PATTERN.match(text).group(1)
+                    rule_counter[current_rule_number] = 0
+                    emit(f"% {text}")
+                    continue
+
+                # Only statements with :- (rules and constraints) are tracked;
+                # facts, directives, comments and other text are preserved as-is
+                if kind != 'statement' or ':-' not in text:
+                    emit(text)
+                    continue
+
+                rule_id = self._next_rule_id(current_rule_number, rule_counter)
+                for output_line in self._instrument_rule(rule_id, text, encoding):
+                    emit(output_line)
+
+            # Add #show directive at the end
+            emit("")
+            emit("#show fired/1.")
+            emit("#show constraint_ok/1.")
+
         print(f"Processed {len(self.rule_registry)} rules")
         print(f"Output written to {output_path}")
-    
+
+    def _next_rule_id(self, current_rule_number, rule_counter: Dict[str, int]) -> str:
+        # 1.2.3 for the first rule under [1.2.3], then 1.2.3_B, 1.2.3_C, ...
+        if not current_rule_number:
+            # No rule number, use a generic ID
+            return f"unnamed_{len(self.rule_registry) + 1}"
+        rule_counter[current_rule_number] = rule_counter.get(current_rule_number, 0) + 1
+        count = rule_counter[current_rule_number]
+        if count == 1:
+            return current_rule_number
+        # Convert count to letter (A, B, C, etc.)
+        suffix = chr(ord('B') + count - 2)
+        return f"{current_rule_number}_{suffix}"
+
+    @staticmethod
+    def _aux_variables(head: str, body: str):
+        """
+        Variables the auxiliary body atom must carry: the head's variables, all of which
+        must occur in the body outside aggregates and strings.
+
+        Returns:
+            Sorted variable names, or None if the rule is not safe to rewrite
+            (a head variable is only bound locally, e.g. in an aggregate or condition)
+        """
+        if not body or ':' in STRING_PATTERN.sub('""', body):
+            return None
+        body_text = re.sub(r'\{[^{}]*\}', '', STRING_PATTERN.sub('""', body))
+        head_variables = set(VARIABLE_PATTERN.findall(STRING_PATTERN.sub('""', head)))
+        body_variables = set(VARIABLE_PATTERN.findall(body_text))
+        if not head_variables <= body_variables:
+            return None
+        return sorted(head_variables)
+
+    def _instrument_rule(self, rule_id: str, line: str, encoding: str = 'duplicate') -> List[str]:
+        """
+        Register a rule and return it followed by its fired() tracking rule(s).
+
+        With encoding='aux' a rule "head :- body." becomes
+
+            % head :- body.
+            rule_body("id", X, ...) :- body.
+            head :- rule_body("id", X, ...).
+            fired("id") :- rule_body("id", X, ...).
+
+        so clingo grounds the body once instead of twice. X, ... are the head's variables.
+        Rules where this is not safe keep the duplicate encoding.
+        """
+        # Store the rule in registry
+        self.rule_registry[rule_id] = line.rstrip('.')
+
+        # Extract body for fired() rule
+        body = self._extract_body(line)
+        if line.startswith(':-'):
+            support_atom = f'constraint_ok("{rule_id}")'
+            self.constraint_rules[rule_id] = body
+            return [line, f'fired("{rule_id}").', f'{support_atom}.']
+
+        if encoding == 'aux':
+            head = line.split(':-', 1)[0].strip()
+            variables = self._aux_variables(head, body)
+            if variables is not None:
+                arguments = ', '.join([f'"{rule_id}"'] + variables)
+                aux_atom = f'{AUX_BODY_PREDICATE}({arguments})'
+                return [f'% {line}', f'{aux_atom} :- {body}.', f'{head} :- {aux_atom}.',
+                        f'fired("{rule_id}") :- {aux_atom}.']
+
+        if body:
+            return [line, f'fired("{rule_id}") :- {body}.']
+        return [line, f'fired("{rule_id}").']
+
     def _extract_body(self, rule_line: str) -> str:
         """
         Extract the body part of a rule (everything after :-).
@@ -368,8 +418,15 @@ class RuleProcessor:
             
             # Check if next line is a fired() rule
             fired_match = re.match(r'fired\("([^"]+)"\)', next_line)
-            if fired_match and line and not line.startswith('%') and ':-' in line:
-                rule_id = fired_match.group(1)
+            if not fired_match:
+                continue
+            rule_id = fired_match.group(1)
+            if f':- {AUX_BODY_PREDICATE}("{rule_id}"' in line:
+                # Auxiliary-atom encoding: the original rule is kept as a comment above
+                original = lines[i - 2].strip() if i >= 2 else ''
+                if original.startswith('%'):
+                    rule_map[rule_id] = original[1:].strip().rstrip('.')
+            elif line and not line.startswith('%') and ':-' in line:
                 rule_map[rule_id] = line.rstrip('.')
         
         return rule_map
@@ -451,7 +508,65 @@ class RuleProcessor:
 
         return rule_map
     
-    def run_clingo_for_patients(self, lp_file_path: str, atoms_file_path: str, output_file_path: str, debug_id: int = None) -> dict:
+    @staticmethod
+    def _patient_facts(atoms_content: str) -> List[Tuple[str, List[str]]]:
+        """
+        Split an atoms file into (patient_id, facts) pairs in file order.
+        """
+        # Split the content into patient sections using **Patient N:**
+        patient_sections = re.split(r'(?:\*\*)?Patient\s+(\d+):?(?:\*\*)?', atoms_content)[1:]
+        
+        # Group patient IDs with their sections (they alternate in the split result)
+        patient_data = [(patient_sections[i], patient_sections[i+1]) for i in range(0, len(patient_sections), 2)]
+        
+        patients = []
+        for patient_id, section in patient_data:
+            # Extract facts from the section
+            facts = []
+            for line in section.strip().split('\n'):
+                line = line.strip()
+                # Skip empty lines, comments, and lines that don't look like facts
+                if line and not line.startswith('%') and not line.startswith('**') and '(' in line:
+                    facts.append(line)
+            patients.append((patient_id, facts))
+        return patients
+
+    @staticmethod
+    def _write_patient_program(lp_content: str, patient_id: str, facts: List[str]) -> str:
+        """
+        Write the program followed by one patient's facts to a temporary .lp file.
+
+        Returns:
+            Path of the temporary file (the caller deletes it)
+        """
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.lp', delete=False, encoding='utf-8') as temp_file:
+            # Write original .lp content
+            temp_file.write(lp_content)
+            # Add a newline if needed
+            if not lp_content.endswith('\n'):
+                temp_file.write('\n')
+            # Add a comment for patient
+            temp_file.write(f'\n% Patient {patient_id} facts\n')
+            # Write patient facts
+            temp_file.write('\n'.join(facts) + '\n')
+            return temp_file.name
+
+    @staticmethod
+    def _run_clingo(lp_content: str, patient_id: str, facts: List[str],
+                    debug_path: str = None) -> subprocess.CompletedProcess:
+        # clingo run on the program plus one patient's facts; debug_path keeps a copy of the combined file
+        temp_file_path = RuleProcessor._write_patient_program(lp_content, patient_id, facts)
+        try:
+            if debug_path:
+                with open(temp_file_path, 'r', encoding='utf-8') as src, open(debug_path, 'w', encoding='utf-8') as dst:
+                    dst.write(src.read())
+            return subprocess.run(['clingo', '--warn=no-atom-undefined', temp_file_path, '0'],
+                                  capture_output=True, text=True, check=False)
+        finally:
+            os.unlink(temp_file_path)
+
+    def run_clingo_for_patients(self, lp_file_path: str, atoms_file_path: str, output_file_path: str, debug_id: int = None,
+                                slice_program: bool = False, verify_sample: int = 0) -> dict:
         """
         For each patient in the atoms file:
         1. Extract patient facts from the atoms file
@@ -463,6 +578,11 @@ class RuleProcessor:
             lp_file_path (str): Path to the ASP logic program (.lp file with fired rules)
             atoms_file_path (str): Path to the atoms file with patient facts
             output_file_path (str, optional): Path to save the results. If None, results are only printed.
+            slice_program (bool): Solve each patient against only the rules that can be derived
+                from their facts (see ProgramSlicer)
+            verify_sample (int): With slice_program, also solve this many randomly chosen patients
+                with the full program and check their fired/1 answer sets are identical
+                (a mismatching patient keeps the full program's output)
         
         Returns:
             dict: Dictionary mapping patient IDs to clingo outputs
@@ -478,74 +598,67 @@ class RuleProcessor:
         
         # Dictionary to store results
         results = {}
-        
-        # Split the content into patient sections using **Patient N:**
-        patient_sections = re.split(r'(?:\*\*)?Patient\s+(\d+):?(?:\*\*)?', atoms_content)[1:]
-        
-        # Group patient IDs with their sections (they alternate in the split result)
-        patient_data = [(patient_sections[i], patient_sections[i+1]) for i in range(0, len(patient_sections), 2)]
+        patients = self._patient_facts(atoms_content)
+
+        slicer, verify_ids, sliced_sizes, mismatches = None, set(), [], []
+        if slice_program:
+            # Imported here: ProgramSlicer uses this module's statement iterator
+            from src.processing.ProgramSlicer import ProgramSlicer
+            slicer = ProgramSlicer(lp_content)
+            sample = min(verify_sample, len(patients))
+            verify_ids = {patient_id for patient_id, _ in random.Random(42).sample(patients, sample)}
         
         # Process each patient
-        for patient_id, section in patient_data:
+        for patient_id, facts in patients:
             print(f"Processing Patient {patient_id}...")
+
+            program = lp_content
+            if slicer is not None:
+                relevant = slicer.relevant(facts)
+                program = slicer.render(relevant)
+                sliced_sizes.append(len(relevant))
             
-            # Extract facts from the section
-            facts = []
-            for line in section.strip().split('\n'):
-                line = line.strip()
-                # Skip empty lines, comments, and lines that don't look like facts
-                if line and not line.startswith('%') and not line.startswith('**') and '(' in line:
-                    facts.append(line)
-            
-            # Create a temporary file with the combined content
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.lp', delete=False, encoding='utf-8') as temp_file:
-                temp_file_path = temp_file.name
-                # Write original .lp content
-                temp_file.write(lp_content)
-                # Add a newline if needed
-                if not lp_content.endswith('\n'):
-                    temp_file.write('\n')
-                # Add a comment for patient
-                temp_file.write(f'\n% Patient {patient_id} facts\n')
-                # Write patient facts
-                temp_file.write('\n'.join(facts) + '\n')
-            
+            debug_path = None
             if int(patient_id) == debug_id:
-                
-                debug_file_path = os.path.join(os.path.dirname(lp_file_path), f'debug_patient_{patient_id}.lp')
-                with open(temp_file_path, 'r', encoding='utf-8') as src:
-                    debug_content = src.read()
-                with open(debug_file_path, 'w', encoding='utf-8') as dst:
-                    dst.write(debug_content)
-                print(f"  *** DEBUG: Saved combined file to {debug_file_path} ***")
+                debug_path = os.path.join(os.path.dirname(lp_file_path), f'debug_patient_{patient_id}.lp')
             
             try:
-                # Run clingo on the temporary file
-                result = subprocess.run(
-                    ['clingo', '--warn=no-atom-undefined', temp_file_path, '0'],
-                    capture_output=True, 
-                    text=True,
-                    check=False
-                )
+                # Run clingo on the program plus the patient's facts
+                with track(self.metrics, 'clingo', 'solver', patient_id=patient_id):
+                    result = self._run_clingo(program, patient_id, facts, debug_path)
+                if debug_path:
+                    print(f"  *** DEBUG: Saved combined file to {debug_path} ***")
                 
                 # Store the output
                 results[patient_id] = result.stdout
+
+                if patient_id in verify_ids:
+                    full_output = self._run_clingo(lp_content, patient_id, facts).stdout
+                    if self._fired_answer_sets(full_output) != self._fired_answer_sets(result.stdout):
+                        print(f"  *** WARNING: sliced program changed fired/1 for Patient {patient_id}; "
+                              f"using the full program ***")
+                        mismatches.append(patient_id)
+                        results[patient_id] = full_output
                 
                 # Print summary
                 fired_count = result.stdout.count('fired(')
                 print(f"Patient {patient_id}: {fired_count} rules fired")
+                # Syntax and grounding errors only appear on stderr
+                for error_line in (line for line in result.stderr.splitlines() if 'error' in line.lower()):
+                    print(f"  clingo: {error_line}")
                 
             except Exception as e:
                 # Handle errors
                 results[patient_id] = f"ERROR: {str(e)}"
                 print(f"Error running clingo for Patient {patient_id}: {str(e)}")
-            finally:
-                # Clean up the temporary file
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
         
+        if slicer is not None and sliced_sizes:
+            print(f"\nSliced programs kept {sum(sliced_sizes) / len(sliced_sizes):.1f}/{len(slicer.statements)} "
+                  f"statements per patient on average")
+            if verify_ids:
+                print(f"Slicing verified on {len(verify_ids)} patients: "
+                      f"{'identical fired/1 answer sets' if not mismatches else 'mismatches for ' + ', '.join(mismatches)}")
+
         # Save results to file if requested
         if output_file_path:
             with open(output_file_path, 'w', encoding='utf-8') as f:
@@ -557,3 +670,105 @@ class RuleProcessor:
         
         return results
 
+    @staticmethod
+    def _fired_answer_sets(clingo_output: str) -> set:
+        # Each answer set as the frozenset of its fired rule IDs
+        # (newer clingo versions print "Answer: 1 (Time: 0.002s)")
+        return {frozenset(re.findall(r'fired\("([^"]+)"\)', answer))
+                for answer in re.findall(r'Answer: \d+[^\n]*\n([^\n]*)', clingo_output)}
+
+    @staticmethod
+    def _clingo_error(result: subprocess.CompletedProcess) -> Optional[str]:
+        # Why a clingo run produced no result (parse/grounding error, failed exit code), or None
+        errors = [line.strip() for line in result.stderr.splitlines() if 'error' in line.lower()]
+        if errors:
+            return errors[0]
+        if result.returncode not in CLINGO_OK_CODES:
+            return f"clingo exited with code {result.returncode}"
+        if not SOLVE_RESULT_PATTERN.search(result.stdout):
+            return "clingo reported no solving result"
+        return None
+
+    def ground_program_size(self, lp_file_path: str, atoms_file_path: str) -> Dict[str, int]:
+        """
+        Number of ground rules clingo passes to the solver for each patient (Rules in clingo --stats).
+
+        Raises:
+            RuntimeError: If clingo fails for a patient or prints no Rules statistic
+        """
+        with open(lp_file_path, 'r', encoding='utf-8') as f:
+            lp_content = f.read()
+        with open(atoms_file_path, 'r', encoding='utf-8') as f:
+            atoms_content = f.read()
+
+        sizes = {}
+        for patient_id, facts in self._patient_facts(atoms_content):
+            temp_file_path = self._write_patient_program(lp_content, patient_id, facts)
+            try:
+                result = subprocess.run(['clingo', '--stats', '--warn=none', temp_file_path, '1'],
+                                        capture_output=True, text=True, check=False)
+                match = re.search(r'^Rules\s*:\s*(\d+)', result.stdout, re.MULTILINE)
+                error = self._clingo_error(result) or (None if match else "no Rules line in clingo --stats")
+                if error:
+                    raise RuntimeError(f"Grounding {lp_file_path} failed for Patient {patient_id}: {error}")
+                sizes[patient_id] = int(match.group(1))
+            finally:
+                os.unlink(temp_file_path)
+        return sizes
+
+    def compare_fired_encodings(self, input_path: str, atoms_file_path: str, output_dir: str = None) -> dict:
+        """
+        Instrument a rule response with both fired() encodings, check that every patient
+        gets identical fired/1 answer sets, and compare the grounding size.
+
+        Args:
+            input_path: Path to rulegen_response.txt
+            atoms_file_path: Path to the atoms file with patient facts
+            output_dir: Keep the two instrumented programs here (default: temporary directory)
+
+        Returns:
+            Dict with identical, mismatched patient IDs, errors (patient ID or encoding -> clingo
+            error) and ground rule totals per encoding (None when grounding failed). identical
+            is only True when every patient was solved with both encodings.
+        """
+        with open(atoms_file_path, 'r', encoding='utf-8') as f:
+            patients = self._patient_facts(f.read())
+
+        answers, ground_rules, errors = {}, {}, {}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target_dir = output_dir or temp_dir
+            for encoding in FIRED_ENCODINGS:
+                program_path = os.path.join(target_dir, f'rulegen_response_fired_{encoding}.lp')
+                RuleProcessor(None).append_fired_rules(input_path, program_path, encoding=encoding)
+                with open(program_path, 'r', encoding='utf-8') as f:
+                    lp_content = f.read()
+                answers[encoding] = {}
+                with track(self.metrics, f'clingo_{encoding}', 'solver'):
+                    for patient_id, facts in patients:
+                        result = self._run_clingo(lp_content, patient_id, facts)
+                        error = self._clingo_error(result)
+                        if error:
+                            errors.setdefault(patient_id, f"{encoding}: {error}")
+                        else:
+                            answers[encoding][patient_id] = self._fired_answer_sets(result.stdout)
+                try:
+                    ground_rules[encoding] = sum(self.ground_program_size(program_path, atoms_file_path).values())
+                except RuntimeError as e:
+                    ground_rules[encoding] = None
+                    errors[encoding] = str(e)
+
+        compared = [patient_id for patient_id, _ in patients if patient_id not in errors]
+        mismatches = sorted((patient_id for patient_id in compared
+                             if answers['duplicate'][patient_id] != answers['aux'][patient_id]), key=int)
+        if ground_rules['duplicate'] and ground_rules['aux'] is not None:
+            reduction = 1 - ground_rules['aux'] / ground_rules['duplicate']
+        else:
+            reduction = None
+        print(f"fired/1 answer sets identical for {len(compared) - len(mismatches)}/{len(patients)} patients")
+        for key, error in errors.items():
+            print(f"  *** ERROR ({'Patient ' + key if key not in FIRED_ENCODINGS else key}): {error} ***")
+        if reduction is not None:
+            print(f"Ground rules: duplicate {ground_rules['duplicate']}, aux {ground_rules['aux']} "
+                  f"({-reduction:+.1%})")
+        return {'identical': bool(compared) and not mismatches and not errors, 'mismatches': mismatches,
+                'errors': errors, 'ground_rules': ground_rules, 'reduction': reduction}
@@ -0,0 +1,241 @@
+import csv
+import os
+import re
+import subprocess
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from src.processing.RuleProcessor import RuleProcessor, STRING_PATTERN, VARIABLE_PATTERN, iter_asp_statements
+from src.processing.RunMetrics import track
+
+# Counting atom added per statement: PROBE_PREDICATE(statement, (global variables))
+PROBE_PREDICATE = '__ground'
+PROBE_PATTERN = re.compile(rf'^{PROBE_PREDICATE}\((\d+),', re.MULTILINE)
+# Statements that close a rule's block in the fired program
+RULE_ID_PATTERN = re.compile(r'^(?:fired|constraint_ok)\("([^"]+)"\)')
+
+# clingo --stats lines, e.g. "Choices      : 12" or "Time         : 0.004s (Solving: 0.00s ...)"
+STATS_PATTERNS = {
+    'time_s': re.compile(r'^Time\s*:\s*([\d.]+)s', re.MULTILINE),
+    'solve_s': re.compile(r'^Time\s*:.*?Solving:\s*([\d.]+)s', re.MULTILINE),
+    'models': re.compile(r'^Models\s*:\s*(\d+)', re.MULTILINE),
+    'choices': re.compile(r'^Choices\s*:\s*(\d+)', re.MULTILINE),
+    'conflicts': re.compile(r'^Conflicts\s*:\s*(\d+)', re.MULTILINE),
+    'restarts': re.compile(r'^Restarts\s*:\s*(\d+)', re.MULTILINE),
+    'rules': re.compile(r'^Rules\s*:\s*(\d+)', re.MULTILINE),
+    'atoms': re.compile(r'^Atoms\s*:\s*(\d+)', re.MULTILINE),
+    'bodies': re.compile(r'^Bodies\s*:\s*(\d+)', re.MULTILINE),
+    'variables': re.compile(r'^Variables\s*:\s*(\d+)', re.MULTILINE),
+    'constraints': re.compile(r'^Constraints\s*:\s*(\d+)', re.MULTILINE),
+    'timed_out': re.compile(r'^TIME LIMIT\s*:\s*(\d+)', re.MULTILINE),
+}
+
+# Solver cost attributed to a rule by removing it (base run minus run without the rule)
+COST_FIELDS = ['rules', 'choices', 'conflicts', 'time_s', 'solve_s']
+
+
+class RuleProfiler:
+    """Per-rule grounding and solver statistics of a fired-rule program, aggregated over a patient cohort."""
+
+    PATIENT_FIELDS = ['patient_id'] + list(STATS_PATTERNS) + ['error']
+    RULE_FIELDS = ['rule_id', 'statements', 'patients', 'ground_instances', 'max_instances', 'ablated_patients',
+                   'timeouts'] + COST_FIELDS + ['rule']
+
+    def __init__(self, metrics=None):
+        """
+        Args:
+            metrics: Optional RunMetrics
+        """
+        self.metrics = metrics
+
+    @staticmethod
+    def parse_stats(clingo_output: str) -> Dict[str, float]:
+        """
+        Solver statistics from clingo --stats output (missing values are 0).
+        """
+        stats = {}
+        for name, pattern in STATS_PATTERNS.items():
+            match = pattern.search(clingo_output)
+            value = match.group(1) if match else '0'
+            stats[name] = float(value) if name.endswith('_s') else int(value)
+        return stats
+
+    @staticmethod
+    def rule_statements(lp_content: str) -> List[Tuple[Optional[str], str]]:
+        """
+        Statements of a fired program with the rule ID each belongs to.
+
+        A rule's statements end with its fired("id") line (and constraint_ok("id") for
+        constraints), so the rule and its fired() rule, or the rule_body/head/fired
+        statements of the aux encoding, share one ID. Facts and directives get None.
+        """
+        statements, pending = [], []
+        for kind, text in iter_asp_statements(lp_content.splitlines(keepends=True)):
+            if kind != 'statement':
+                continue
+            match = RULE_ID_PATTERN.match(text)
+            if match:
+                statements.extend((match.group(1), statement) for statement in pending + [text])
+                pending = []
+            else:
+                pending.append(text)
+        statements.extend((None, statement) for statement in pending)
+        return statements
+
+    @staticmethod
+    def _global_variables(body: str) -> List[str]:
+        # Variables bound by the body as a whole; aggregate elements and conditional
+        # literals have local variables, so such bodies are not projected
+        body = STRING_PATTERN.sub('""', body)
+        if ':' in body:
+            return []
+        return list(dict.fromkeys(VARIABLE_PATTERN.findall(re.sub(r'\{[^{}]*\}', '', body))))
+
+    def _probe(self, index: int, statement: str) -> Optional[str]:
+        # Rule whose ground instances are those of the statement's body
+        if statement.startswith('#') or ':-' not in statement:
+            return None
+        body = statement.split(':-', 1)[1].strip().rstrip('.')
+        variables = self._global_variables(body)
+        arguments = f"({', '.join(variables)},)" if variables else '()'
+        return f'{PROBE_PREDICATE}({index}, {arguments}) :- {body}.'
+
+    @staticmethod
+    def _run(program: str, facts: List[str], arguments: List[str]) -> subprocess.CompletedProcess:
+        temp_file_path = RuleProcessor._write_patient_program(program, 'profile', facts)
+        try:
+            return subprocess.run(['clingo', '--warn=none'] + arguments + [temp_file_path],
+                                  capture_output=True, text=True, check=False)
+        finally:
+            os.unlink(temp_file_path)
+
+    def ground_instances(self, statements: List[Tuple[Optional[str], str]], facts: List[str]) -> Counter:
+        """
+        Ground instances of each statement's body for one patient (statement index -> count),
+        counted from gringo's text output of the program with one probe rule per statement.
+        """
+        probes = [probe for index, (_, statement) in enumerate(statements)
+                  for probe in [self._probe(index, statement)] if probe]
+        program = '\n'.join([statement for _, statement in statements] + probes)
+        result = self._run(program, facts, ['--text'])
+        return Counter(int(index) for index in PROBE_PATTERN.findall(result.stdout))
+
+    def solve_stats(self, statements: List[Tuple[Optional[str], str]], facts: List[str],
+                    skip_rule: Optional[str] = None, time_limit: int = 0) -> Dict[str, float]:
+        """
+        clingo --stats for one patient, optionally without the statements of one rule.
+        Runs stopped by time_limit (seconds, 0 for none) have timed_out set.
+        """
+        program = '\n'.join(statement for rule_id, statement in statements
+                            if skip_rule is None or rule_id != skip_rule)
+        result = self._run(program, facts, ['--stats', f'--time-limit={time_limit}', '0'])
+        stats = self.parse_stats(result.stdout)
+        stats['error'] = '; '.join(line for line in result.stderr.splitlines() if 'error' in line.lower())
+        return stats
+
+    def profile(self, lp_file_path: str, atoms_file_path: str, output_dir: Optional[str] = None,
+                ablate: Optional[int] = None, time_limit: int = 10, top: int = 10) -> Dict[str, List[dict]]:
+        """
+        Profile every rule of a fired program over the patients of an atoms file.
+
+        For each patient the full program is solved with --stats, and each statement's
+        body is counted by its ground instances (attributed to its rule ID). Choices,
+        conflicts, ground rules and time are attributed to a rule by solving the patients
+        it grounds for again without it: the cost is the base run minus that run. Removing
+        a rule can change the answer sets, so these costs point at the rules worth looking
+        at rather than adding up exactly; times are single runs and noisy at millisecond scale.
+
+        Args:
+            lp_file_path: Program with fired rules (rulegen_response_fired.lp)
+            atoms_file_path: Atoms file with patient facts
+            output_dir: Write rule_profile.csv and patient_profile.csv here
+            ablate: Only attribute solver costs for this many rules with the most ground
+                instances (None: every rule)
+            time_limit: Seconds per solver run; removing a constraint can leave a huge number
+                of answer sets to enumerate, such runs are counted in the rule's timeouts
+            top: Rules printed per ranking
+
+        Returns:
+            Dict with 'patients' (stats per patient) and 'rules' (one row per rule ID,
+            most ground instances first)
+        """
+        with open(lp_file_path, 'r', encoding='utf-8') as f:
+            lp_content = f.read()
+        with open(atoms_file_path, 'r', encoding='utf-8') as f:
+            patients = RuleProcessor._patient_facts(f.read())
+        statements = self.rule_statements(lp_content)
+        rule_map = RuleProcessor(None)._build_rule_map_from_lp(lp_content)
+
+        rows: Dict[str, dict] = {}
+        for rule_id, _ in statements:
+            if rule_id is not None:
+                row = rows.setdefault(rule_id, dict.fromkeys(self.RULE_FIELDS, 0))
+                row.update(rule_id=rule_id, statements=row['statements'] + 1, rule=rule_map.get(rule_id, ''))
+
+        patient_rows, base_stats, grounded = [], {}, {}
+        for patient_id, facts in patients:
+            with track(self.metrics, 'profile_patient', 'solver', patient_id=patient_id):
+                base_stats[patient_id] = self.solve_stats(statements, facts, time_limit=time_limit)
+                counts = self.ground_instances(statements, facts)
+            patient_rows.append(dict(base_stats[patient_id], patient_id=patient_id))
+            if base_stats[patient_id]['error']:
+                print(f"Patient {patient_id}: {base_stats[patient_id]['error']}")
+
+            per_rule = Counter()
+            for index, count in counts.items():
+                if statements[index][0] is not None:
+                    per_rule[statements[index][0]] += count
+            for rule_id, count in per_rule.items():
+                rows[rule_id]['patients'] += 1
+                rows[rule_id]['ground_instances'] += count
+                rows[rule_id]['max_instances'] = max(rows[rule_id]['max_instances'], count)
+                grounded.setdefault(rule_id, []).append((patient_id, facts))
+
+        ranked = sorted(rows.values(), key=lambda row: (-row['ground_instances'], row['rule_id']))
+        to_ablate = ranked if ablate is None else ranked[:ablate]
+        print(f"Profiling {len(to_ablate)} rules over {len(patients)} patients...")
+        for row in to_ablate:
+            # A rule with no ground instances for a patient cannot change its solving
+            for patient_id, facts in grounded.get(row['rule_id'], []):
+                with track(self.metrics, 'profile_ablation', 'solver', rule_id=row['rule_id']):
+                    stats = self.solve_stats(statements, facts, skip_rule=row['rule_id'], time_limit=time_limit)
+                row['ablated_patients'] += 1
+                row['timeouts'] += stats['timed_out']
+                for field in COST_FIELDS:
+                    row[field] += base_stats[patient_id][field] - stats[field]
+        for row in ranked:
+            row['time_s'] = round(row['time_s'], 4)
+            row['solve_s'] = round(row['solve_s'], 4)
+
+        self._print_rankings(ranked, patient_rows, top)
+        if output_dir:
+            self.write_csv(ranked, self.RULE_FIELDS, os.path.join(output_dir, 'rule_profile.csv'))
+            self.write_csv(patient_rows, self.PATIENT_FIELDS, os.path.join(output_dir, 'patient_profile.csv'))
+        return {'patients': patient_rows, 'rules': ranked}
+
+    @staticmethod
+    def _print_rankings(ranked: List[dict], patient_rows: List[dict], top: int) -> None:
+        total = sum(row['ground_instances'] for row in ranked) or 1
+        print(f"\nTotal over {len(patient_rows)} patients: "
+              f"{sum(row['rules'] for row in patient_rows)} ground rules, "
+              f"{sum(row['choices'] for row in patient_rows)} choices, "
+              f"{sum(row['conflicts'] for row in patient_rows)} conflicts, "
+              f"{sum(row['time_s'] for row in patient_rows):.3f}s")
+        for field, label in [('ground_instances', 'ground instances'), ('choices', 'choices'),
+                             ('conflicts', 'conflicts'), ('solve_s', 'solve time (s)')]:
+            rules = [row for row in sorted(ranked, key=lambda row: -row[field]) if row[field] > 0][:top]
+            if not rules:
+                continue
+            print(f"\nTop rules by {label}:")
+            for row in rules:
+                share = f" ({row['ground_instances'] / total:.1%})" if field == 'ground_instances' else ''
+                print(f"  {row['rule_id']:<14} {row[field]}{share}  {row['rule'][:80]}")
+
+    @staticmethod
+    def write_csv(rows: List[dict], fields: List[str], report_path: str) -> None:
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        with open(report_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, restval='', extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Profile written to {report_path}")
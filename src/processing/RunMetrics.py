@@ -0,0 +1,179 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+import psutil
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class RunMetrics:
+    """Collects wall time, token usage, estimated cost and memory for each stage of a pipeline run."""
+
+    # USD per million (input, output) tokens, used to estimate cost from provider usage fields
+    MODEL_PRICING: Dict[str, Tuple[float, float]] = {
+        'claude-opus-4-1-20250805': (15.0, 75.0),
+        'claude-3-7-sonnet-20250219': (3.0, 15.0),
+        'claude-sonnet-4-20250514': (3.0, 15.0),
+        'gpt-4o': (2.5, 10.0),
+        'gpt-4o-mini': (0.15, 0.6),
+        'gpt-5.1-2025-11-13': (1.25, 10.0),
+    }
+
+    def __init__(self, pricing: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.pricing = {**self.MODEL_PRICING, **(pricing or {})}
+        self.spans: List[dict] = []
+        self.client_pools: Dict[str, dict] = {}  # ClientRegistry.stats() of the shared provider clients
+        self._process = psutil.Process(os.getpid())
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _stack(self) -> List[dict]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _rss_mb(self) -> float:
+        return self._process.memory_info().rss / 2**20
+
+    def _peak_rss_mb(self) -> Optional[float]:
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+    @contextmanager
+    def span(self, name: str, category: str = 'pipeline', **attrs):
+        """
+        Time a block of work. Spans nest per thread, so token usage recorded inside
+        an API call is attached to the innermost open span.
+
+        Args:
+            name: Span name, e.g. 'run_constant_inference' or 'clingo'
+            category: Grouping used in the summary and the Chrome trace
+            **attrs: Extra attributes stored with the span (e.g. patient_id)
+        """
+        record = {
+            'name': name,
+            'category': category,
+            'thread': threading.get_ident(),
+            'start_s': time.perf_counter() - self._origin,
+            'rss_start_mb': round(self._rss_mb(), 2),
+            'attrs': attrs,
+        }
+        stack = self._stack()
+        stack.append(record)
+        try:
+            yield record
+        finally:
+            stack.pop()
+            record['duration_s'] = time.perf_counter() - self._origin - record['start_s']
+            record['rss_end_mb'] = round(self._rss_mb(), 2)
+            peak = self._peak_rss_mb()
+            record['peak_rss_mb'] = round(peak, 2) if peak is not None else record['rss_end_mb']
+            with self._lock:
+                self.spans.append(record)
+
+    def estimate_cost(self, model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+        if model not in self.pricing:
+            return None
+        input_price, output_price = self.pricing[model]
+        return (input_tokens * input_price + output_tokens * output_price) / 1e6
+
+    def record_usage(self, model: str, input_tokens: int, output_tokens: int) -> None:
+        """
+        Attach token usage from a provider response to the innermost open span.
+        """
+        stack = self._stack()
+        if not stack:
+            return
+        attrs = stack[-1]['attrs']
+        attrs['model'] = model
+        attrs['input_tokens'] = attrs.get('input_tokens', 0) + (input_tokens or 0)
+        attrs['output_tokens'] = attrs.get('output_tokens', 0) + (output_tokens or 0)
+        cost = self.estimate_cost(model, input_tokens or 0, output_tokens or 0)
+        if cost is not None:
+            attrs['cost_usd'] = attrs.get('cost_usd', 0.0) + cost
+
+    def record_client_pools(self, stats: Dict[str, dict]) -> None:
+        """
+        Store connection reuse of the shared provider clients (see ClientRegistry.stats).
+        """
+        self.client_pools = stats
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Aggregate spans by name: call count, total/max wall time, tokens and cost.
+        """
+        summary: Dict[str, dict] = {}
+        for record in self.spans:
+            entry = summary.setdefault(record['name'], {
+                'category': record['category'], 'calls': 0, 'total_s': 0.0, 'max_s': 0.0,
+                'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0, 'peak_rss_mb': 0.0,
+            })
+            entry['calls'] += 1
+            entry['total_s'] += record['duration_s']
+            entry['max_s'] = max(entry['max_s'], record['duration_s'])
+            entry['input_tokens'] += record['attrs'].get('input_tokens', 0)
+            entry['output_tokens'] += record['attrs'].get('output_tokens', 0)
+            entry['cost_usd'] += record['attrs'].get('cost_usd', 0.0)
+            entry['peak_rss_mb'] = max(entry['peak_rss_mb'], record['peak_rss_mb'])
+        for entry in summary.values():
+            entry['total_s'] = round(entry['total_s'], 4)
+            entry['max_s'] = round(entry['max_s'], 4)
+            entry['cost_usd'] = round(entry['cost_usd'], 6)
+        return summary
+
+    def write_json(self, output_path: str) -> None:
+        """
+        Write the per-stage summary and every span to run_metrics.json.
+        """
+        # Only API call spans carry usage, so totals are taken from those to avoid double counting
+        calls = [s for s in self.spans if 'input_tokens' in s['attrs']]
+        report = {
+            'total_input_tokens': sum(s['attrs']['input_tokens'] for s in calls),
+            'total_output_tokens': sum(s['attrs']['output_tokens'] for s in calls),
+            'total_cost_usd': round(sum(s['attrs'].get('cost_usd', 0.0) for s in calls), 6),
+            'peak_rss_mb': max((s['peak_rss_mb'] for s in self.spans), default=None),
+            'stages': self.summary(),
+            'client_pools': self.client_pools,
+            'spans': sorted(self.spans, key=lambda s: s['start_s']),
+        }
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Run metrics written to {output_path}")
+
+    def write_chrome_trace(self, output_path: str) -> None:
+        """
+        Export spans in the Chrome trace event format (open in chrome://tracing or Perfetto).
+        """
+        pid = os.getpid()
+        events = [{
+            'name': s['name'],
+            'cat': s['category'],
+            'ph': 'X',
+            'ts': round(s['start_s'] * 1e6),
+            'dur': round(s['duration_s'] * 1e6),
+            'pid': pid,
+            'tid': s['thread'],
+            'args': {**s['attrs'], 'peak_rss_mb': s['peak_rss_mb']},
+        } for s in self.spans]
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+        print(f"Chrome trace written to {output_path}")
+
+
+def track(metrics: Optional[RunMetrics], name: str, category: str = 'pipeline', **attrs):
+    # Span on an optional RunMetrics, so instrumented classes work without one
+    if metrics is None:
+        return nullcontext()
+    return metrics.span(name, category, **attrs)
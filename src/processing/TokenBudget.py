@@ -0,0 +1,180 @@
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Model name prefix -> (context window, output tokens requested per call). Claude output is
+# kept at 20000 so calls stay within the SDK's limit for non-streaming requests; longer
+# replies are continued (see LLMInferencer._request)
+MODEL_LIMITS: Dict[str, Tuple[int, int]] = {
+    'claude-opus-4': (200000, 20000),
+    'claude-sonnet-4': (200000, 20000),
+    'claude-3-7-sonnet': (200000, 20000),
+    'claude-3-5': (200000, 8192),
+    'claude-3': (200000, 4096),
+    'gpt-5': (400000, 128000),
+    'gpt-4.1': (1047576, 32768),
+    'gpt-4o': (128000, 16384),
+    'gpt-4-turbo': (128000, 4096),
+    'gpt-4': (8192, 4096),
+    'o1': (200000, 100000),
+    'o3': (200000, 100000),
+    'o4-mini': (200000, 100000),
+    'deepseek/': (128000, 8192),
+    'llama': (131072, 8192),
+}
+DEFAULT_LIMITS = (128000, 4096)
+
+# Used when no tiktoken encoding is available (conservative for English guideline text)
+CHARS_PER_TOKEN = 3.0
+
+# Guideline section headers (1.2 Referral) and clauses (1.2.3 ...), the preferred split points
+SECTION_PATTERN = re.compile(r'^\d+\.\d+\b(?!\.\d)', re.MULTILINE)
+CLAUSE_PATTERN = re.compile(r'^\d+\.\d+\.\d+', re.MULTILINE)
+# Vignettes that are already numbered, e.g. "Patient 3 description:" or "**Patient 3:**"
+VIGNETTE_PATTERN = re.compile(r'^(?:\*\*)?Patient\s+(\d+)', re.MULTILINE)
+
+# tiktoken encodings by name, loaded once per process
+_ENCODINGS: Dict[str, object] = {}
+_ENCODING_LOCK = threading.Lock()
+
+
+def _encoding(model: str):
+    # tiktoken encoding for the model: its own for OpenAI models, cl100k_base as an
+    # approximation for the others; None if tiktoken or the encoding file is unavailable
+    if tiktoken is None:
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        name = 'cl100k_base'
+    with _ENCODING_LOCK:
+        if name not in _ENCODINGS:
+            try:
+                _ENCODINGS[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                print(f"tiktoken encoding '{name}' unavailable ({type(e).__name__}), estimating tokens from characters")
+                _ENCODINGS[name] = None
+        return _ENCODINGS[name]
+
+
+def model_limits(model: str) -> Tuple[int, int]:
+    """
+    (context window, output tokens per call) for a model, matched on the longest name prefix.
+    """
+    for prefix in sorted(MODEL_LIMITS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_LIMITS[prefix]
+    return DEFAULT_LIMITS
+
+
+def _split_at(text: str, pattern: re.Pattern) -> List[str]:
+    # Pieces of text starting at each match (the text before the first match is its own piece)
+    starts = [match.start() for match in pattern.finditer(text)]
+    bounds = ([0] if not starts or starts[0] != 0 else []) + starts + [len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:]) if text[start:end].strip()]
+
+
+def split_vignettes(text: str) -> List[str]:
+    """
+    Patient vignettes as separate "Patient N description:" blocks numbered from 1 in file
+    order, so every chunk of vignettes keeps the cohort's numbering. Vignettes are either
+    already numbered or one per line after an optional title line (e.g. "Patient description").
+    """
+    if VIGNETTE_PATTERN.search(text):
+        return [piece.strip() for piece in _split_at(text, VIGNETTE_PATTERN) if VIGNETTE_PATTERN.match(piece)]
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if lines and not lines[0].endswith(('.', '!', '?')):
+        lines = lines[1:]
+    return [f"Patient {number} description:\n{line}" for number, line in enumerate(lines, start=1)]
+
+
+class TokenBudget:
+    """Token counting and context/output limits of one model, with chunking of oversized inputs."""
+
+    def __init__(self, model: str, max_output_tokens: Optional[int] = None, safety_margin: float = 0.05):
+        """
+        Args:
+            model: Model name, e.g. 'claude-opus-4-1-20250805' or 'gpt-5.1-2025-11-13'
+            max_output_tokens: Output tokens requested per call (default from MODEL_LIMITS)
+            safety_margin: Fraction of the context window left unused, as counts for
+                non-OpenAI models are approximate
+        """
+        self.model = model
+        self.context_window, default_output = model_limits(model)
+        self.max_output_tokens = max_output_tokens or default_output
+        self.safety_margin = safety_margin
+        self.encoding = _encoding(model)
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return int(len(text) / CHARS_PER_TOKEN) + 1
+
+    @property
+    def input_budget(self) -> int:
+        # Prompt tokens that leave room for a full-length reply
+        return int(self.context_window * (1 - self.safety_margin)) - self.max_output_tokens
+
+    def fits(self, prompt: str) -> bool:
+        return self.count(prompt) <= self.input_budget
+
+    def output_tokens(self, prompt_tokens: int) -> int:
+        """
+        Output tokens to request for a prompt, reduced when the prompt leaves less room.
+        """
+        room = int(self.context_window * (1 - self.safety_margin)) - prompt_tokens
+        if room <= 0:
+            raise ValueError(f"Prompt of {prompt_tokens} tokens exceeds the {self.context_window} token "
+                             f"context window of {self.model}")
+        return min(self.max_output_tokens, room)
+
+    def _pack(self, pieces: List[str], max_tokens: int, separator: str) -> List[str]:
+        # Greedily join consecutive pieces into chunks of at most max_tokens
+        chunks, current, current_tokens = [], [], 0
+        for piece in pieces:
+            tokens = self.count(piece)
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+        if current:
+            chunks.append(separator.join(current))
+        return chunks
+
+    def _split_long(self, text: str, max_tokens: int, patterns: List[re.Pattern]) -> List[str]:
+        # Split at the first boundary type that applies, recursing into pieces that are
+        # still too long; lines, then characters, are the last resort
+        if self.count(text) <= max_tokens:
+            return [text]
+        for position, pattern in enumerate(patterns):
+            pieces = _split_at(text, pattern)
+            if len(pieces) > 1:
+                pieces = [part for piece in pieces for part in self._split_long(piece, max_tokens, patterns[position + 1:])]
+                return self._pack(pieces, max_tokens, '')
+        lines = text.splitlines(keepends=True)
+        if len(lines) > 1:
+            pieces = [part for line in lines for part in self._split_long(line, max_tokens, [])]
+            return self._pack(pieces, max_tokens, '')
+        size = max(1, int(max_tokens * CHARS_PER_TOKEN / 2))
+        return self._pack([text[i:i + size] for i in range(0, len(text), size)], max_tokens, '')
+
+    def split_guideline(self, text: str, max_tokens: int) -> List[str]:
+        """
+        Guideline text in chunks of at most max_tokens, split between sections where possible,
+        then between clauses.
+        """
+        return self._split_long(text, max_tokens, [SECTION_PATTERN, CLAUSE_PATTERN])
+
+    def split_vignettes(self, text: str, max_tokens: int) -> List[str]:
+        """
+        Numbered patient vignettes (see split_vignettes) in chunks of at most max_tokens.
+        A single vignette over the budget is split by lines.
+        """
+        pieces = [part for vignette in split_vignettes(text) for part in self._split_long(vignette + '\n\n', max_tokens, [])]
+        return self._pack(pieces, max_tokens, '')
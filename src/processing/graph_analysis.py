@@ -1,186 +1,237 @@
 import re
 import numpy as np
 import networkx as nx
-from grakel import Graph, WeisfeilerLehmanOptimalAssignment
-from sentence_transformers import SentenceTransformer
+from grakel import Graph, WeisfeilerLehman
 from sklearn.metrics.pairwise import cosine_similarity
 import ot
 import csv
 import os
+from concurrent.futures import ProcessPoolExecutor
+from src.processing.RunMetrics import track
+from src.processing.EmbeddingBackends import load_embedding_model
+from src.processing.graph_utils import ASPGraphCreator
+
+EDGE_TYPES = ['regular', 'negated', 'choice', 'and']
+
+
+def _normalise_rows(edge_vectors):
+    # Unit-normalise each edge vector so cosine similarity becomes a single matrix product
+    normalised = {}
+    for edge_type, vectors in edge_vectors.items():
+        if len(vectors) == 0:
+            normalised[edge_type] = vectors
+        else:
+            normalised[edge_type] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return normalised
+
+
+def compare_prepared_graphs(prepared1, prepared2):
+    # Semantic adjacency similarity between two graphs prepared by GraphAnalyzer.prepare_graph.
+    # Module-level so it can run in worker processes.
+    
+    # Calculate similarity for each edge type
+    type_similarities = {}
+    for edge_type in EDGE_TYPES:
+        edges1 = prepared1['edges'][edge_type]
+        edges2 = prepared2['edges'][edge_type]
+      
+        # Skip if either has no edges of this type
+        if len(edges1) == 0 and len(edges2) == 0:
+            type_similarities[edge_type] = 1.0  # Both empty, perfect match
+            print(f"Similarity for {edge_type}: 1.0000 (both empty)")
+            continue
+        elif len(edges1) == 0 or len(edges2) == 0:
+            type_similarities[edge_type] = 0.0  # One empty, one not, no match
+            print(f"Similarity for {edge_type}: 0.0000 (one empty)")
+            continue
+        
+        # Pairwise cosine similarities between all edges (rows are unit vectors)
+        similarity_matrix = edges1 @ edges2.T
+        
+        # Use optimal transport to find the best matching between edges
+        # This handles different numbers of edges
+        n1 = len(edges1)
+        n2 = len(edges2)
+        
+        # Create normalized weights
+        p = np.ones(n1) / n1
+        q = np.ones(n2) / n2
+        
+        # Cost matrix is 1 - similarity
+        cost_matrix = 1 - similarity_matrix
+        
+        # Compute Earth Mover's Distance
+        try:
+            # Compute optimal transport
+            transport_plan = ot.emd(p, q, cost_matrix)
+            
+            # Calculate similarity from transport plan
+            similarity = 1 - np.sum(transport_plan * cost_matrix)
+        except Exception:
+            # Fallback if ot package has issues
+            # Use Hungarian algorithm for assignment
+            from scipy.optimize import linear_sum_assignment
+            row_ind, col_ind = linear_sum_assignment(cost_matrix)
+            
+            # Calculate average similarity of the optimal matching
+            similarity = 1 - cost_matrix[row_ind, col_ind].mean()
+        
+        type_similarities[edge_type] = similarity
+    
+    # Calculate overall similarity as average of type similarities
+    overall_similarity = sum(type_similarities.values()) / len(type_similarities)
+
+    # Calculate structure penalties
+    node_diff = abs(prepared1['n_nodes'] - prepared2['n_nodes']) / max(prepared1['n_nodes'], prepared2['n_nodes'])
+    edge_diff = abs(prepared1['n_edges'] - prepared2['n_edges']) / max(prepared1['n_edges'], prepared2['n_edges'])
+    
+    size_penalty_factor = 0.5
+    # Average the structural differences
+    structure_penalty = (node_diff + edge_diff) / 2 * size_penalty_factor
+    
+    # Apply penalty to similarity
+    adjusted_similarity = overall_similarity * (1 - structure_penalty)
+    
+    return adjusted_similarity, overall_similarity, structure_penalty
+
 
 class GraphAnalyzer:
     # Class for analyzing and comparing ASP program graphs
     
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, metrics=None, embedding_backend='torch'):
+        self.model = load_embedding_model(embedding_backend)  # torch, onnx or onnx-int8
+        self.metrics = metrics  # Optional RunMetrics for comparison timings
 
     
-    def create_node_embeddings(self, G):
+    @staticmethod
+    def node_text(G, node):
+        # Text used to embed a node
+        
+        # Extract predicate name and arguments
+        match = re.match(r'(\w+)\((.*?)\)', str(node))
+        if match:
+            pred_name, args = match.groups()
+            return f"Predicate {pred_name} with arguments {args}"
+        # Handle special nodes like choice nodes
+        if G.nodes[node].get('node_type') == 'choice':
+            bounds = G.nodes[node]
+            lower = bounds.get('lower_bound', 0)
+            upper = bounds.get('upper_bound', 0)
+            return f"Choice rule with bounds {lower}-{upper}"
+        return str(node)
+    
+    def create_node_embeddings(self, G, text_embeddings=None):
             # Create embeddings for each node in a simpler format
+            # text_embeddings: optional precomputed {text: embedding} shared across graphs
 
             nodes = list(G.nodes())
             node_to_idx = {node: i for i, node in enumerate(nodes)}
             
+            texts = [self.node_text(G, node) for node in nodes]
+            if text_embeddings is None:
+                text_embeddings = self.encode_texts(texts)
+            
             # Create embeddings for each node
-            embeddings = {}
-            for node in nodes:
-                # Extract predicate name and arguments
-                match = re.match(r'(\w+)\((.*?)\)', str(node))
-                if match:
-                    pred_name, args = match.groups()
-                    text = f"Predicate {pred_name} with arguments {args}"
-                else:
-                    # Handle special nodes like choice nodes
-                    if G.nodes[node].get('node_type') == 'choice':
-                        bounds = G.nodes[node]
-                        lower = bounds.get('lower_bound', 0)
-                        upper = bounds.get('upper_bound', 0)
-                        text = f"Choice rule with bounds {lower}-{upper}"
-                    else:
-                        text = str(node)
-                
-                embeddings[node] = self.model.encode(text)
+            embeddings = {node: text_embeddings[text] for node, text in zip(nodes, texts)}
             
             return embeddings, nodes, node_to_idx
     
-    def create_semantic_adjacency_matrices(self, G, embeddings, nodes, node_to_idx):
-            # Create semantic adjacency matrices for each edge type
-
-            edge_types = ['regular', 'negated', 'choice', 'and']
+    def encode_texts(self, texts):
+        # Encode unique texts in a single batch and return {text: embedding}
+        unique_texts = list(dict.fromkeys(texts))
+        if not unique_texts:
+            return {}
+        vectors = self.model.encode(unique_texts)
+        return dict(zip(unique_texts, vectors))
+    
+    def create_edge_vectors(self, G, embeddings, node_to_idx):
+            # Semantic adjacency per edge type: one row per edge holding the concatenated source and
+            # target embeddings (the non-zero entries of an n x n x 2d tensor), in row-major order.
 
-            n = len(nodes)
-            embedding_dim = len(next(iter(embeddings.values())))
-            
-            # Initialize matrices for each edge type
-            matrices = {edge_type: np.zeros((n, n, embedding_dim * 2)) for edge_type in edge_types}
-            
-            # Fill matrices with semantic information
+            entries = {edge_type: [] for edge_type in EDGE_TYPES}
             for u, v, data in G.edges(data=True):
-                i, j = node_to_idx[u], node_to_idx[v]
-                
-                # Determine edge type
-                edge_type = 'regular'
-                if data.get('negated'):
-                    edge_type = 'negated'
-                elif data.get('connection_type') == 'choice':
-                    edge_type = 'choice'
-                elif data.get('connection_type') == 'and':
-                    edge_type = 'and'
-                
-                # Store concatenated source and target embeddings
-                matrices[edge_type][i, j] = np.concatenate([embeddings[u], embeddings[v]])
+                entries[ASPGraphCreator.edge_type(data)].append((node_to_idx[u], node_to_idx[v], u, v))
             
-            # Add node self-information to diagonal for isolated nodes
-            for node in nodes:
-                i = node_to_idx[node]
+            # Node self-information on the diagonal for isolated nodes
+            for node in G.nodes():
                 if G.degree(node) == 0:
-                    matrices['regular'][i, i] = np.concatenate([embeddings[node], embeddings[node]])
+                    i = node_to_idx[node]
+                    entries['regular'].append((i, i, node, node))
+            
+            edge_vectors = {}
+            for edge_type, items in entries.items():
+                items.sort(key=lambda item: (item[0], item[1]))
+                vectors = [np.concatenate([embeddings[u], embeddings[v]]) for _, _, u, v in items]
+                vectors = [vec for vec in vectors if not np.all(vec == 0)]
+                edge_vectors[edge_type] = np.array(vectors)
             
-            return matrices
+            return edge_vectors
+    
+    def prepare_graph(self, G, text_embeddings=None):
+        # Precompute everything needed on one side of a comparison (e.g. the ground truth once)
+        embeddings, nodes, node_to_idx = self.create_node_embeddings(G, text_embeddings)
+        return {
+            'edges': _normalise_rows(self.create_edge_vectors(G, embeddings, node_to_idx)),
+            'n_nodes': len(G.nodes()),
+            'n_edges': len(G.edges()),
+        }
         
         
     def compute_semantic_adjacency_similarity(self, G1, G2):
         # Compute similarity between two graphs using semantic adjacency matrices that capture both source and target node semantics, handling different graph sizes.
         
-        # Define edge types to consider
-        edge_types = ['regular', 'negated', 'choice', 'and']
-        
-        # Get node embeddings
-        embeddings1, nodes1, node_to_idx1 = self.create_node_embeddings(G1)
-        embeddings2, nodes2, node_to_idx2 = self.create_node_embeddings(G2)
-        
-        # Create semantic adjacency matrices for each edge type
-        
-        
-        # Get semantic adjacency matrices
-        matrices1 = self.create_semantic_adjacency_matrices(G1, embeddings1, nodes1, node_to_idx1)
-        matrices2 = self.create_semantic_adjacency_matrices(G2, embeddings2, nodes2, node_to_idx2)
-        
-        # Calculate similarity for each edge type
-        type_similarities = {}
-        for edge_type in edge_types:
-            # Extract non-zero entries from each matrix (only consider actual edges)
-            edges1 = []
-            edges2 = []
-            
-            for i in range(len(nodes1)):
-                for j in range(len(nodes1)):
-                    if not np.all(matrices1[edge_type][i, j] == 0):
-                        edges1.append(matrices1[edge_type][i, j])
-            
-            for i in range(len(nodes2)):
-                for j in range(len(nodes2)):
-                    if not np.all(matrices2[edge_type][i, j] == 0):
-                        edges2.append(matrices2[edge_type][i, j])
-            
-            # Convert to numpy arrays
-            edges1 = np.array(edges1)
-            edges2 = np.array(edges2)
-          
-            # Skip if either has no edges of this type
-            if len(edges1) == 0 and len(edges2) == 0:
-                type_similarities[edge_type] = 1.0  # Both empty, perfect match
-                print(f"Similarity for {edge_type}: 1.0000 (both empty)")
-                continue
-            elif len(edges1) == 0 or len(edges2) == 0:
-                type_similarities[edge_type] = 0.0  # One empty, one not, no match
-                print(f"Similarity for {edge_type}: 0.0000 (one empty)")
-                continue
-            
-            # Calculate pairwise cosine similarities between all edges
-            similarity_matrix = np.zeros((len(edges1), len(edges2)))
-            for i in range(len(edges1)):
-                for j in range(len(edges2)):
-                    similarity_matrix[i, j] = np.dot(edges1[i], edges2[j]) / (
-                        np.linalg.norm(edges1[i]) * np.linalg.norm(edges2[j]))
-            
-            # Use optimal transport to find the best matching between edges
-            # This handles different numbers of edges
-            n1 = len(edges1)
-            n2 = len(edges2)
-            
-            # Create normalized weights
-            p = np.ones(n1) / n1
-            q = np.ones(n2) / n2
-            
-            # Cost matrix is 1 - similarity
-            cost_matrix = 1 - similarity_matrix
-            
-            # Compute Earth Mover's Distance
-            try:
-                # Compute optimal transport
-                transport_plan = ot.emd(p, q, cost_matrix)
-                
-                # Calculate similarity from transport plan
-                similarity = 1 - np.sum(transport_plan * cost_matrix)
-            except Exception:
-                # Fallback if ot package has issues
-                # Use Hungarian algorithm for assignment
-                from scipy.optimize import linear_sum_assignment
-                row_ind, col_ind = linear_sum_assignment(cost_matrix)
-                
-                # Calculate average similarity of the optimal matching
-                similarity = 1 - cost_matrix[row_ind, col_ind].mean()
-            
-            type_similarities[edge_type] = similarity
-            # print(f"Similarity for {edge_type}: {similarity:.4f}")
-        
-        # Calculate overall similarity as average of type similarities
-        overall_similarity = sum(type_similarities.values()) / len(type_similarities)
-        # print(f"Overall similarity: {overall_similarity:.4f}")
-
-        # Calculate structure penalties
-        node_diff = abs(len(G1.nodes()) - len(G2.nodes())) / max(len(G1.nodes()), len(G2.nodes()))
-        edge_diff = abs(len(G1.edges()) - len(G2.edges())) / max(len(G1.edges()), len(G2.edges()))
+        return compare_prepared_graphs(self.prepare_graph(G1), self.prepare_graph(G2))
+    
+    
+    @staticmethod
+    def node_label(G, node):
+        # Discrete label used by the Weisfeiler-Lehman kernel: the predicate name
+        if G.nodes[node].get('node_type') == 'choice':
+            return 'choice'
+        match = re.match(r'(\w+)\(', str(node))
+        return match.group(1) if match else str(node)
+    
+    def to_grakel_graph(self, G):
+        # Labeled GraKeL graph of a program graph. GraKeL's WL kernel only refines node labels,
+        # so each edge is replaced by an intermediate node labeled with its edge type.
+        node_to_idx = {node: i for i, node in enumerate(G.nodes())}
+        labels = {i: self.node_label(G, node) for node, i in node_to_idx.items()}
+        adjacency = {i: [] for i in labels}
         
-        size_penalty_factor = 0.5
-        # Average the structural differences
-        structure_penalty = (node_diff + edge_diff) / 2 * size_penalty_factor
+        seen_and = set()
+        for u, v, data in G.edges(data=True):
+            edge_type = ASPGraphCreator.edge_type(data)
+            if edge_type == 'and':
+                # AND edges are stored in both directions; keep one
+                if (v, u) in seen_and:
+                    continue
+                seen_and.add((u, v))
+            
+            edge_node = len(labels)
+            labels[edge_node] = f"edge_{edge_type}"
+            adjacency[edge_node] = [node_to_idx[u], node_to_idx[v]]
+            adjacency[node_to_idx[u]].append(edge_node)
+            adjacency[node_to_idx[v]].append(edge_node)
         
-        # Apply penalty to similarity
-        adjusted_similarity = overall_similarity * (1 - structure_penalty)
+        return Graph(adjacency, node_labels=labels)
+    
+    def compute_wl_kernel_matrix(self, graphs, n_iter=3):
+        # Normalised pairwise Weisfeiler-Lehman subtree kernel over a corpus of program graphs in one fit_transform.
+        # Empty graphs have no features, so they score 0 against everything (and 1 against themselves).
         
-        return adjusted_similarity, overall_similarity, structure_penalty
+        non_empty = [i for i, G in enumerate(graphs) if len(G.nodes()) > 0]
+        K = np.eye(len(graphs))
+        if len(non_empty) > 0:
+            kernel = WeisfeilerLehman(n_iter=n_iter, normalize=True)
+            K_non_empty = kernel.fit_transform([self.to_grakel_graph(graphs[i]) for i in non_empty])
+            K[np.ix_(non_empty, non_empty)] = K_non_empty
+        return K
+    
+    def compute_wl_similarity(self, G_gt, G_gen_list, n_iter=3):
+        # WL kernel similarity of each generated graph to the ground truth
+        with track(self.metrics, 'compute_wl_kernel_matrix', 'graph', graphs=len(G_gen_list) + 1):
+            K = self.compute_wl_kernel_matrix([G_gt] + list(G_gen_list), n_iter)
+        return K[0, 1:]
     
     
     def calculate_graph_similarity(self, G_gt, G_gen_list, output_file, gen_names=None, config=None):
@@ -196,9 +247,13 @@ class GraphAnalyzer:
                 gen_names = [f"generated_{i+1}" for i in range(len(G_gen_list))]
                 
             # Get experiment version from config
-            experiment_version = "Unknown"
-            if config and 'experiment' in config and 'version' in config['experiment']:
-                experiment_version = config['experiment']['version']
+            experiment_version = self._experiment_version(config)
+            
+            # The ground truth side is the same for every generated graph, so prepare it once
+            prepared_gt = self.prepare_graph(G_gt)
+            
+            # Fast structural metric for all generated graphs at once
+            wl_similarities = self.compute_wl_similarity(G_gt, G_gen_list)
             
             # Process each generated graph against the ground truth
             all_metrics = []
@@ -210,33 +265,19 @@ class GraphAnalyzer:
                 # Add experiment version
                 metrics['experiment'] = experiment_version
                 
+                # Weisfeiler-Lehman kernel similarity
+                metrics['wl_similarity'] = round(float(wl_similarities[i]), 5)
                 
                 # Structure-aware semantic adjacency similarity
-                adj_sim = self.compute_semantic_adjacency_similarity(G_gt, G_gen)
+                with track(self.metrics, 'compute_semantic_adjacency_similarity', 'graph', candidate=gen_names[i]):
+                    adj_sim = compare_prepared_graphs(prepared_gt, self.prepare_graph(G_gen))
                 metrics['adjacency_similarity'] = round(adj_sim[0], 5)
                 
                 all_metrics.append(metrics)
             
-            # Create results directory if it doesn't exist
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            
             # Define the fieldnames in the desired order (experiment first)
-            fieldnames = ['experiment', 'adjacency_similarity']
-            
-            # Check if file exists
-            file_exists = os.path.isfile(output_file)
-            
-            # Write or append metrics to CSV
-            with open(output_file, mode='a' if file_exists else 'w', newline='') as f:
-                if not file_exists:
-                    print(f"Creating new metrics file: {output_file}")
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                else:
-                    print(f"Appending metrics to {output_file}")
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                
-                writer.writerows(all_metrics)
+            fieldnames = ['experiment', 'wl_similarity', 'adjacency_similarity']
+            self._write_metrics(output_file, all_metrics, fieldnames)
                 
             return all_metrics  # Return metrics dictionary for potential further use
             
@@ -246,4 +287,100 @@ class GraphAnalyzer:
             traceback.print_exc()
             return None
     
-    
\ No newline at end of file
+    def calculate_graph_similarity_batch(self, G_gt, G_gen_list, output_file, gen_names=None, config=None, n_jobs=None):
+        # Compare many generated graphs (models x versions x seeds) against one ground truth.
+        # The ground truth is prepared once, all candidate node texts are embedded in one batch,
+        # the per-candidate optimal transport runs across n_jobs processes, and all rows are
+        # written in a single CSV (or .parquet) write.
+        
+        if gen_names is not None and len(gen_names) != len(G_gen_list):
+            raise ValueError("Length of gen_names must match length of G_gen_list")
+        if gen_names is None:
+            gen_names = [f"generated_{i+1}" for i in range(len(G_gen_list))]
+        experiment_version = self._experiment_version(config)
+        
+        with track(self.metrics, 'prepare_ground_truth', 'graph'):
+            prepared_gt = self.prepare_graph(G_gt)
+        
+        with track(self.metrics, 'embed_candidates', 'graph', candidates=len(G_gen_list)):
+            texts = [self.node_text(G, node) for G in G_gen_list for node in G.nodes()]
+            text_embeddings = self.encode_texts(texts)
+            prepared_gen = [self.prepare_graph(G, text_embeddings) for G in G_gen_list]
+        
+        with track(self.metrics, 'compare_candidates', 'graph', candidates=len(G_gen_list), n_jobs=n_jobs or 1):
+            if n_jobs is not None and n_jobs > 1 and len(prepared_gen) > 1:
+                with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                    results = list(executor.map(compare_prepared_graphs, [prepared_gt] * len(prepared_gen), prepared_gen))
+            else:
+                results = [compare_prepared_graphs(prepared_gt, prepared) for prepared in prepared_gen]
+        
+        wl_similarities = self.compute_wl_similarity(G_gt, G_gen_list)
+        
+        all_metrics = [{
+            'experiment': experiment_version,
+            'candidate': name,
+            'wl_similarity': round(float(wl), 5),
+            'adjacency_similarity': round(float(adjusted), 5),
+            'overall_similarity': round(float(overall), 5),
+            'structure_penalty': round(float(penalty), 5),
+        } for name, wl, (adjusted, overall, penalty) in zip(gen_names, wl_similarities, results)]
+        
+        fieldnames = ['experiment', 'candidate', 'wl_similarity', 'adjacency_similarity', 'overall_similarity', 'structure_penalty']
+        self._write_metrics(output_file, all_metrics, fieldnames)
+        return all_metrics
+    
+    @staticmethod
+    def _experiment_version(config):
+        # Get experiment version from config
+        if config and 'experiment' in config and 'version' in config['experiment']:
+            return config['experiment']['version']
+        return "Unknown"
+    
+    @staticmethod
+    def _write_metrics(output_file, rows, fieldnames):
+        # Append metric rows to a CSV (or Parquet) file in one write, creating it if needed
+        
+        # Create results directory if it doesn't exist
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        
+        # Check if file exists
+        file_exists = os.path.isfile(output_file)
+        
+        if output_file.endswith('.parquet'):
+            import pandas as pd
+            frame = pd.DataFrame(rows, columns=fieldnames)
+            if file_exists:
+                print(f"Appending metrics to {output_file}")
+                frame = pd.concat([pd.read_parquet(output_file), frame], ignore_index=True)
+            else:
+                print(f"Creating new metrics file: {output_file}")
+            frame.to_parquet(output_file, index=False)
+            return
+        
+        if file_exists:
+            # Keep the existing column order; rewrite the file once if new columns are added
+            with open(output_file, newline='') as f:
+                reader = csv.DictReader(f)
+                existing_rows = list(reader)
+                header = list(reader.fieldnames or [])
+            if not header:
+                file_exists = False
+            else:
+                new_columns = [name for name in fieldnames if name not in header]
+                fieldnames = header + new_columns
+                if new_columns:
+                    with open(output_file, 'w', newline='') as f:
+                        writer = csv.DictWriter(f, fieldnames=fieldnames, restval='')
+                        writer.writeheader()
+                        writer.writerows(existing_rows)
+        
+        # Write or append metrics to CSV
+        with open(output_file, mode='a' if file_exists else 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval='')
+            if not file_exists:
+                print(f"Creating new metrics file: {output_file}")
+                writer.writeheader()
+            else:
+                print(f"Appending metrics to {output_file}")
+            
+            writer.writerows(rows)
@@ -1,7 +1,117 @@
 import re
+import html
+import json
+import hashlib
+from collections import OrderedDict
 import networkx as nx
 import matplotlib.pyplot as plt
 
+# Layouts keyed by (graph hash, layout type), shared by all calls in a session; least
+# recently used layouts are dropped beyond _LAYOUT_CACHE_SIZE
+_LAYOUT_CACHE = OrderedDict()
+_LAYOUT_CACHE_SIZE = 32
+
+# Edge colours shared by the matplotlib figure and the exporters
+EDGE_COLOURS = {'regular': '#808080', 'negated': '#ff0000', 'choice': '#008000', 'and': '#800080'}
+
+# Self-contained viewer for export_html: canvas rendering with pan, zoom, hover and search, no external scripts
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+  body { margin: 0; font-family: sans-serif; overflow: hidden; }
+  #bar { position: absolute; top: 8px; left: 8px; background: rgba(255,255,255,0.9); padding: 6px; border: 1px solid #ccc; }
+  #info { position: absolute; bottom: 8px; left: 8px; background: rgba(255,255,255,0.9); padding: 4px; font-size: 12px; }
+  canvas { display: block; }
+</style>
+</head>
+<body>
+<div id="bar">
+  <select id="graph"></select>
+  <input id="search" placeholder="Search nodes">
+  <label><input id="labels" type="checkbox"> labels</label>
+</div>
+<div id="info"></div>
+<canvas id="canvas"></canvas>
+<script>
+const GRAPHS = __GRAPHS__;
+const COLOURS = __COLOURS__;
+const canvas = document.getElementById('canvas'), ctx = canvas.getContext('2d');
+const select = document.getElementById('graph'), search = document.getElementById('search');
+const showLabels = document.getElementById('labels'), info = document.getElementById('info');
+let graph, nodes, edges, scale = 1, ox = 0, oy = 0, hover = null, drag = null;
+
+Object.keys(GRAPHS).forEach(name => select.add(new Option(name, name)));
+
+function load(name) {
+  graph = GRAPHS[name];
+  nodes = {};
+  graph.elements.nodes.forEach(n => nodes[n.data.id] = n);
+  edges = graph.elements.edges;
+  fit();
+}
+
+function fit() {
+  canvas.width = window.innerWidth; canvas.height = window.innerHeight;
+  const xs = Object.values(nodes).map(n => n.position.x), ys = Object.values(nodes).map(n => n.position.y);
+  const w = Math.max(...xs) - Math.min(...xs) || 1, h = Math.max(...ys) - Math.min(...ys) || 1;
+  scale = 0.9 * Math.min(canvas.width / w, canvas.height / h);
+  ox = canvas.width / 2 - scale * (Math.min(...xs) + w / 2);
+  oy = canvas.height / 2 - scale * (Math.min(...ys) + h / 2);
+  draw();
+}
+
+const sx = x => x * scale + ox, sy = y => y * scale + oy;
+
+function draw() {
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  const query = search.value.toLowerCase();
+  for (const e of edges) {
+    const a = nodes[e.data.source].position, b = nodes[e.data.target].position;
+    ctx.strokeStyle = COLOURS[e.data.type]; ctx.lineWidth = 1;
+    ctx.beginPath(); ctx.moveTo(sx(a.x), sy(a.y)); ctx.lineTo(sx(b.x), sy(b.y)); ctx.stroke();
+  }
+  for (const n of Object.values(nodes)) {
+    const match = query && n.data.label.toLowerCase().includes(query);
+    ctx.fillStyle = match ? '#ffa500' : (n.data.type === 'choice' ? '#90ee90' : '#add8e6');
+    ctx.beginPath(); ctx.arc(sx(n.position.x), sy(n.position.y), n === hover ? 7 : 5, 0, 2 * Math.PI); ctx.fill();
+    if (showLabels.checked || match || n === hover) {
+      ctx.fillStyle = '#000'; ctx.font = '11px sans-serif';
+      ctx.fillText(n.data.label, sx(n.position.x) + 8, sy(n.position.y) + 4);
+    }
+  }
+  info.textContent = `${Object.keys(nodes).length} nodes, ${edges.length} edges` + (hover ? ` | ${hover.data.label}` : '');
+}
+
+canvas.addEventListener('wheel', ev => {
+  ev.preventDefault();
+  const k = ev.deltaY < 0 ? 1.2 : 1 / 1.2;
+  ox = ev.clientX - k * (ev.clientX - ox); oy = ev.clientY - k * (ev.clientY - oy); scale *= k;
+  draw();
+});
+canvas.addEventListener('mousedown', ev => drag = [ev.clientX - ox, ev.clientY - oy]);
+window.addEventListener('mouseup', () => drag = null);
+canvas.addEventListener('mousemove', ev => {
+  if (drag) { ox = ev.clientX - drag[0]; oy = ev.clientY - drag[1]; draw(); return; }
+  let best = null, bestDist = 100;
+  for (const n of Object.values(nodes)) {
+    const d = (sx(n.position.x) - ev.clientX) ** 2 + (sy(n.position.y) - ev.clientY) ** 2;
+    if (d < bestDist) { best = n; bestDist = d; }
+  }
+  if (best !== hover) { hover = best; draw(); }
+});
+select.addEventListener('change', () => load(select.value));
+search.addEventListener('input', draw);
+showLabels.addEventListener('change', draw);
+window.addEventListener('resize', fit);
+load(select.value);
+</script>
+</body>
+</html>
+"""
+
 class ASPGraphCreator:
     """Class for creating and visualizing ASP program graphs."""
     
@@ -161,17 +271,61 @@ class ASPGraphCreator:
         return G
     
     @staticmethod
-    def visualize_graph(G, layout_type='planar'):
-        # Visualizes the ASP program graph with different layout options:
-        # - planar: Attempts planar layout
-        # - circular: Circular layout
-        # - kamada_kawai: Force-directed layout that tries to minimize edge crossings
-        # - multipartite: Layered layout based on node depths
-        # - spring: Original spring layout (as backup)
+    def graph_hash(G):
+        # Stable hash of nodes, edges and their attributes, used as the layout cache key
+        digest = hashlib.sha256()
+        for node, data in sorted(G.nodes(data=True), key=lambda item: str(item[0])):
+            digest.update(f"N|{node}|{sorted(data.items())}\n".encode('utf-8'))
+        for u, v, data in sorted(G.edges(data=True), key=lambda item: (str(item[0]), str(item[1]))):
+            digest.update(f"E|{u}|{v}|{sorted(data.items())}\n".encode('utf-8'))
+        return digest.hexdigest()
+    
+    @staticmethod
+    def longest_path_layers(G):
+        # Longest-path layering of the dependency edges (body -> head).
+        # AND edges are symmetric and ignored; any remaining cycles (e.g. offered/offer loops)
+        # are condensed so every node in a strongly connected component shares a layer.
+        dependencies = nx.DiGraph()
+        dependencies.add_nodes_from(G.nodes())
+        dependencies.add_edges_from((u, v) for u, v, d in G.edges(data=True)
+                                    if d.get('connection_type') != 'and')
         
-        plt.figure(figsize=(20, 20))
+        condensed = nx.condensation(dependencies)
+        component_depth = {}
+        for component in nx.lexicographical_topological_sort(condensed):
+            preds = [component_depth[p] for p in condensed.predecessors(component)]
+            component_depth[component] = max(preds) + 1 if preds else 0
+        
+        mapping = condensed.graph['mapping']
+        return {node: component_depth[mapping[node]] for node in G.nodes()}
+    
+    @staticmethod
+    def multipartite_positions(G, layers):
+        # One column per layer, nodes sorted by name within a column and centred vertically
+        columns = {}
+        for node, depth in layers.items():
+            columns.setdefault(depth, []).append(node)
+        
+        pos = {}
+        n_columns = max(len(columns) - 1, 1)
+        for depth, nodes in columns.items():
+            nodes.sort(key=str)
+            height = max(len(nodes) - 1, 1)
+            for i, node in enumerate(nodes):
+                x = 2 * depth / n_columns - 1
+                y = 0.0 if len(nodes) == 1 else 1 - 2 * i / height
+                pos[node] = (x, y)
+        return pos
+    
+    @staticmethod
+    def compute_layout(G, layout_type='planar', use_cache=True):
+        # Node positions for a layout type, cached by graph hash so re-rendering the same graph is instant
+        key = (ASPGraphCreator.graph_hash(G), layout_type)
+        if use_cache and key in _LAYOUT_CACHE:
+            _LAYOUT_CACHE.move_to_end(key)
+            # Copy, so callers adjusting positions do not change the cached layout
+            return dict(_LAYOUT_CACHE[key])
         
-        # Choose layout algorithm
         try:
             if layout_type == 'planar':
                 # First check if graph is planar
@@ -185,47 +339,43 @@ class ASPGraphCreator:
             elif layout_type == 'kamada_kawai':
                 pos = nx.kamada_kawai_layout(G)
             elif layout_type == 'multipartite':
-                # Group nodes by their depth in the graph
-                depths = {}
-                for node in G.nodes():
-                    if G.in_degree(node) == 0:  # Root nodes
-                        depths[node] = 0
-                    else:
-                        # Find maximum depth of predecessors + 1
-                        pred_depths = [depths[pred] for pred in G.predecessors(node) if pred in depths]
-                        depths[node] = max(pred_depths) + 1 if pred_depths else 0
-                
-                # Create layers for multipartite layout
-                layers = {}
-                for node, depth in depths.items():
-                    if depth not in layers:
-                        layers[depth] = []
-                    layers[depth].append(node)
-                
-                # Convert to format needed by multipartite_layout
-                subset_sizes = [len(nodes) for depth, nodes in sorted(layers.items())]
-                node_indices = {}
-                idx = 0
-                for depth, nodes in sorted(layers.items()):
-                    for node in nodes:
-                        node_indices[node] = idx
-                        idx += 1
-                
-                pos = nx.multipartite_layout(G, subset_sizes=subset_sizes, 
-                                           node_indices=node_indices)
+                pos = ASPGraphCreator.multipartite_positions(G, ASPGraphCreator.longest_path_layers(G))
             else:
-                pos = nx.spring_layout(G, k=2, iterations=50)
+                pos = nx.spring_layout(G, k=2, iterations=50, seed=42)
                 
         except Exception as e:
             print(f"Layout error: {e}. Falling back to spring layout.")
-            pos = nx.spring_layout(G, k=2, iterations=50)
+            pos = nx.spring_layout(G, k=2, iterations=50, seed=42)
+        
+        pos = {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+        if use_cache:
+            _LAYOUT_CACHE[key] = dict(pos)
+            if len(_LAYOUT_CACHE) > _LAYOUT_CACHE_SIZE:
+                _LAYOUT_CACHE.popitem(last=False)
+        return pos
+    
+    @staticmethod
+    def visualize_graph(G, layout_type='planar', output_path=None, figsize=(20, 20)):
+        # Visualizes the ASP program graph with different layout options:
+        # - planar: Attempts planar layout
+        # - circular: Circular layout
+        # - kamada_kawai: Force-directed layout that tries to minimize edge crossings
+        # - multipartite: Longest-path layering of the rule dependencies
+        # - spring: Original spring layout (as backup)
+        # Layouts are cached per graph. With output_path the figure is saved instead of shown,
+        # which also works without a display.
+        
+        plt.figure(figsize=figsize)
+        
+        # Choose layout algorithm
+        pos = ASPGraphCreator.compute_layout(G, layout_type)
         
         # Separate nodes by type
         regular_nodes = [n for n, d in G.nodes(data=True) if not d.get('node_type') == 'choice']
         choice_nodes = [n for n, d in G.nodes(data=True) if d.get('node_type') == 'choice']
         
-        # Draw regular nodes
-        nx.draw(G, pos, nodelist=regular_nodes, 
+        # Draw regular nodes (nodes only: every edge is drawn below, once, by its type)
+        nx.draw_networkx_nodes(G, pos, nodelist=regular_nodes,
                               node_color='lightblue', node_size=2000)
         
         # Draw choice nodes as diamonds
@@ -233,32 +383,26 @@ class ASPGraphCreator:
             nx.draw_networkx_nodes(G, pos, nodelist=choice_nodes,
                                   node_color='lightgreen', node_shape='d', node_size=1500)
         
-        # Separate edges by type
-        regular_edges = [(u, v) for (u, v, d) in G.edges(data=True) 
-                         if not d.get('negated') 
-                         and not d.get('connection_type')]
-        negated_edges = [(u, v) for (u, v, d) in G.edges(data=True) 
-                         if d.get('negated')]
-        choice_edges = [(u, v) for (u, v, d) in G.edges(data=True) 
-                        if d.get('connection_type') == 'choice']
-        and_edges = [(u, v) for (u, v, d) in G.edges(data=True) 
-                     if d.get('connection_type') == 'and']
+        # Separate edges by type (a negated choice edge is drawn once, as negated)
+        edges_by_type = {edge_type: [] for edge_type in EDGE_COLOURS}
+        for u, v, d in G.edges(data=True):
+            edges_by_type[ASPGraphCreator.edge_type(d)].append((u, v))
         
         # Draw different types of edges
-        nx.draw_networkx_edges(G, pos, edgelist=regular_edges, edge_color='gray',
-                              arrows=True, arrowsize=30, width=3)
-        nx.draw_networkx_edges(G, pos, edgelist=negated_edges, edge_color='red',
-                              arrows=True, arrowsize=30, width=3)
-        nx.draw_networkx_edges(G, pos, edgelist=choice_edges, edge_color='green',
-                              arrows=True, arrowsize=30, width=3, style=(0, (5, 5)))
-        nx.draw_networkx_edges(G, pos, edgelist=and_edges, edge_color='purple',
-                              arrows=False, width=2)
+        edge_styles = {
+            'regular': dict(arrows=True, arrowsize=30, width=3),
+            'negated': dict(arrows=True, arrowsize=30, width=3),
+            'choice': dict(arrows=True, arrowsize=30, width=3, style=(0, (5, 5))),
+            'and': dict(arrows=False, width=2),
+        }
+        for edge_type, edgelist in edges_by_type.items():
+            nx.draw_networkx_edges(G, pos, edgelist=edgelist, edge_color=EDGE_COLOURS[edge_type],
+                                   **edge_styles[edge_type])
         
         # Add edge labels for temporal relationships and AND connections
         edge_labels = {}
-        for u, v, d in G.edges(data=True):
-            if d.get('connection_type') == 'and':
-                edge_labels[(u, v)] = 'AND'
+        for u, v in edges_by_type['and']:
+            edge_labels[(u, v)] = 'AND'
         nx.draw_networkx_edge_labels(G, pos, edge_labels, font_size=8)
         
         # Draw node labels
@@ -275,11 +419,11 @@ class ASPGraphCreator:
         
         # Add legend
         legend_elements = [
-            plt.Line2D([0], [0], color='gray', label='Regular Dependency'),
-            plt.Line2D([0], [0], color='red', label='Negated Dependency'),
-            plt.Line2D([0], [0], color='green', linestyle='--', dashes=(5, 5), 
+            plt.Line2D([0], [0], color=EDGE_COLOURS['regular'], label='Regular Dependency'),
+            plt.Line2D([0], [0], color=EDGE_COLOURS['negated'], label='Negated Dependency'),
+            plt.Line2D([0], [0], color=EDGE_COLOURS['choice'], linestyle='--', dashes=(5, 5), 
                       label='Choice Rule'),
-            plt.Line2D([0], [0], color='purple', label='AND Connection'),
+            plt.Line2D([0], [0], color=EDGE_COLOURS['and'], label='AND Connection'),
             plt.Line2D([0], [0], marker='d', color='lightgreen', label='Choice Node',
                       markersize=10, linestyle='none')
         ]
@@ -288,4 +432,88 @@ class ASPGraphCreator:
         plt.title("ASP Program Graph")
         plt.axis('off')
         plt.tight_layout()
-        plt.show()
\ No newline at end of file
+        if output_path:
+            plt.savefig(output_path, dpi=100, bbox_inches='tight')
+            plt.close()
+            print(f"Graph saved to {output_path}")
+        else:
+            plt.show()
+
+    @staticmethod
+    def edge_type(data):
+        # Edge type used for drawing (visualize_graph), colouring exports and graph similarity;
+        # negation takes precedence over the connection type
+        if data.get('negated'):
+            return 'negated'
+        if data.get('connection_type') in ('choice', 'and'):
+            return data['connection_type']
+        return 'regular'
+    
+    @staticmethod
+    def to_cytoscape(G, layout_type='multipartite', size=1000):
+        # Cytoscape.js JSON elements with precomputed positions (y grows downwards, as in the browser)
+        pos = ASPGraphCreator.compute_layout(G, layout_type)
+        nodes = []
+        for node, data in G.nodes(data=True):
+            x, y = pos[node]
+            node_type = data.get('node_type', 'predicate')
+            label = f"Choice {data['lower_bound']}-{data['upper_bound']}" if node_type == 'choice' else str(node)
+            nodes.append({
+                'data': {'id': str(node), 'label': label, 'type': node_type},
+                'position': {'x': round(x * size, 2), 'y': round(-y * size, 2)},
+            })
+        edges = [{'data': {'id': f"e{i}", 'source': str(u), 'target': str(v), 'type': ASPGraphCreator.edge_type(d)}}
+                 for i, (u, v, d) in enumerate(G.edges(data=True))]
+        return {'elements': {'nodes': nodes, 'edges': edges}}
+    
+    @staticmethod
+    def export_graphml(G, output_path, layout_type='multipartite'):
+        # GraphML with edge types and precomputed x/y node attributes (opens in Gephi, yEd, Cytoscape)
+        pos = ASPGraphCreator.compute_layout(G, layout_type)
+        H = nx.DiGraph()
+        for node, data in G.nodes(data=True):
+            H.add_node(str(node), node_type=data.get('node_type', 'predicate'),
+                       x=float(pos[node][0]), y=float(pos[node][1]),
+                       **{k: v for k, v in data.items() if k != 'node_type'})
+        for u, v, data in G.edges(data=True):
+            H.add_edge(str(u), str(v), edge_type=ASPGraphCreator.edge_type(data),
+                       negated=bool(data.get('negated', False)))
+        nx.write_graphml(H, output_path)
+        print(f"GraphML written to {output_path}")
+    
+    @staticmethod
+    def export_gexf(G, output_path, layout_type='multipartite', size=1000):
+        # GEXF with viz positions and colours, so Gephi opens the graph without running a layout
+        pos = ASPGraphCreator.compute_layout(G, layout_type)
+        H = nx.DiGraph()
+        for node, data in G.nodes(data=True):
+            x, y = pos[node]
+            colour = (144, 238, 144) if data.get('node_type') == 'choice' else (173, 216, 230)
+            H.add_node(str(node), node_type=data.get('node_type', 'predicate'), viz={
+                'position': {'x': float(x * size), 'y': float(y * size), 'z': 0.0},
+                'color': dict(zip('rgb', colour), a=1.0),
+            })
+        for u, v, data in G.edges(data=True):
+            edge_type = ASPGraphCreator.edge_type(data)
+            colour = EDGE_COLOURS[edge_type]
+            H.add_edge(str(u), str(v), edge_type=edge_type, viz={
+                'color': {'r': int(colour[1:3], 16), 'g': int(colour[3:5], 16), 'b': int(colour[5:7], 16), 'a': 1.0},
+            })
+        nx.write_gexf(H, output_path)
+        print(f"GEXF written to {output_path}")
+    
+    @staticmethod
+    def export_html(graphs, output_path, layout_type='multipartite', title="ASP Program Graph"):
+        # Self-contained HTML viewer. graphs is a graph or a dict of name -> graph
+        # (e.g. {'ground truth': G_gt, 'generated': G_gen}), switchable from a dropdown.
+        if isinstance(graphs, nx.Graph):
+            graphs = {title: graphs}
+        data = {name: ASPGraphCreator.to_cytoscape(G, layout_type) for name, G in graphs.items()}
+        
+        page = (_HTML_TEMPLATE
+                .replace('__TITLE__', html.escape(title))
+                .replace('__COLOURS__', json.dumps(EDGE_COLOURS))
+                .replace('__GRAPHS__', json.dumps(data).replace('</', '<\\/')))
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(page)
+        print(f"HTML graph written to {output_path}")
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+from itertools import combinations
+from typing import Dict, Optional, Sequence, Tuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+RATING_LABELS = {
+    0: "0 – No Rule",
+    1: "1 – Correct",
+    2: "2 – Incorrect",
+    3: "3 – Key information missed",
+    4: "4 – Information hallucinated",
+}
+RATING_CATEGORIES = tuple(RATING_LABELS)
+
+# Key of a reviewed rule in ReviewStore.reviews() / ReviewStore.ratings()
+ITEM_COLUMNS = ["guideline_id", "asp_rule_id", "asp_rule_index"]
+
+
+def _category_codes(ratings: Sequence, categories: Sequence[int]) -> np.ndarray:
+    """Map ratings onto 0..K-1; ratings outside the categories raise ValueError."""
+    lookup = {category: code for code, category in enumerate(categories)}
+    try:
+        return np.array([lookup[int(rating)] for rating in ratings], dtype=np.int64)
+    except KeyError as e:
+        raise ValueError(f"Rating {e.args[0]} is not one of {list(categories)}") from None
+
+
+def bootstrap_weights(n_items: int, n_boot: int, seed: Optional[int] = 42) -> np.ndarray:
+    """
+    Resampling weights for all bootstrap replicates at once.
+
+    Row b holds how often each item is drawn in replicate b (a multinomial draw of
+    n_items over n_items equally likely items), so any statistic that is a weighted
+    sum over items becomes one matrix product for every replicate.
+
+    Returns:
+        (n_boot, n_items) integer array
+    """
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(n_items, np.full(n_items, 1.0 / n_items), size=n_boot)
+
+
+def _interval(replicates: np.ndarray, ci: float) -> Tuple[np.ndarray, np.ndarray]:
+    alpha = (1.0 - ci) / 2.0
+    return (np.nanquantile(replicates, alpha, axis=0), np.nanquantile(replicates, 1.0 - alpha, axis=0))
+
+
+def _cohens_kappa_from_confusion(confusion: np.ndarray) -> np.ndarray:
+    # confusion: (..., K, K) joint proportions
+    observed = np.trace(confusion, axis1=-2, axis2=-1)
+    expected = (confusion.sum(axis=-1) * confusion.sum(axis=-2)).sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (observed - expected) / (1.0 - expected)
+
+
+def cohens_kappa(rater_a: Sequence, rater_b: Sequence, categories: Sequence[int] = RATING_CATEGORIES) -> float:
+    """
+    Cohen's kappa between two raters over the same items (NaN when both raters use one category only).
+    """
+    a, b = _category_codes(rater_a, categories), _category_codes(rater_b, categories)
+    k = len(categories)
+    confusion = np.bincount(a * k + b, minlength=k * k).reshape(k, k) / len(a)
+    return float(_cohens_kappa_from_confusion(confusion))
+
+
+def category_counts(ratings: np.ndarray, categories: Sequence[int] = RATING_CATEGORIES) -> np.ndarray:
+    """
+    (items, raters) rating matrix -> (items, K) number of raters choosing each category.
+    """
+    codes = _category_codes(np.asarray(ratings).ravel(), categories).reshape(np.shape(ratings))
+    k = len(categories)
+    offsets = np.arange(codes.shape[0])[:, None] * k
+    return np.bincount((codes + offsets).ravel(), minlength=codes.shape[0] * k).reshape(-1, k)
+
+
+def _fleiss_parts(counts: np.ndarray) -> Tuple[np.ndarray, int]:
+    # Per-item agreement P_i and the number of raters per item
+    raters = int(counts[0].sum())
+    if raters < 2 or np.any(counts.sum(axis=1) != raters):
+        raise ValueError("Fleiss' kappa needs the same number (>= 2) of ratings for every item")
+    per_item = (counts * (counts - 1)).sum(axis=1) / (raters * (raters - 1))
+    return per_item, raters
+
+
+def fleiss_kappa(counts: np.ndarray) -> float:
+    """
+    Fleiss' kappa from an (items, K) table of category counts (see category_counts).
+    """
+    counts = np.asarray(counts)
+    per_item, raters = _fleiss_parts(counts)
+    proportions = counts.sum(axis=0) / (len(counts) * raters)
+    expected = (proportions ** 2).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float((per_item.mean() - expected) / (1.0 - expected))
+
+
+def bootstrap_cohens_kappa(rater_a: Sequence, rater_b: Sequence, n_boot: int = 10000, ci: float = 0.95,
+                           seed: Optional[int] = 42,
+                           categories: Sequence[int] = RATING_CATEGORIES) -> Dict[str, float]:
+    """
+    Cohen's kappa with a percentile bootstrap interval over items.
+
+    Returns:
+        Dict with kappa, ci_low and ci_high
+    """
+    a, b = _category_codes(rater_a, categories), _category_codes(rater_b, categories)
+    k = len(categories)
+    # One-hot of each item's (a, b) cell, so every replicate's confusion matrix is weights @ cells
+    cells = np.zeros((len(a), k * k))
+    cells[np.arange(len(a)), a * k + b] = 1.0
+    weights = bootstrap_weights(len(a), n_boot, seed)
+    confusion = (weights @ cells / len(a)).reshape(n_boot, k, k)
+    low, high = _interval(_cohens_kappa_from_confusion(confusion), ci)
+    return {'kappa': cohens_kappa(rater_a, rater_b, categories), 'ci_low': float(low), 'ci_high': float(high)}
+
+
+def bootstrap_fleiss_kappa(counts: np.ndarray, n_boot: int = 10000, ci: float = 0.95,
+                           seed: Optional[int] = 42) -> Dict[str, float]:
+    """
+    Fleiss' kappa with a percentile bootstrap interval over items.
+
+    Returns:
+        Dict with kappa, ci_low and ci_high
+    """
+    counts = np.asarray(counts, dtype=float)
+    per_item, raters = _fleiss_parts(counts)
+    n_items = len(counts)
+    weights = bootstrap_weights(n_items, n_boot, seed)
+    observed = weights @ per_item / n_items
+    proportions = weights @ counts / (n_items * raters)
+    expected = (proportions ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        replicates = (observed - expected) / (1.0 - expected)
+    low, high = _interval(replicates, ci)
+    return {'kappa': fleiss_kappa(counts), 'ci_low': float(low), 'ci_high': float(high)}
+
+
+def rating_distributions(reviews: pd.DataFrame, by: Sequence[str] = ('experiment',), n_boot: int = 10000,
+                         ci: float = 0.95, seed: Optional[int] = 42,
+                         categories: Sequence[int] = RATING_CATEGORIES) -> pd.DataFrame:
+    """
+    Share of each rating per group with bootstrap confidence intervals.
+
+    Args:
+        reviews: Long-format reviews with a rating column, e.g. ReviewStore.reviews()
+        by: Grouping columns, e.g. ('experiment',) to pool reviewers or ('experiment', 'reviewer')
+        n_boot: Bootstrap replicates per group
+        ci: Confidence level of the percentile interval
+        seed: Random seed (None for a fresh seed)
+        categories: Rating values
+
+    Returns:
+        One row per group and rating with n, count, proportion, ci_low and ci_high
+    """
+    by = list(by)
+    rated = reviews[reviews['rating'].notna()]
+    rows = []
+    for key, group in rated.groupby(by, sort=True):
+        key = key if isinstance(key, tuple) else (key,)
+        codes = _category_codes(group['rating'], categories)
+        onehot = np.eye(len(categories))[codes]
+        # All replicates in one product: (n_boot, n) @ (n, K)
+        replicates = bootstrap_weights(len(codes), n_boot, seed) @ onehot / len(codes)
+        low, high = _interval(replicates, ci)
+        counts = onehot.sum(axis=0)
+        for i, category in enumerate(categories):
+            rows.append(dict(zip(by, key), rating=category, n=len(codes), count=int(counts[i]),
+                             proportion=counts[i] / len(codes), ci_low=low[i], ci_high=high[i]))
+    return pd.DataFrame(rows, columns=by + ['rating', 'n', 'count', 'proportion', 'ci_low', 'ci_high'])
+
+
+def agreement_table(reviews: pd.DataFrame, n_boot: int = 10000, ci: float = 0.95, seed: Optional[int] = 42,
+                    categories: Sequence[int] = RATING_CATEGORIES) -> pd.DataFrame:
+    """
+    Inter-rater agreement per experiment: Cohen's kappa for every reviewer pair and
+    Fleiss' kappa over all reviewers, each on the items rated by everyone involved.
+
+    Args:
+        reviews: Long-format reviews (experiment, reviewer, guideline_id, asp_rule_id, asp_rule_index, rating)
+
+    Returns:
+        One row per experiment and statistic with raters, items, kappa, ci_low and ci_high
+    """
+    rated = reviews[reviews['rating'].notna()]
+    rows = []
+    for experiment, group in rated.groupby('experiment', sort=True):
+        wide = group.pivot_table(index=ITEM_COLUMNS, columns='reviewer', values='rating', aggfunc='last')
+        reviewers = list(wide.columns)
+        for first, second in combinations(reviewers, 2):
+            pair = wide[[first, second]].dropna()
+            if pair.empty:
+                continue
+            result = bootstrap_cohens_kappa(pair[first], pair[second], n_boot, ci, seed, categories)
+            rows.append(dict(experiment=experiment, statistic='cohen', raters=f"{first}/{second}",
+                             items=len(pair), **result))
+        if len(reviewers) > 2:
+            complete = wide.dropna()
+            if not complete.empty:
+                counts = category_counts(complete.to_numpy(), categories)
+                result = bootstrap_fleiss_kappa(counts, n_boot, ci, seed)
+                rows.append(dict(experiment=experiment, statistic='fleiss', raters='/'.join(reviewers),
+                                 items=len(complete), **result))
+    return pd.DataFrame(rows, columns=['experiment', 'statistic', 'raters', 'items', 'kappa', 'ci_low', 'ci_high'])
+
+
+def plot_rating_distributions(distributions: pd.DataFrame, output_path: Optional[str] = None,
+                              labels: Optional[Dict[str, str]] = None, figsize=(14, 7)):
+    """
+    Grouped bar chart of rating shares per experiment with bootstrap error bars.
+
+    Args:
+        distributions: Output of rating_distributions(by=('experiment',))
+        output_path: Save the figure here (e.g. reviews/rating_comparison_with_uncertainty.png)
+        labels: Optional experiment -> legend label, e.g. {'rulegen': 'D2K'}
+
+    Returns:
+        The matplotlib figure
+    """
+    labels = labels or {}
+    experiments = list(dict.fromkeys(distributions['experiment']))
+    categories = sorted(distributions['rating'].unique())
+    x = np.arange(len(categories))
+    width = 0.8 / max(len(experiments), 1)
+
+    fig, ax = plt.subplots(figsize=figsize)
+    for i, experiment in enumerate(experiments):
+        rows = distributions[distributions['experiment'] == experiment].set_index('rating').reindex(categories)
+        share = rows['proportion'].to_numpy() * 100
+        errors = np.vstack([share - rows['ci_low'].to_numpy() * 100, rows['ci_high'].to_numpy() * 100 - share])
+        ax.bar(x + i * width, share, width, yerr=errors, capsize=4,
+               label=f"{labels.get(experiment, experiment)} (n={int(rows['n'].iloc[0])})")
+
+    ax.set_xlabel('Rating Category', fontsize=13, fontweight='bold')
+    ax.set_ylabel('Percentage of Rules', fontsize=13, fontweight='bold')
+    ax.set_title('ASP Translation Quality Comparison - Bootstrap Confidence Intervals',
+                 fontsize=15, fontweight='bold', pad=20)
+    ax.set_xticks(x + width * (len(experiments) - 1) / 2)
+    ax.set_xticklabels([RATING_LABELS.get(category, str(category)) for category in categories])
+    ax.set_ylim(0, 100)
+    ax.legend(loc='upper right', fontsize=11)
+    ax.grid(axis='y', alpha=0.3, linestyle='--')
+    ax.set_axisbelow(True)
+    fig.tight_layout()
+
+    if output_path:
+        fig.savefig(output_path, dpi=300, bbox_inches='tight')
+        print(f"Saved comparison chart: {output_path}")
+    return fig
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List
+import bisect
+import hashlib
+import html
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from src.processing.ASPRuleParser import ASPRuleParser
+from src.processing.GuidelineIndex import GuidelineIndex
 from src.processing.RuleProcessor import RuleProcessor
-from src.processing.FileManager import FileManager
+
+# Parsed rule maps keyed by the SHA-256 of the response file
+_RULE_MAP_CACHE: Dict[str, Dict[str, str]] = {}
+# Review datasets keyed by (guideline hash, response hash), so switching files back is instant
+_DATASET_CACHE: Dict[Tuple[str, str], "ReviewDataset"] = {}
+_CACHE_LOCK = threading.Lock()
 
 
 @dataclass
@@ -16,6 +28,18 @@ class RuleComparison:
     asp_rules: List[Dict[str, str]]
 
 
+@dataclass
+class ReviewItem:
+    """One row of the reviewer: a guideline clause and one of its ASP rules (or none)."""
+
+    guideline_id: str
+    guideline_text: str
+    asp_rule_id: Optional[str]
+    asp_rule_text: Optional[str]
+    asp_rule_index: int
+    total_asp_rules: int
+
+
 def _guideline_sort_key(rule_id: str) -> List[int]:
     """Convert dotted guideline IDs (e.g., 1.2.3) into sortable integer tuples."""
     parts = []
@@ -29,29 +53,35 @@ def _guideline_sort_key(rule_id: str) -> List[int]:
     return parts
 
 
-def build_rule_review_dataset(guideline_path: str, lp_file_path: str) -> List[RuleComparison]:
-    """
-    Build a dataset that pairs each guideline clause with its ASP rule(s), if any.
+def _file_digest(path: str) -> Tuple[str, bytes]:
+    with open(path, "rb") as f:
+        data = f.read()
+    return hashlib.sha256(data).hexdigest(), data
 
-    Args:
-        guideline_path: Path to the guideline text file.
-        lp_file_path: Path to the fired-rule .lp file (e.g., rulegen_response_fired.lp).
 
-    Returns:
-        Ordered list of RuleComparison instances, covering every guideline clause found.
+def load_rule_map(lp_file_path: str) -> Dict[str, str]:
     """
+    Rule ID -> rule text of a response file, parsed only the first time its content is seen.
 
-    processor = RuleProcessor(guideline_path)
-    file_manager = FileManager()
-    lp_content = file_manager.load_file(lp_file_path)
+    Args:
+        lp_file_path: Fired-rule .lp file or an LLM text output (in_context_response.txt, ...).
+    """
+    digest, data = _file_digest(lp_file_path)
+    with _CACHE_LOCK:
+        if digest not in _RULE_MAP_CACHE:
+            content = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+            # The map parsers do not need the guideline, so skip parsing it
+            processor = RuleProcessor(None)
+            # Choose parser based on file type / content
+            if lp_file_path.endswith(".lp"):
+                _RULE_MAP_CACHE[digest] = processor._build_rule_map_from_lp(content)
+            else:
+                # LLM text outputs like in_context_response.txt / zero_shot_response.txt
+                _RULE_MAP_CACHE[digest] = processor._build_rule_map_from_llm_txt(content)
+        return _RULE_MAP_CACHE[digest]
 
-    # Choose parser based on file type / content
-    if lp_file_path.endswith(".lp"):
-        rule_map = processor._build_rule_map_from_lp(lp_content)
-    else:
-        # LLM text outputs like in_context_response.txt / zero_shot_response.txt
-        rule_map = processor._build_rule_map_from_llm_txt(lp_content)
 
+def _group_rules(rule_map: Dict[str, str]) -> Dict[str, List[Dict[str, str]]]:
     # Group ASP rules by their base guideline ID (strip suffixes like _B).
     asp_groups: Dict[str, List[Dict[str, str]]] = {}
     for rule_id, rule_text in rule_map.items():
@@ -59,22 +89,208 @@ def build_rule_review_dataset(guideline_path: str, lp_file_path: str) -> List[Ru
         asp_groups.setdefault(base_id, []).append(
             {"rule_id": rule_id, "rule_text": rule_text}
         )
+    return asp_groups
+
+
+def _format_html_text(text: str) -> str:
+    escaped = html.escape(text)
+    return escaped.replace("\n", "<br>")
+
+
+def render_item_html(item: ReviewItem, asp_parser: ASPRuleParser) -> str:
+    """
+    HTML fragment shown by the reviewer for one item: the guideline clause, the ASP rule
+    being reviewed and its natural language explanation.
+    """
+    guideline_html = f"<h3>Guideline {item.guideline_id}</h3><p>{_format_html_text(item.guideline_text)}</p>"
+
+    if item.asp_rule_id is not None and item.asp_rule_text:
+        # Show which rule we're reviewing if there are multiple
+        rule_counter = ""
+        if item.total_asp_rules > 1:
+            rule_counter = f" (Rule {item.asp_rule_index + 1} of {item.total_asp_rules})"
+
+        rule_id_escaped = html.escape(str(item.asp_rule_id))
+        rule_text_escaped = _format_html_text(str(item.asp_rule_text))
+
+        # Generate natural language explanation
+        try:
+            nl_explanation = asp_parser.explain_rule(str(item.asp_rule_text), str(item.asp_rule_id))
+            nl_explanation_escaped = _format_html_text(nl_explanation)
+            nl_section = f"<div style='margin-top:12px; padding:12px; background-color:#e8f4f8; border-left: 4px solid #2196F3;'><strong>Natural Language:</strong><br>{nl_explanation_escaped}</div>"
+        except Exception as e:
+            nl_section = f"<div style='margin-top:12px; padding:8px; background-color:#ffebee; border-left: 4px solid #f44336;'><em>Error parsing rule: {html.escape(str(e))}</em></div>"
+
+        asp_html = f"""
+        <h4>ASP Translation{rule_counter}</h4>
+        <div style='margin:10px 0;'>
+            <code>{rule_id_escaped}</code><br>
+            <div style='margin-top:8px; font-family:monospace; padding:8px; background-color:#f5f5f5;'>
+                {rule_text_escaped}
+            </div>
+            {nl_section}
+        </div>
+        """
+    else:
+        asp_html = "<p><strong>No translation found.</strong></p>"
+
+    return guideline_html + asp_html
+
+
+class ReviewDataset:
+    """
+    Paged, lazily built view over the review items of one guideline and response file.
+
+    Items are created on access from the cached guideline index and rule map; their HTML
+    fragments are rendered once per item, a page at a time, with the next page rendered
+    in the background while the current one is reviewed.
+    """
+
+    def __init__(self, guideline_path: str, lp_file_path: str, page_size: int = 50,
+                 asp_parser: Optional[ASPRuleParser] = None):
+        """
+        Args:
+            guideline_path: Path to the guideline text file.
+            lp_file_path: Path to the fired-rule .lp file or an LLM text output.
+            page_size: Items per page for page() and HTML pre-rendering.
+            asp_parser: Parser used for the natural language explanations.
+        """
+        self.guideline_path = str(guideline_path)
+        self.lp_file_path = str(lp_file_path)
+        self.page_size = page_size
+        self.asp_parser = asp_parser or ASPRuleParser()
+
+        self.index = GuidelineIndex.from_file(self.guideline_path)
+        self.asp_groups = _group_rules(load_rule_map(self.lp_file_path))
 
-    dataset: List[RuleComparison] = []
-    for guideline_id in sorted(processor.guideline_text.keys(), key=_guideline_sort_key):
         # Skip rules with only one decimal (e.g., 1.1, 1.2, 1.3)
-        # Count the number of dots to determine depth
-        if guideline_id.count('.') <= 1:
-            continue
-            
-        dataset.append(
+        self.guideline_ids = [
+            guideline_id for guideline_id in sorted(self.index.clauses, key=_guideline_sort_key)
+            if guideline_id.count('.') > 1
+        ]
+        # Index of the first item of each guideline: one item per ASP rule, or one for no rule
+        self._starts: List[int] = []
+        total = 0
+        for guideline_id in self.guideline_ids:
+            self._starts.append(total)
+            total += max(1, len(self.asp_groups.get(guideline_id, [])))
+        self._length = total
+
+        self._html: Dict[int, str] = {}
+        self._html_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+
+    @classmethod
+    def open(cls, guideline_path: str, lp_file_path: str, page_size: int = 50) -> "ReviewDataset":
+        """
+        Return the dataset for a guideline/response pair, building it only the first time
+        this pair of file contents is seen.
+        """
+        key = (_file_digest(str(guideline_path))[0], _file_digest(str(lp_file_path))[0])
+        with _CACHE_LOCK:
+            dataset = _DATASET_CACHE.get(key)
+        if dataset is None or dataset.page_size != page_size:
+            dataset = cls(guideline_path, lp_file_path, page_size=page_size)
+            with _CACHE_LOCK:
+                _DATASET_CACHE[key] = dataset
+        return dataset
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, position: int) -> ReviewItem:
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError(position)
+        group = bisect.bisect_right(self._starts, position) - 1
+        guideline_id = self.guideline_ids[group]
+        guideline_text = self.index[guideline_id]
+        asp_rules = self.asp_groups.get(guideline_id, [])
+        if not asp_rules:
+            # No translation - still show the guideline
+            return ReviewItem(guideline_id, guideline_text, None, None, 0, 0)
+        rule_index = position - self._starts[group]
+        rule = asp_rules[rule_index]
+        return ReviewItem(guideline_id, guideline_text, rule["rule_id"], rule["rule_text"],
+                          rule_index, len(asp_rules))
+
+    def __iter__(self) -> Iterator[ReviewItem]:
+        for position in range(self._length):
+            yield self[position]
+
+    @property
+    def num_pages(self) -> int:
+        return (self._length + self.page_size - 1) // self.page_size
+
+    @property
+    def translations_count(self) -> int:
+        return sum(len(self.asp_groups.get(guideline_id, [])) for guideline_id in self.guideline_ids)
+
+    def page(self, page_number: int) -> List[ReviewItem]:
+        """
+        Items of one page (0-based).
+        """
+        start = page_number * self.page_size
+        return [self[position] for position in range(start, min(start + self.page_size, self._length))]
+
+    def records(self) -> Iterator[Dict[str, object]]:
+        """
+        Items as dicts with the reviewer's column names, e.g. for pd.DataFrame(dataset.records()).
+        """
+        for item in self:
+            yield asdict(item)
+
+    def html(self, position: int) -> str:
+        """
+        Rendered HTML fragment of an item. Renders the item's page on first access and
+        starts rendering the following page in the background.
+        """
+        with self._html_lock:
+            fragment = self._html.get(position)
+        if fragment is None:
+            page_number = position // self.page_size
+            self.render_page(page_number)
+            with self._html_lock:
+                fragment = self._html[position]
+            if page_number + 1 < self.num_pages:
+                self._prefetcher.submit(self.render_page, page_number + 1)
+        return fragment
+
+    def render_page(self, page_number: int) -> None:
+        """
+        Render and cache the HTML fragments of every item on a page.
+        """
+        start = page_number * self.page_size
+        for offset, item in enumerate(self.page(page_number)):
+            position = start + offset
+            with self._html_lock:
+                if position in self._html:
+                    continue
+            fragment = render_item_html(item, self.asp_parser)
+            with self._html_lock:
+                self._html[position] = fragment
+
+    def to_comparisons(self) -> List[RuleComparison]:
+        return [
             RuleComparison(
                 guideline_id=guideline_id,
-                guideline_text=processor.guideline_text[guideline_id],
-                asp_rules=asp_groups.get(guideline_id, []),
+                guideline_text=self.index[guideline_id],
+                asp_rules=self.asp_groups.get(guideline_id, []),
             )
-        )
+            for guideline_id in self.guideline_ids
+        ]
 
-    return dataset
 
+def build_rule_review_dataset(guideline_path: str, lp_file_path: str) -> List[RuleComparison]:
+    """
+    Build a dataset that pairs each guideline clause with its ASP rule(s), if any.
 
+    Args:
+        guideline_path: Path to the guideline text file.
+        lp_file_path: Path to the fired-rule .lp file (e.g., rulegen_response_fired.lp).
+
+    Returns:
+        Ordered list of RuleComparison instances, covering every guideline clause found.
+    """
+    return ReviewDataset.open(guideline_path, lp_file_path).to_comparisons()
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import pandas as pd
+
+# Column order of the reviewer CSV files (rule_review_<experiment>_<reviewer>.csv)
+CSV_COLUMNS = ["guideline_id", "guideline_text", "asp_rule_id", "asp_rule_text",
+               "asp_rule_index", "total_asp_rules", "rating", "comment"]
+
+# rule_review_in_context_lung_Ash.csv -> experiment "in_context_lung", reviewer "Ash"
+CSV_NAME_PATTERN = re.compile(r"^rule_review_(?P<experiment>.+)_(?P<reviewer>[^_]+)\.csv$")
+
+
+class ReviewStore:
+    """SQLite store of reviewer ratings, shared by concurrent reviewers and queried in SQL."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reviews (
+        experiment TEXT NOT NULL,
+        reviewer TEXT NOT NULL,
+        guideline_id TEXT NOT NULL,
+        asp_rule_id TEXT NOT NULL DEFAULT '',
+        guideline_text TEXT,
+        asp_rule_text TEXT,
+        asp_rule_index INTEGER NOT NULL DEFAULT 0,
+        total_asp_rules INTEGER,
+        rating INTEGER,
+        comment TEXT NOT NULL DEFAULT '',
+        updated_at TEXT NOT NULL,
+        -- asp_rule_index is part of the key: older responses reused rule IDs within a clause
+        PRIMARY KEY (experiment, reviewer, guideline_id, asp_rule_id, asp_rule_index)
+    );
+    CREATE INDEX IF NOT EXISTS idx_reviews_rule ON reviews(experiment, guideline_id, asp_rule_id, reviewer);
+    CREATE INDEX IF NOT EXISTS idx_reviews_reviewer ON reviews(reviewer, experiment);
+    """
+
+    UPSERT = f"""
+    INSERT INTO reviews ({', '.join(CSV_COLUMNS)}, experiment, reviewer, updated_at)
+    VALUES ({', '.join('?' * (len(CSV_COLUMNS) + 3))})
+    ON CONFLICT (experiment, reviewer, guideline_id, asp_rule_id, asp_rule_index) DO UPDATE SET
+        guideline_text = COALESCE(excluded.guideline_text, guideline_text),
+        asp_rule_text = COALESCE(excluded.asp_rule_text, asp_rule_text),
+        total_asp_rules = COALESCE(excluded.total_asp_rules, total_asp_rules),
+        rating = excluded.rating,
+        comment = excluded.comment,
+        updated_at = excluded.updated_at
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        """
+        Args:
+            db_path: SQLite database file, created on first use (e.g. <output_dir>/reviews/reviews.sqlite)
+            timeout: Seconds to wait for another reviewer's write to finish
+        """
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, timeout=timeout, check_same_thread=False)
+        # WAL lets reviewers keep reading while another one saves a rating
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    @staticmethod
+    def _row_values(row: Mapping[str, object], experiment: str, reviewer: str, updated_at: str) -> list:
+        values = []
+        for column in CSV_COLUMNS:
+            value = row.get(column)
+            if value is not None and pd.isna(value):
+                value = None
+            if column == "asp_rule_id":
+                value = "" if value is None else str(value)
+            elif column == "asp_rule_index" and value is None:
+                value = 0
+            elif column == "guideline_id":
+                value = str(value)
+            elif column == "comment":
+                value = "" if value is None or str(value).strip().lower() == "nan" else str(value)
+            elif column in ("rating", "asp_rule_index", "total_asp_rules") and value is not None:
+                try:
+                    value = int(float(value))
+                except (TypeError, ValueError):
+                    value = None
+            values.append(value)
+        return values + [experiment, reviewer, updated_at]
+
+    def upsert(self, experiment: str, reviewer: str, guideline_id: str, asp_rule_id: Optional[str] = None,
+               rating: Optional[int] = None, comment: str = "", asp_rule_index: int = 0, **fields) -> None:
+        """
+        Insert or update a single review, e.g. from the reviewer's widget callbacks.
+
+        Args:
+            experiment: Review name, e.g. 'rulegen' or 'in_context_lung'
+            reviewer: Reviewer name
+            guideline_id: Guideline clause ID
+            asp_rule_id: Rule ID being rated (None or '' when the clause has no translation)
+            rating: Rating 0-4, or None to clear it
+            comment: Free-text comment
+            asp_rule_index: Position of the rule within its clause
+            **fields: Other CSV columns (guideline_text, asp_rule_text, ...) to store with the review
+        """
+        row = dict(fields, guideline_id=guideline_id, asp_rule_id=asp_rule_id, asp_rule_index=asp_rule_index,
+                   rating=rating, comment=comment)
+        self.upsert_many(experiment, reviewer, [row])
+
+    def upsert_many(self, experiment: str, reviewer: str, rows: Iterable[Mapping[str, object]]) -> int:
+        """
+        Insert or update reviews with the reviewer CSV columns in one transaction.
+
+        Returns:
+            Number of rows written
+        """
+        updated_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        values = [self._row_values(row, experiment, reviewer, updated_at) for row in rows]
+        with self._lock, self.conn:
+            self.conn.executemany(self.UPSERT, values)
+        return len(values)
+
+    def reviews(self, experiment: Optional[str] = None, reviewer: Optional[str] = None) -> pd.DataFrame:
+        """
+        Reviews in the reviewer CSV format plus experiment, reviewer and updated_at columns.
+        """
+        conditions, params = [], []
+        if experiment is not None:
+            conditions.append("experiment = ?")
+            params.append(experiment)
+        if reviewer is not None:
+            conditions.append("reviewer = ?")
+            params.append(reviewer)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.query(
+            f"SELECT experiment, reviewer, {', '.join(CSV_COLUMNS)}, updated_at FROM reviews {where} "
+            "ORDER BY experiment, reviewer, rowid",
+            tuple(params),
+        )
+
+    def ratings(self, experiment: Optional[str] = None) -> pd.DataFrame:
+        """
+        One row per reviewed rule (experiment, guideline_id, asp_rule_id, asp_rule_index)
+        and one rating column per reviewer.
+        """
+        frame = self.reviews(experiment)
+        frame = frame[frame["rating"].notna()]
+        if frame.empty:
+            return pd.DataFrame(columns=["experiment", "guideline_id", "asp_rule_id", "asp_rule_index"])
+        wide = frame.pivot_table(index=["experiment", "guideline_id", "asp_rule_id", "asp_rule_index"], columns="reviewer",
+                                 values="rating", aggfunc="last").reset_index()
+        wide.columns.name = None
+        return wide
+
+    def rating_counts(self) -> pd.DataFrame:
+        """
+        Number of rules per experiment, reviewer and rating.
+        """
+        return self.query(
+            "SELECT experiment, reviewer, rating, COUNT(*) AS count FROM reviews "
+            "WHERE rating IS NOT NULL GROUP BY experiment, reviewer, rating ORDER BY experiment, reviewer, rating"
+        )
+
+    def query(self, sql: str, params: Tuple = ()) -> pd.DataFrame:
+        """
+        Run an arbitrary SQL query and return a DataFrame.
+        """
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def import_csv(self, csv_path: str, experiment: Optional[str] = None, reviewer: Optional[str] = None) -> int:
+        """
+        Load a reviewer CSV. Experiment and reviewer default to the parts of a
+        rule_review_<experiment>_<reviewer>.csv file name. Rows repeating a rule (same
+        guideline_id, asp_rule_id and asp_rule_index) keep the first one, as the reviewer
+        notebook always did when loading its CSVs.
+
+        Returns:
+            Number of rows imported
+        """
+        if experiment is None or reviewer is None:
+            match = CSV_NAME_PATTERN.match(Path(csv_path).name)
+            if not match:
+                raise ValueError(f"Cannot infer experiment/reviewer from '{Path(csv_path).name}'")
+            experiment = experiment or match.group("experiment")
+            reviewer = reviewer or match.group("reviewer")
+        frame = pd.read_csv(csv_path, dtype={"guideline_id": str, "asp_rule_id": str})
+        frame = frame.drop_duplicates(["guideline_id", "asp_rule_id", "asp_rule_index"], keep="first")
+        return self.upsert_many(experiment, reviewer, frame.to_dict("records"))
+
+    def import_reviews_dir(self, reviews_dir: str, skip_existing: bool = False) -> Dict[str, int]:
+        """
+        Import every rule_review_*.csv in a directory.
+
+        Args:
+            reviews_dir: Directory holding the reviewer CSV files
+            skip_existing: Only import CSVs whose experiment/reviewer has no reviews in the
+                store yet, so ratings saved in the store are never overwritten by an older CSV
+
+        Returns:
+            File name -> rows imported
+        """
+        imported = {}
+        for csv_path in sorted(Path(reviews_dir).glob("rule_review_*.csv")):
+            match = CSV_NAME_PATTERN.match(csv_path.name)
+            if not match:
+                continue
+            if skip_existing and not self.reviews(match.group("experiment"), match.group("reviewer")).empty:
+                continue
+            imported[csv_path.name] = self.import_csv(str(csv_path))
+        return imported
+
+    def export_csv(self, csv_path: str, experiment: str, reviewer: str) -> int:
+        """
+        Write one reviewer's reviews in the original CSV format.
+
+        Returns:
+            Number of rows written
+        """
+        frame = self.reviews(experiment, reviewer)[CSV_COLUMNS]
+        frame = frame.astype({"rating": "Int64", "asp_rule_index": "Int64", "total_asp_rules": "Int64"})
+        frame.to_csv(csv_path, index=False)
+        return len(frame)
+
+    def experiments(self) -> List[Tuple[str, str]]:
+        """
+        (experiment, reviewer) pairs with at least one review.
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT DISTINCT experiment, reviewer FROM reviews ORDER BY experiment, reviewer").fetchall()